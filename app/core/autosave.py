@@ -0,0 +1,64 @@
+import threading
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from app.core.edit_buffer import encode_lines
+from app.core.fileio import atomic_write_chunks, atomic_write_text
+from app.core.loader import DECODE_ERRORS
+from app.core.trace import tracer
+
+class AutoSaver:
+    # Background writer for edit mode. Submissions for the same path that pile up
+    # while a write is in progress are merged, so only the latest content is
+    # written; every write is atomic.
+    def __init__(self, on_error: Optional[Callable[[str, Exception], None]] = None):
+        self.on_error = on_error
+        self.pending: Dict[str, Tuple[Union[str, List[str]], str]] = {}  # path -> (content, encoding)
+        self.writing = False
+        self.closed = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="tarqim-autosave", daemon=True)
+        self.thread.start()
+
+    def submit(self, path: str, content: Union[str, List[str]], encoding: str = "utf-8"):
+        # Files are written back in the encoding they were read in. Content is
+        # the text or its lines, which are joined and encoded while writing.
+        with self.cond:
+            self.pending[path] = (content, encoding)
+            self.cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        # Wait until everything submitted so far is on disk
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.pending and not self.writing, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        flushed = self.flush(timeout)
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        return flushed
+
+    def run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or self.closed)
+                if not self.pending:
+                    return
+                batch = self.pending
+                self.pending = {}
+                self.writing = True
+
+            for path, (content, encoding) in batch.items():
+                try:
+                    with tracer.span("write", "save", path=path):
+                        if isinstance(content, str):
+                            atomic_write_text(path, content, encoding, DECODE_ERRORS)
+                        else:
+                            atomic_write_chunks(path, encode_lines(content, encoding))
+                except Exception as e:
+                    if self.on_error:
+                        self.on_error(path, e)
+
+            with self.cond:
+                self.writing = False
+                self.cond.notify_all()
@@ -1,76 +1,180 @@
+import copy
 import json
 import os
-from typing import Dict, Any
+import threading
+import time
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from app.core.fileio import atomic_write_text
+from app.core.trace import tracer
 
 CONFIG_FILE = os.path.expanduser("~/.tarqim_config.json")
 
+# Seconds to wait for more changes before writing, and between checks for
+# edits made by other processes
+SAVE_DELAY = 0.5
+CHECK_INTERVAL = 1.0
+
 class ConfigManager:
+    # The config file is read once and kept in memory. It is re-read when another
+    # process changed it (mtime/size), and writes are batched, debounced and
+    # atomic. subscribe() listeners are called when a key's value changes.
+    _config: Optional[Dict[str, Any]] = None
+    _stamp: Optional[Tuple[int, int]] = None
+    _checked = 0.0
+    _dirty = False
+    _timer: Optional[threading.Timer] = None
+    _listeners: Dict[str, List[Callable[[Any], None]]] = {}
+    _lock = threading.RLock()
+
+    @staticmethod
+    def _file_stamp() -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(CONFIG_FILE)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
     @staticmethod
-    def load_config() -> Dict[str, Any]:
+    def _read() -> Dict[str, Any]:
         if os.path.exists(CONFIG_FILE):
             try:
-                with open(CONFIG_FILE, 'r') as f:
+                with tracer.span("config_read", "config"), open(CONFIG_FILE, 'r') as f:
                     return json.load(f)
             except Exception:
                 pass
         return {}
 
-    @staticmethod
-    def save_config(config: Dict[str, Any]):
-        try:
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(config, f)
-        except Exception:
-            pass
+    @classmethod
+    def _data(cls) -> Dict[str, Any]:
+        with cls._lock:
+            now = time.monotonic()
+            if cls._config is not None and (cls._dirty or now - cls._checked < CHECK_INTERVAL):
+                return cls._config
+            cls._checked = now
+            stamp = cls._file_stamp()
+            if cls._config is None or stamp != cls._stamp:
+                old = cls._config
+                cls._stamp = stamp
+                cls._config = cls._read()
+                if old is not None:
+                    cls._notify(old, cls._config)
+            return cls._config
 
-    @staticmethod
-    def get_pinned_files() -> list:
-        config = ConfigManager.load_config()
-        return config.get("pinned_files", [])
+    @classmethod
+    def _notify(cls, old: Dict[str, Any], new: Dict[str, Any]):
+        for key, callbacks in list(cls._listeners.items()):
+            if old.get(key) != new.get(key):
+                for callback in list(callbacks):
+                    callback(copy.deepcopy(new.get(key)))
 
-    @staticmethod
-    def add_pinned_file(path: str):
-        config = ConfigManager.load_config()
-        pinned = config.get("pinned_files", [])
+    @classmethod
+    def _changed(cls, old: Dict[str, Any]):
+        cls._dirty = True
+        if cls._timer:
+            cls._timer.cancel()
+        cls._timer = threading.Timer(SAVE_DELAY, cls.flush)
+        cls._timer.daemon = True
+        cls._timer.start()
+        cls._notify(old, cls._config)
+
+    @classmethod
+    def subscribe(cls, key: str, callback: Callable[[Any], None]):
+        with cls._lock:
+            cls._listeners.setdefault(key, []).append(callback)
+
+    @classmethod
+    def unsubscribe(cls, key: str, callback: Callable[[Any], None]):
+        with cls._lock:
+            if callback in cls._listeners.get(key, []):
+                cls._listeners[key].remove(callback)
+
+    @classmethod
+    def flush(cls):
+        # Write pending changes now (also called by the debounce timer)
+        with cls._lock:
+            if cls._timer:
+                cls._timer.cancel()
+                cls._timer = None
+            if not cls._dirty:
+                return
+            try:
+                with tracer.span("config_write", "config"):
+                    atomic_write_text(CONFIG_FILE, json.dumps(cls._config))
+                cls._dirty = False
+                cls._stamp = cls._file_stamp()
+            except Exception:
+                pass
+
+    @classmethod
+    def load_config(cls) -> Dict[str, Any]:
+        with cls._lock:
+            return copy.deepcopy(cls._data())
+
+    @classmethod
+    def save_config(cls, config: Dict[str, Any]):
+        with cls._lock:
+            old = cls._data()
+            if config == old:
+                return
+            cls._config = copy.deepcopy(config)
+            cls._changed(old)
+
+    @classmethod
+    def get(cls, key: str, default: Any = None) -> Any:
+        with cls._lock:
+            return copy.deepcopy(cls._data().get(key, default))
+
+    @classmethod
+    def set(cls, key: str, value: Any):
+        with cls._lock:
+            old = cls._data()
+            if key in old and old[key] == value:
+                return
+            cls._config = dict(old)
+            cls._config[key] = copy.deepcopy(value)
+            cls._changed(old)
+
+    @classmethod
+    def get_pinned_files(cls) -> list:
+        return cls.get("pinned_files", [])
+
+    @classmethod
+    def add_pinned_file(cls, path: str):
+        pinned = cls.get_pinned_files()
         if path not in pinned:
             pinned.append(path)
-            config["pinned_files"] = pinned
-            ConfigManager.save_config(config)
+            cls.set("pinned_files", pinned)
 
-    @staticmethod
-    def remove_pinned_file(path: str):
-        config = ConfigManager.load_config()
-        pinned = config.get("pinned_files", [])
+    @classmethod
+    def remove_pinned_file(cls, path: str):
+        pinned = cls.get_pinned_files()
         if path in pinned:
             pinned.remove(path)
-            config["pinned_files"] = pinned
-            ConfigManager.save_config(config)
+            cls.set("pinned_files", pinned)
 
-    @staticmethod
-    def is_pinned(path: str) -> bool:
-        config = ConfigManager.load_config()
-        pinned = config.get("pinned_files", [])
-        return path in pinned
+    @classmethod
+    def is_pinned(cls, path: str) -> bool:
+        with cls._lock:
+            return path in cls._data().get("pinned_files", [])
 
-    @staticmethod
-    def move_pinned_file(path: str, direction: str):
+    @classmethod
+    def move_pinned_file(cls, path: str, direction: str):
         # direction: 'up' or 'down'
-        config = ConfigManager.load_config()
-        pinned = config.get("pinned_files", [])
-        
+        pinned = cls.get_pinned_files()
+
         if path not in pinned:
             return
-            
+
         index = pinned.index(path)
         new_index = index
-        
+
         if direction == 'up' and index > 0:
             new_index = index - 1
         elif direction == 'down' and index < len(pinned) - 1:
             new_index = index + 1
-            
+
         if new_index != index:
             pinned.pop(index)
             pinned.insert(new_index, path)
-            config["pinned_files"] = pinned
-            ConfigManager.save_config(config)
+            cls.set("pinned_files", pinned)
@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional
+
+from app.core.fileio import atomic_write_text
+from app.core.trace import tracer
+
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+
+# Listing of the opened folder from the last session, shown at startup before
+# the folder is scanned again. Large folders only keep their first entries.
+SNAPSHOT_FILE = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "tarqim", "tree.json")
+SNAPSHOT_LIMIT = 1000
+
+class DirEntryInfo(NamedTuple):
+    name: str
+    path: str
+    is_dir: bool
+
+def is_markdown(name: str) -> bool:
+    return name.lower().endswith(MARKDOWN_EXTENSIONS)
+
+def scan_directory(path: str, cancel: Optional[threading.Event] = None) -> Optional[List[DirEntryInfo]]:
+    # Folders and Markdown files of `path`, folders first. A single scandir pass:
+    # DirEntry caches the file type reported by readdir, so there is no stat per
+    # entry on most filesystems. Returns None when cancelled.
+    entries = []
+    with tracer.span("scandir", "tree", path=path), os.scandir(path) as it:
+        for i, entry in enumerate(it):
+            if cancel is not None and i % 512 == 0 and cancel.is_set():
+                return None
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir and not is_markdown(entry.name):
+                continue
+            entries.append(DirEntryInfo(entry.name, entry.path, is_dir))
+    entries.sort(key=lambda e: (not e.is_dir, e.name.lower()))
+    return entries
+
+def load_snapshot(path: str) -> Optional[List[DirEntryInfo]]:
+    try:
+        with open(SNAPSHOT_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("path") != path:
+            return None
+        return [DirEntryInfo(*entry) for entry in data["entries"]]
+    except Exception:
+        return None
+
+def save_snapshot(path: str, entries: List[DirEntryInfo]):
+    try:
+        os.makedirs(os.path.dirname(SNAPSHOT_FILE), exist_ok=True)
+        atomic_write_text(SNAPSHOT_FILE, json.dumps({"path": path, "entries": entries[:SNAPSHOT_LIMIT]}))
+    except Exception as e:
+        print(f"Error saving tree snapshot: {e}")
+
+def walk_markdown(root: str, cancel: Optional[threading.Event] = None) -> Iterator[os.DirEntry]:
+    # Every Markdown file under `root`, for the indexes. Hidden folders (.git,
+    # .venv...) and symlinked folders are skipped.
+    stack = [root]
+    while stack:
+        if cancel is not None and cancel.is_set():
+            return
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith("."):
+                            stack.append(entry.path)
+                    elif is_markdown(entry.name):
+                        yield entry
+                except OSError:
+                    pass
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def scan_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tarqim-scan")
+    return _executor
@@ -0,0 +1,61 @@
+import codecs
+from typing import Iterable, Iterator, List, Sequence
+
+from app.core.loader import DECODE_ERRORS
+
+# The text of edit mode as a list of lines (without their "\n"), kept in step
+# with the editor one change at a time, so nothing has to copy the whole text
+# out of Tk while typing. Line, char and word counts are running totals:
+# words never span lines, so they are counted per replaced line.
+
+# Lines joined and encoded per chunk of a save
+SAVE_CHUNK_LINES = 4096
+
+def count_words(lines: Iterable[str]) -> int:
+    return sum(len(line.split()) for line in lines)
+
+class EditBuffer:
+    def __init__(self, text: str):
+        self.lines = text.split("\n")
+        self.chars = len(text)
+        self.words = count_words(self.lines)
+
+    @property
+    def line_count(self) -> int:
+        return len(self.lines)
+
+    def replace(self, first: int, end: int, lines: List[str]):
+        # Lines [first, end) become `lines`
+        old = self.lines[first:end]
+        self.chars += sum(map(len, lines)) + len(lines) - sum(map(len, old)) - len(old)
+        self.words += count_words(lines) - count_words(old)
+        self.lines[first:end] = lines
+
+    def iter_lines(self, start: int) -> Iterator[str]:
+        # Lines from `start` on with their line endings, as split_blocks sees them
+        lines = self.lines
+        last = len(lines) - 1
+        for i in range(start, last):
+            yield lines[i] + "\n"
+        if start <= last and lines[last]:
+            yield lines[last]
+
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    def snapshot(self) -> List[str]:
+        # The lines as they are now, for a save on another thread. Only the
+        # list is copied; the strings are shared.
+        return self.lines[:]
+
+def encode_lines(lines: Sequence[str], encoding: str = "utf-8", errors: str = DECODE_ERRORS) -> Iterator[bytes]:
+    # The text of `lines` as encoded chunks, for streaming it to disk. Bytes
+    # that were escaped when the file was read are written back as they were.
+    # One encoder runs through every chunk, so a BOM is written only once.
+    encoder = codecs.getincrementalencoder(encoding)(errors)
+    for i in range(0, len(lines), SAVE_CHUNK_LINES):
+        chunk = "\n".join(lines[i:i + SAVE_CHUNK_LINES])
+        if i + SAVE_CHUNK_LINES < len(lines):
+            chunk += "\n"
+        yield encoder.encode(chunk)
+    yield encoder.encode("", final=True)
@@ -0,0 +1,164 @@
+import argparse
+import hashlib
+import html
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from app.core.dirscan import walk_markdown
+from app.core.fileio import atomic_write_text
+from app.core.loader import MappedFile
+from app.core.render_ops import MARKDOWN_EXTRAS
+
+# Headless export of a folder of Markdown files to static HTML, for CI. Files
+# are converted with the app's markdown2 extras across a process pool. A
+# manifest in the output folder records the (mtime, size, options) hash every
+# output was made from, so unchanged files are skipped on the next run.
+# Nothing here imports tkinter.
+
+MANIFEST_FILE = ".tarqim-export.json"
+# Bump when the output changes for the same input
+EXPORT_FORMAT = 1
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+</head>
+<body>
+{body}</body>
+</html>
+"""
+
+def options_hash() -> str:
+    options = json.dumps({"format": EXPORT_FORMAT, "extras": MARKDOWN_EXTRAS, "page": PAGE}, sort_keys=True)
+    return hashlib.blake2b(options.encode("utf-8"), digest_size=8).hexdigest()
+
+def source_hash(st: os.stat_result, options: str) -> str:
+    return hashlib.blake2b(f"{st.st_mtime_ns}:{st.st_size}:{options}".encode(), digest_size=16).hexdigest()
+
+def output_path(dst: str, rel: str) -> str:
+    return os.path.join(dst, os.path.splitext(rel)[0] + ".html")
+
+def load_manifest(dst: str) -> Tuple[Optional[str], Dict[str, str]]:
+    # (options hash, rel path -> source hash); (None, {}) when missing or
+    # unreadable
+    try:
+        with open(os.path.join(dst, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None, {}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("files"), dict):
+        return None, {}
+    return manifest.get("options"), manifest["files"]
+
+def save_manifest(dst: str, options: str, files: Dict[str, str]):
+    atomic_write_text(os.path.join(dst, MANIFEST_FILE), json.dumps({"options": options, "files": files}))
+
+_markdown = None
+
+def export_file(task: Tuple[str, str]) -> Optional[str]:
+    # Runs in a pool worker; returns an error message, or None
+    global _markdown
+    src_path, dst_path = task
+    try:
+        if _markdown is None:
+            import markdown2
+            _markdown = markdown2.Markdown(extras=MARKDOWN_EXTRAS)
+        body = _markdown.convert(MappedFile(src_path).read_text())
+        title = html.escape(os.path.splitext(os.path.basename(src_path))[0])
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        # Bytes the source encoding does not define cannot go into UTF-8
+        atomic_write_text(dst_path, PAGE.format(title=title, body=body), errors="replace")
+    except Exception as e:
+        return str(e)
+    return None
+
+def export_tree(src: str, dst: str, jobs: Optional[int] = None, force: bool = False) -> int:
+    # Returns the number of files that failed
+    start = time.perf_counter()
+    src = os.path.abspath(src)
+    dst = os.path.abspath(dst)
+    options = options_hash()
+    # Outputs listed in the manifest are cleaned up even when they are not
+    # reused (--force, other options)
+    manifest_options, exported = load_manifest(dst)
+    previous = exported if manifest_options == options and not force else {}
+
+    files: Dict[str, str] = {}
+    paths: Dict[str, str] = {}  # rel -> src path
+    claims: Dict[str, List[str]] = {}  # dst path -> rels exporting to it
+    failed = 0
+    for entry in walk_markdown(src):
+        if os.path.commonpath([entry.path, dst]) == dst:
+            continue
+        rel = os.path.relpath(entry.path, src)
+        try:
+            files[rel] = source_hash(entry.stat(), options)
+        except OSError as e:
+            print(f"Error reading {rel}: {e}")
+            failed += 1
+            continue
+        paths[rel] = entry.path
+        claims.setdefault(output_path(dst, rel), []).append(rel)
+
+    # Sources whose names only differ in the extension (a.md, a.markdown)
+    # would overwrite each other's output; none of them is exported
+    todo: List[Tuple[str, str, str]] = []  # (rel, src path, dst path)
+    for dst_path, rels in claims.items():
+        if len(rels) > 1:
+            print(f"Error exporting {', '.join(sorted(rels))}: all would be written to {os.path.relpath(dst_path, dst)}")
+            for rel in rels:
+                del files[rel]
+            failed += len(rels)
+        elif previous.get(rels[0]) != files[rels[0]] or not os.path.exists(dst_path):
+            todo.append((rels[0], paths[rels[0]], dst_path))
+
+    # Outputs of sources that are gone or clash
+    for rel in exported.keys() - files.keys():
+        dst_path = output_path(dst, rel)
+        if len(claims.get(dst_path, ())) == 1:
+            # Now the output of another source
+            continue
+        try:
+            os.unlink(dst_path)
+        except OSError:
+            pass
+
+    tasks = [(src_path, dst_path) for _, src_path, dst_path in todo]
+    workers = min(jobs or os.cpu_count() or 1, len(tasks))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(export_file, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    else:
+        results = [export_file(task) for task in tasks]
+
+    for (rel, _, _), error in zip(todo, results):
+        if error is not None:
+            print(f"Error exporting {rel}: {error}")
+            files.pop(rel)
+            failed += 1
+    os.makedirs(dst, exist_ok=True)
+    save_manifest(dst, options, files)
+
+    elapsed = time.perf_counter() - start
+    done = len(todo) - sum(error is not None for error in results)
+    print(f"Exported {done} files ({len(files) - done} unchanged, {failed} failed) "
+          f"in {elapsed:.2f} s, {done / elapsed:.1f} files/s")
+    return failed
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="main.py export", description="Export a folder of Markdown files to HTML")
+    parser.add_argument("src", help="folder to export")
+    parser.add_argument("dst", help="output folder")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="export every file, changed or not")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.src):
+        print(f"Error: {args.src} is not a folder", file=sys.stderr)
+        return 2
+    return 1 if export_tree(args.src, args.dst, args.jobs, args.force) else 0
@@ -0,0 +1,55 @@
+import os
+import tempfile
+from typing import Iterable
+
+# The umask can only be read by setting it, which applies to files every
+# thread creates meanwhile. It is read once at import, before any worker
+# threads start (main.py imports this through app.core.trace).
+def _read_umask() -> int:
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
+
+_UMASK = _read_umask()
+
+def atomic_write(path: str, data: bytes):
+    atomic_write_chunks(path, (data,))
+
+def atomic_write_chunks(path: str, chunks: Iterable[bytes]):
+    # Write to a temp file in the same directory, fsync it and rename it over
+    # the target, so readers only ever see the old or the new content.
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for data in chunks:
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+def atomic_write_text(path: str, text: str, encoding: str = "utf-8", errors: str = "strict"):
+    atomic_write(path, text.encode(encoding, errors))
+
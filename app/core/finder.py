@@ -0,0 +1,284 @@
+import bisect
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from app.core.dirscan import is_markdown, walk_markdown
+
+# Results returned per query; each tier collects up to this many candidates
+# before they are scored
+RESULT_LIMIT = 50
+# When the character bitsets leave less than this share of the remaining lines,
+# they are checked one by one instead of scanning the blob
+DIRECT_SCAN_RATIO = 0.4
+# Lines scanned per step, and time per search() call after which the scan
+# stops and the caller gets the results found so far
+SCAN_CHUNK = 4096
+SEARCH_BUDGET = 0.008
+# Paths added/removed since the last build before the tiers are rebuilt
+REBUILD_THRESHOLD = 1000
+# Query states kept for reuse (typing on, or backspacing)
+STATE_LIMIT = 64
+
+NONZERO_RE = re.compile(b"[^\x00]")
+
+def popcount(mask: int) -> int:
+    return bin(mask).count("1")
+
+def iter_bits(mask: int) -> Iterator[int]:
+    # Set bit positions, lowest first. Zero bytes are skipped in C.
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    for m in NONZERO_RE.finditer(data):
+        byte = data[m.start()]
+        base = m.start() * 8
+        while byte:
+            low = byte & -byte
+            yield base + low.bit_length() - 1
+            byte ^= low
+
+def fuzzy_pattern(query: str) -> str:
+    # The query characters in order within one line. Each gap excludes the
+    # next character, so a match never backtracks.
+    return "".join("[^\\n%s]*%s" % (c, c) for c in map(re.escape, query))
+
+class Tier:
+    # One searchable column (base names or relative paths): the lowercased
+    # lines joined into a blob the regex engine scans in C, plus a bitset of
+    # lines per character to skip the scan when few lines can match.
+    def __init__(self, lines: List[str]):
+        self.lines = lines
+        self.blob = "\n" + "\n".join(lines)
+        self.offsets = []  # blob offset of the newline that starts each line
+        pos = 0
+        for line in lines:
+            self.offsets.append(pos)
+            pos += len(line) + 1
+
+        flags: Dict[str, bytearray] = {}
+        size = (len(lines) + 7) // 8
+        for i, line in enumerate(lines):
+            byte, bit = i >> 3, 1 << (i & 7)
+            for c in set(line):
+                array = flags.get(c)
+                if array is None:
+                    array = flags[c] = bytearray(size)
+                array[byte] |= bit
+        self.bits = {c: int.from_bytes(array, "little") for c, array in flags.items()}
+
+    def search(self, query: str, start: int, stop: int, limit: int, skip: Set[int]) -> Tuple[List[int], Optional[int]]:
+        # Lines in [start, stop) that match `query`, up to `limit`, and the line
+        # to resume from (None once the end was reached)
+        stop = min(stop, len(self.lines))
+        resume = stop if stop < len(self.lines) else None
+        if start >= stop:
+            return [], resume
+        mask = ((1 << stop) - 1) >> start << start
+        for c in set(query):
+            mask &= self.bits.get(c, 0)
+            if not mask:
+                return [], resume
+
+        matches = []
+        if popcount(mask) <= DIRECT_SCAN_RATIO * (stop - start):
+            pattern = re.compile(fuzzy_pattern(query))
+            for i in iter_bits(mask):
+                if i not in skip and pattern.match(self.lines[i]):
+                    matches.append(i)
+                    if len(matches) == limit:
+                        return matches, i + 1
+            return matches, resume
+
+        pattern = re.compile("\n" + fuzzy_pattern(query))
+        end = self.offsets[stop] if stop < len(self.lines) else len(self.blob)
+        for m in pattern.finditer(self.blob, self.offsets[start], end):
+            i = bisect.bisect_left(self.offsets, m.start())
+            if i not in skip:
+                matches.append(i)
+                if len(matches) == limit:
+                    return matches, i + 1
+        return matches, resume
+
+class QueryState(NamedTuple):
+    version: int
+    tiers: List[Tuple[List[int], Optional[int]]]  # per tier: matches, resume line
+    results: List[str]
+    complete: bool
+
+class PathIndex:
+    # Flat index of every Markdown file under `root` for quick open. Built by a
+    # background crawl and kept current from filesystem events: changes go to
+    # small add/remove overlays until enough pile up for a rebuild.
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.paths: Set[str] = set()
+        self.base: List[str] = []  # paths covered by the tiers, in tier order
+        self.positions: Dict[str, int] = {}
+        self.tiers: List[Tier] = [Tier([]), Tier([])]
+        self.extra: List[str] = []
+        self.removed: Set[int] = set()  # tier lines of removed paths
+        self.version = 0
+        self.states: Dict[str, QueryState] = {}
+        self.ready = False
+        self.lock = threading.Lock()
+        self.cancel = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def build(self):
+        # Runs on a worker thread
+        paths = {entry.path for entry in walk_markdown(self.root, self.cancel)}
+        if not self.cancel.is_set():
+            self.set_paths(paths)
+
+    def set_paths(self, paths: Iterable[str]):
+        with self.lock:
+            self.paths = set(paths)
+        self.rebuild()
+        self.ready = True
+
+    def rebuild(self):
+        # Shorter names first, so the early exit of a scan favours them
+        with self.lock:
+            base = sorted(self.paths, key=lambda p: (len(os.path.basename(p)), len(p), p))
+        cut = len(self.root) + 1
+        rels = [p[cut:].lower() for p in base]
+        tiers = [Tier([os.path.basename(r) for r in rels]), Tier(rels)]
+        positions = {p: i for i, p in enumerate(base)}
+        with self.lock:
+            # Paths may have changed while the tiers were built
+            self.base = base
+            self.positions = positions
+            self.tiers = tiers
+            self.extra = [p for p in self.paths if p not in positions]
+            self.removed = {positions[p] for p in base if p not in self.paths}
+            self.version += 1
+
+    def update_paths(self, paths: Iterable[str]) -> bool:
+        # Apply filesystem events; runs on a worker thread
+        added = []
+        gone = []
+        for path in paths:
+            if not path.startswith(self.root + os.sep):
+                continue
+            if os.path.isdir(path):
+                added.extend(entry.path for entry in walk_markdown(path))
+            elif os.path.isfile(path):
+                if is_markdown(path):
+                    added.append(path)
+            else:
+                gone.append(path)
+        return self.apply(added, gone)
+
+    def rescan(self):
+        # Catches up with changes no event was seen for (only the folders open
+        # in the sidebar are watched); runs on a worker thread
+        found = {entry.path for entry in walk_markdown(self.root, self.cancel)}
+        if self.cancel.is_set():
+            return False
+        with self.lock:
+            added = [p for p in found if p not in self.paths]
+            gone = [p for p in self.paths if p not in found]
+        return self.apply(added, gone)
+
+    def apply(self, added: List[str], gone: List[str]) -> bool:
+        changed = False
+        with self.lock:
+            for path in added:
+                if path not in self.paths:
+                    self.paths.add(path)
+                    if path in self.positions:
+                        self.removed.discard(self.positions[path])
+                    else:
+                        self.extra.append(path)
+                    changed = True
+            for path in gone:
+                # A removed folder takes its files with it
+                prefix = path + os.sep
+                for p in [path] if path in self.paths else [p for p in self.paths if p.startswith(prefix)]:
+                    self.paths.discard(p)
+                    if p in self.positions:
+                        self.removed.add(self.positions[p])
+                    else:
+                        self.extra.remove(p)
+                    changed = True
+            if changed:
+                self.version += 1
+            pending = len(self.extra) + len(self.removed)
+        if pending > REBUILD_THRESHOLD:
+            self.rebuild()
+        return changed
+
+    def search(self, query: str, budget: float = SEARCH_BUDGET) -> Tuple[List[str], bool]:
+        # Fuzzy match on base names first, then on relative paths. A query that
+        # extends an earlier one only re-checks that query's matches and resumes
+        # its scans where they stopped. Scanning stops after `budget` seconds;
+        # the results are then partial (False) and calling again continues.
+        query = "".join(query.lower().split())
+        if not query:
+            return [], True
+        with self.lock:
+            version = self.version
+            tiers = self.tiers
+            base = self.base
+            extra = list(self.extra)
+            skip = set(self.removed)
+
+        previous = None
+        for k in range(len(query), 0, -1):
+            previous = self.states.get(query[:k])
+            if previous is not None and previous.version == version:
+                break
+            previous = None
+        if previous is not None and previous.complete and len(query) == k:
+            return previous.results, True
+
+        deadline = time.perf_counter() + budget
+        scanned = False
+        pattern = re.compile(fuzzy_pattern(query))
+        found = []
+        for t, tier in enumerate(tiers):
+            if t > 0 and (len(found[0][0]) == RESULT_LIMIT or found[0][1] is not None):
+                # Path-only matches rank below name matches, so a full page of
+                # names needs no path scan. Nothing scanned yet: resume at 0.
+                found.append(([], 0))
+                continue
+            if previous is None:
+                matches, resume = [], 0
+            else:
+                old, resume = previous.tiers[t]
+                matches = [i for i in old if pattern.match(tier.lines[i])]
+            while resume is not None and len(matches) < RESULT_LIMIT and (not scanned or time.perf_counter() < deadline):
+                more, resume = tier.search(query, resume, resume + SCAN_CHUNK, RESULT_LIMIT - len(matches), skip)
+                matches.extend(more)
+                scanned = True
+            found.append((matches, resume))
+
+        names_done = found[0][1] is None or len(found[0][0]) == RESULT_LIMIT
+        complete = names_done and (len(found[0][0]) == RESULT_LIMIT or found[1][1] is None or len(found[1][0]) == RESULT_LIMIT)
+
+        in_name = set(found[0][0])
+        candidates = [(base[i], i in in_name) for i in found[0][0]]
+        candidates.extend((base[i], False) for i in found[1][0] if i not in in_name)
+        cut = len(self.root) + 1
+        for path in extra:
+            rel = path[cut:].lower()
+            if pattern.match(rel):
+                candidates.append((path, bool(pattern.match(os.path.basename(rel)))))
+
+        def rank(candidate):
+            path, name_match = candidate
+            rel = path[cut:].lower()
+            name = os.path.basename(rel)
+            return (query not in name, not name.startswith(query), not name_match, query not in rel, len(rel))
+        results = [path for path, _ in sorted(candidates, key=rank)[:RESULT_LIMIT]]
+
+        if len(self.states) >= STATE_LIMIT or any(s.version != version for s in self.states.values()):
+            self.states = {}
+        self.states[query] = QueryState(version, found, results, complete)
+        return results, complete
+
+    def close(self):
+        self.cancel.set()
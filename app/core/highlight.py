@@ -0,0 +1,129 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from app.core.trace import tracer
+
+# Syntax highlighting of fenced code blocks with Pygments, when it is
+# installed. A block is tokenized into ranges per tag, relative to the start of
+# the block, so the ranges of one tag can be added with a single tag_add call.
+# Results are kept in a bounded LRU keyed by (language, hash of the code).
+
+# Runs of a code block carry this tag prefix followed by the block's language
+LANGUAGE_TAG = "lang-"
+HIGHLIGHTED_TAG = "highlighted"
+HIGHLIGHT_CACHE_ENTRIES = 512
+
+# Token type -> tag; a token takes the tag of its closest listed ancestor
+TOKEN_TAGS = {
+    "Token.Comment": "hl_comment",
+    "Token.Keyword": "hl_keyword",
+    "Token.Literal.String": "hl_string",
+    "Token.Literal.Number": "hl_number",
+    "Token.Name.Builtin": "hl_builtin",
+    "Token.Name.Function": "hl_function",
+    "Token.Name.Class": "hl_class",
+    "Token.Name.Decorator": "hl_decorator",
+}
+
+# (start line, start column, end line, end column), lines counted from the
+# first line of the block
+Range = Tuple[int, int, int, int]
+Ranges = Dict[str, List[Range]]
+
+@lru_cache(maxsize=None)
+def get_lexer(language: str):
+    # None without Pygments or for unknown languages. Newlines are left alone
+    # so token offsets match the text in the widget.
+    try:
+        from pygments import lexers, util
+    except ImportError:
+        return None
+    try:
+        return lexers.get_lexer_by_name(language, stripnl=False, ensurenl=False)
+    except util.ClassNotFound:
+        return None
+
+_token_tags: Dict[object, Optional[str]] = {}
+
+def token_tag(ttype) -> Optional[str]:
+    tag = _token_tags.get(ttype)
+    if tag is None and ttype not in _token_tags:
+        name = str(ttype)
+        while name and name not in TOKEN_TAGS:
+            name = name.rpartition(".")[0]
+        tag = _token_tags[ttype] = TOKEN_TAGS.get(name)
+    return tag
+
+def tokenize(language: str, code: str) -> Optional[Ranges]:
+    lexer = get_lexer(language)
+    if lexer is None:
+        return None
+    ranges: Ranges = {}
+    last: Dict[str, int] = {}  # end offset of the latest range per tag
+    line = 0
+    line_start = 0
+    for offset, ttype, value in lexer.get_tokens_unprocessed(code):
+        tag = token_tag(ttype)
+        newlines = value.count("\n")
+        end_line = line + newlines
+        end_line_start = offset + value.rindex("\n") + 1 if newlines else line_start
+        if tag:
+            end = offset + len(value)
+            tag_ranges = ranges.setdefault(tag, [])
+            if last.get(tag) == offset:
+                # Neighbouring tokens with the same tag become one range
+                previous = tag_ranges[-1]
+                tag_ranges[-1] = (previous[0], previous[1], end_line, end - end_line_start)
+            else:
+                tag_ranges.append((line, offset - line_start, end_line, end - end_line_start))
+            last[tag] = end
+        line, line_start = end_line, end_line_start
+    return ranges
+
+class HighlightCache:
+    def __init__(self, max_entries: int = HIGHLIGHT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple[str, bytes], Optional[Ranges]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(language: str, code: str) -> Tuple[str, bytes]:
+        return (language, hashlib.blake2b(code.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+
+    def lookup(self, key: Tuple[str, bytes]) -> Tuple[bool, Optional[Ranges]]:
+        # (found, ranges); ranges is None for code that cannot be highlighted
+        with self.lock:
+            if key not in self.entries:
+                return False, None
+            self.entries.move_to_end(key)
+            return True, self.entries[key]
+
+    def put(self, key: Tuple[str, bytes], ranges: Optional[Ranges]):
+        with self.lock:
+            self.entries[key] = ranges
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def highlight(self, language: str, code: str) -> Optional[Ranges]:
+        key = self.key(language, code)
+        found, ranges = self.lookup(key)
+        if not found:
+            with tracer.span("highlight", "render", language=language):
+                ranges = tokenize(language, code)
+            self.put(key, ranges)
+        return ranges
+
+highlight_cache = HighlightCache()
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def highlight_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tarqim-highlight")
+    return _executor
@@ -0,0 +1,153 @@
+import base64
+import io
+import math
+import struct
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.trace import tracer
+
+# Inline images of the preview. An image is rendered as a run of its alt text
+# tagged with IMAGE_TAG + its src; the preview swaps the run for the image when
+# the file can be shown. Its size is read from the header up front, so a blank
+# photo of the final size holds its place while the pixels are decoded and
+# downscaled on a worker. With Pillow any format it reads is decoded on the
+# worker; without it, PNG and GIF files are only read there, and Tk decodes
+# and subsamples them on the main thread. Nothing here touches Tk.
+
+# Runs of an image carry this tag prefix followed by the image's src
+IMAGE_TAG = "img-"
+IMAGE_CACHE_BYTES = 64 * 1024 * 1024
+# Image sizes kept per (path, mtime), decoded or not
+IMAGE_SIZE_ENTRIES = 4096
+
+ImageKey = Tuple[str, int, int]  # (path, st_mtime_ns, width shown at)
+
+_pillow: Any = None  # PIL.Image once imported, False without Pillow
+
+def pillow() -> Any:
+    # PIL.Image, or None without Pillow. Imported on first use, so startup
+    # does not pay for it.
+    global _pillow
+    if _pillow is None:
+        try:
+            from PIL import Image
+            _pillow = Image
+        except ImportError:
+            _pillow = False
+    return _pillow or None
+
+def image_size(path: str) -> Optional[Tuple[int, int]]:
+    # (width, height) from the file header; None if it cannot be shown
+    Image = pillow()
+    if Image is not None:
+        try:
+            with Image.open(path) as image:
+                return image.size
+        except Exception:
+            return None
+    try:
+        with open(path, "rb") as f:
+            header = f.read(32)
+    except OSError:
+        return None
+    if header.startswith(b"\x89PNG\r\n\x1a\n") and header[12:16] == b"IHDR":
+        return struct.unpack(">II", header[16:24])
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return struct.unpack("<HH", header[6:10])
+    return None
+
+def target_size(size: Tuple[int, int], max_width: int) -> Tuple[int, int, int]:
+    # (width, height, subsample) an image of `size` is shown at, at most
+    # max_width wide. Without Pillow, Tk can only shrink by whole factors.
+    width, height = size
+    if width <= max_width:
+        return width, height, 1
+    if pillow() is not None:
+        return max_width, max(1, round(height * max_width / width)), 1
+    factor = math.ceil(width / max_width)
+    return math.ceil(width / factor), math.ceil(height / factor), factor
+
+def decode_image(path: str, width: int, height: int) -> bytes:
+    # Runs on a worker: data for a Tk photo of width x height, or, without
+    # Pillow, of the file's own size, to be subsampled as target_size says
+    with tracer.span("image", "render"):
+        Image = pillow()
+        if Image is not None:
+            with Image.open(path) as image:
+                image = image.convert("RGBA")
+                if image.size != (width, height):
+                    image = image.resize((width, height), Image.LANCZOS)
+                # Transparent parts are shown on white
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                data = io.BytesIO()
+                background.save(data, "PPM")
+                return data.getvalue()
+        with open(path, "rb") as f:
+            return base64.b64encode(f.read())
+
+class ImageCache:
+    # Decoded photos keyed by (path, mtime, width), in a byte-bounded LRU
+    # shared by every preview. A photo still shown in a preview stays alive
+    # there after it is evicted. Used from the main thread only.
+    def __init__(self, max_bytes: int = IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[ImageKey, Tuple[Any, int]]" = OrderedDict()
+        self.sizes: Dict[Tuple[str, int], Optional[Tuple[int, int]]] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.evict()
+
+    def size(self, path: str, mtime: int) -> Optional[Tuple[int, int]]:
+        key = (path, mtime)
+        if key not in self.sizes:
+            if len(self.sizes) >= IMAGE_SIZE_ENTRIES:
+                self.sizes.clear()
+            self.sizes[key] = image_size(path)
+        return self.sizes[key]
+
+    def get(self, key: ImageKey) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: ImageKey, photo: Any, size: int):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        self.entries[key] = (photo, size)
+        self.total_bytes += size
+        self.evict()
+
+    def discard(self, key: ImageKey, photo: Any = None):
+        # Only if the entry still holds `photo`, when given
+        entry = self.entries.get(key)
+        if entry is not None and (photo is None or entry[0] is photo):
+            del self.entries[key]
+            self.total_bytes -= entry[1]
+
+    def evict(self):
+        # The newest entry stays, even over budget
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.total_bytes -= size
+
+image_cache = ImageCache()
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def image_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tarqim-image")
+    return _executor
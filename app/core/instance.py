@@ -0,0 +1,178 @@
+import errno
+import json
+import os
+import socket
+import stat
+import tempfile
+import threading
+from typing import Callable, List, Optional
+
+# Single-instance mode. The first window listens on a per-user Unix domain
+# socket; later launches hand their paths to it and exit instead of starting
+# another interpreter and Tk root. A socket left behind by a window that
+# crashed refuses connections and is taken over by the next window. Nothing
+# here imports tkinter, so forwarding stays fast.
+
+SUPPORTED = hasattr(socket, "AF_UNIX") and hasattr(os, "getuid")
+# Seconds a launch waits for the running window to take its paths
+FORWARD_TIMEOUT = 2.0
+# Seconds a starting window waits to learn whether a socket is still served
+PROBE_TIMEOUT = 0.5
+MAX_MESSAGE = 1024 * 1024
+
+def private_dir(create: bool) -> Optional[str]:
+    # A folder only the user can enter, for the socket and its lock file:
+    # under XDG_RUNTIME_DIR, or else a uid-named one in the shared temp
+    # folder. None if it is missing (and not to be created), or is not a
+    # folder of the user's that nobody else can enter, e.g. one another user
+    # created first.
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        path = os.path.join(runtime_dir, "tarqim")
+    else:
+        path = os.path.join(tempfile.gettempdir(), f"tarqim-{os.getuid()}")
+    if create:
+        try:
+            os.mkdir(path, 0o700)
+        except FileExistsError:
+            pass
+        except OSError:
+            return None
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        return None
+    return path
+
+def socket_path(create: bool = False) -> Optional[str]:
+    directory = private_dir(create)
+    return os.path.join(directory, "instance.sock") if directory else None
+
+def forward(paths: List[str], path: Optional[str] = None) -> bool:
+    # Hands the paths to the running window. False if there is none, or it
+    # does not answer in time.
+    if not SUPPORTED:
+        return False
+    path = path or socket_path()
+    if path is None:
+        return False
+    message = json.dumps({"paths": [os.path.abspath(p) for p in paths]}).encode("utf-8") + b"\n"
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(FORWARD_TIMEOUT)
+            client.connect(path)
+            client.sendall(message)
+            return client.makefile("rb").readline(16) == b"ok\n"
+    except OSError:
+        return False
+
+def is_served(path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        probe.settimeout(PROBE_TIMEOUT)
+        try:
+            probe.connect(path)
+        except OSError:
+            return False
+    return True
+
+class InstanceServer:
+    # Takes paths from later launches and passes them to on_open, which runs
+    # on the accept thread. An empty list means "show the window".
+    def __init__(self, on_open: Callable[[List[str]], None], path: Optional[str] = None):
+        # `path` must be in a folder only the user can enter
+        self.on_open = on_open
+        self.path = path
+        self.sock: Optional[socket.socket] = None
+        self.inode: Optional[int] = None
+
+    def start(self) -> bool:
+        # False if another window already listens. Two windows starting at
+        # once take turns through a lock file, so only one replaces a stale
+        # socket.
+        if not SUPPORTED:
+            return False
+        if self.path is None:
+            self.path = socket_path(create=True)
+            if self.path is None:
+                print("Error starting single-instance server: no private folder for its socket")
+                return False
+        import fcntl
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            with open(os.path.splitext(self.path)[0] + ".lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                # Never reachable by other users, not even for a moment
+                mask = os.umask(0o077)
+                try:
+                    bound = self.bind(sock)
+                finally:
+                    os.umask(mask)
+                if not bound:
+                    sock.close()
+                    return False
+                self.inode = os.stat(self.path).st_ino
+            sock.listen(8)
+        except OSError as e:
+            sock.close()
+            print(f"Error starting single-instance server: {e}")
+            return False
+        self.sock = sock
+        threading.Thread(target=self.serve, name="tarqim-instance", daemon=True).start()
+        return True
+
+    def bind(self, sock: socket.socket) -> bool:
+        try:
+            sock.bind(self.path)
+            return True
+        except OSError as e:
+            if e.errno != errno.EADDRINUSE:
+                raise
+        if is_served(self.path):
+            return False
+        # Stale: nobody accepts on it any more
+        os.unlink(self.path)
+        sock.bind(self.path)
+        return True
+
+    def serve(self):
+        sock = self.sock
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                # Closed
+                return
+            with conn:
+                try:
+                    conn.settimeout(FORWARD_TIMEOUT)
+                    data = conn.makefile("rb").readline(MAX_MESSAGE)
+                    if not data:
+                        # A probe from a starting window
+                        continue
+                    paths = json.loads(data)["paths"]
+                    if not isinstance(paths, list):
+                        raise ValueError("paths is not a list")
+                    conn.sendall(b"ok\n")
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    print(f"Error reading forwarded paths: {e}")
+                    continue
+            self.on_open([p for p in paths if isinstance(p, str)])
+
+    def close(self):
+        if self.sock is None:
+            return
+        sock, self.sock = self.sock, None
+        try:
+            # Wakes up the blocked accept
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+        try:
+            # Unless a newer window has taken the path over since
+            if os.stat(self.path).st_ino == self.inode:
+                os.unlink(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,115 @@
+import bisect
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from app.core.render_ops import block_key, iter_blocks, link_references
+
+# The block structure of a document being edited, kept in step with the editor
+# so an edit only re-splits and re-keys the blocks around the changed lines.
+#
+# Edits are reported as line ranges (see mark_changed) and merged until the
+# next update(). The update re-splits from the block before the first changed
+# line and stops as soon as a new block starts on a line that, shifted by the
+# edit, was also the start of an old block past the changed lines: from there
+# on the text and the splitter state are the same as before, so the remaining
+# blocks are kept. The cost of an update depends on the size of the edit, not
+# on the size of the document.
+#
+# Lines are numbered from 0 and split at "\n" only, like the lines of a Text
+# widget.
+
+# Replacement of blocks [start, stop) by new sources and keys
+Change = Tuple[int, int, List[str], List[bytes]]
+
+def source_lines(text: str) -> List[str]:
+    lines = [line + "\n" for line in text.split("\n")]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+class LiveDocument:
+    def __init__(self, md_text: str):
+        self.reset(md_text)
+
+    def reset(self, md_text: str):
+        self.refs = link_references(md_text)
+        self.sources: List[str] = []
+        self.counts: List[int] = []  # lines per block
+        for block, count in iter_blocks(source_lines(md_text)):
+            self.sources.append(block)
+            self.counts.append(count)
+        self.keys = [block_key(source, self.refs) for source in self.sources]
+        # First line of every block, plus the line count. Only entries up to
+        # self.valid are current; the rest are filled in on demand, so an edit
+        # that moves all following lines costs nothing until they are looked up.
+        self.offsets = [0] * (len(self.counts) + 1)
+        self.valid = 0
+        self.dirty: Optional[Tuple[int, int, int]] = None  # (first line, end line, line delta)
+
+    def first_line(self, j: int) -> int:
+        offsets = self.offsets
+        while self.valid < j:
+            offsets[self.valid + 1] = offsets[self.valid] + self.counts[self.valid]
+            self.valid += 1
+        return offsets[j]
+
+    def block_at(self, line: int) -> int:
+        # The block holding `line`; lines past the end belong to the last block
+        n = len(self.counts)
+        while self.valid < n and self.offsets[self.valid] <= line:
+            self.first_line(self.valid + 1)
+        return max(0, min(n - 1, bisect.bisect_right(self.offsets, line, 0, self.valid + 1) - 1))
+
+    def mark_changed(self, first: int, old_end: int, new_end: int):
+        # Lines [first, old_end) were replaced by [first, new_end), in the
+        # coordinates of the text as it was before this edit
+        delta = new_end - old_end
+        if self.dirty is None:
+            self.dirty = (first, new_end, delta)
+            return
+        lo, hi, total = self.dirty
+        if hi >= old_end:
+            hi += delta
+        elif hi > first:
+            hi = new_end
+        self.dirty = (min(lo, first), max(hi, new_end), total + delta)
+
+    def update(self, read_lines: Callable[[int], Iterable[str]]) -> Optional[Change]:
+        # Brings the blocks up to date with the text; read_lines(line) yields
+        # the current lines from `line` on. None if nothing was edited.
+        if self.dirty is None:
+            return None
+        lo, hi, delta = self.dirty
+        self.dirty = None
+        n = len(self.counts)
+        # An edit can join its line to the previous block
+        start = max(0, self.block_at(lo) - 1) if n else 0
+        line = self.first_line(start)
+        stop = n
+        sources: List[str] = []
+        counts: List[int] = []
+        for block, count in iter_blocks(read_lines(line)):
+            sources.append(block)
+            counts.append(count)
+            line += count
+            if line >= hi and n:
+                j = self.block_at(line - delta)
+                if self.first_line(j) == line - delta:
+                    stop = j
+                    break
+
+        if any("]:" in source for source in sources + self.sources[start:stop]):
+            # A link definition may have changed, and with it every block
+            # using references
+            md_text = "".join(read_lines(0))
+            if link_references(md_text) != self.refs:
+                self.reset(md_text)
+                return 0, n, list(self.sources), list(self.keys)
+
+        keys = [block_key(source, self.refs) for source in sources]
+        self.sources[start:stop] = sources
+        self.counts[start:stop] = counts
+        self.keys[start:stop] = keys
+        self.offsets[start + 1:stop + 1] = [0] * len(counts)
+        self.valid = min(self.valid, start)
+        return start, stop, sources, keys
@@ -0,0 +1,121 @@
+import codecs
+import mmap
+import os
+from typing import Iterator, Tuple
+
+# Bytes looked at to guess the encoding of a file without a BOM
+SAMPLE_BYTES = 64 * 1024
+# Bytes decoded per step when streaming lines
+CHUNK_BYTES = 1024 * 1024
+# Files that are neither UTF-8 nor UTF-16/32 are read as Windows-1252
+FALLBACK_ENCODING = "cp1252"
+# Bytes that do not decode (e.g. the ones Windows-1252 leaves undefined) come
+# through as lone surrogates and are encoded back to the same bytes on save
+DECODE_ERRORS = "surrogateescape"
+
+# UTF-32 first: its little-endian BOM starts with the UTF-16 one
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# Encodings in which a newline byte always is a newline, so lines and byte
+# ranges can be decoded on their own
+STREAMABLE = {"utf-8", "utf-8-sig", FALLBACK_ENCODING}
+
+def detect_encoding(sample: bytes, complete: bool = False) -> str:
+    # BOM, then NUL bytes for UTF-16 without BOM, then a strict UTF-8 decode of
+    # the sample. `complete` tells whether the sample is the whole file; if not,
+    # a character cut off at the end of the sample is not an error.
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    if b"\x00" in sample:
+        # ASCII text in UTF-16 has a NUL in every other byte
+        even = sample[0::2].count(0)
+        odd = sample[1::2].count(0)
+        if odd > len(sample) // 8 and odd > 4 * even:
+            return "utf-16-le"
+        if even > len(sample) // 8 and even > 4 * odd:
+            return "utf-16-be"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+
+def is_utf8(data, start: int = 0, chunk_bytes: int = CHUNK_BYTES) -> bool:
+    # Strict UTF-8 check of data[start:], a chunk at a time
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    view = memoryview(data)
+    try:
+        for pos in range(start, len(data), chunk_bytes):
+            decoder.decode(view[pos:pos + chunk_bytes], final=pos + chunk_bytes >= len(data))
+        return True
+    except UnicodeDecodeError:
+        return False
+    finally:
+        view.release()
+
+class MappedFile:
+    # Read-only memory map of a text file. Nothing is decoded up front: callers
+    # stream lines or decode byte ranges, so a large file never has to be held
+    # in memory as one string. UTF-8 is only assumed once the whole file is
+    # known to be valid, so a stray byte far into the file cannot be replaced
+    # and then saved over. `lossy` is set when a UTF-16/32 file did not decode
+    # cleanly; such text must not be written back.
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self.size = self.stat.st_size
+            # The map keeps its own handle on the file
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.encoding = detect_encoding(self.data[:SAMPLE_BYTES], self.size <= SAMPLE_BYTES)
+        if self.encoding == "utf-8" and self.size > SAMPLE_BYTES and not is_utf8(self.data):
+            self.encoding = FALLBACK_ENCODING
+        self.lossy = False
+        self.streamable = self.encoding in STREAMABLE
+        # Byte ranges are decoded without the BOM
+        self.codec = "utf-8" if self.encoding == "utf-8-sig" else self.encoding
+        self.start = len(codecs.BOM_UTF8) if self.encoding == "utf-8-sig" else 0
+
+    def check(self, end: int):
+        # Pages past the end of a file truncated in place would fault on access
+        if end > 0 and self.data.size() < end:
+            raise OSError(f"{os.path.basename(self.path)} changed on disk")
+
+    def decode(self, start: int, end: int) -> str:
+        self.check(end)
+        return self.data[start:end].decode(self.codec, DECODE_ERRORS)
+
+    def read_text(self) -> str:
+        if self.streamable:
+            return self.decode(self.start, self.size)
+        self.check(self.size)
+        data = self.data[self.start:self.size]
+        try:
+            return data.decode(self.codec)
+        except UnicodeDecodeError:
+            self.lossy = True
+            return data.decode(self.codec, "replace")
+
+    def iter_lines(self, chunk_bytes: int = CHUNK_BYTES) -> Iterator[Tuple[str, int]]:
+        # (line, size in bytes) pairs of a streamable file, line endings kept.
+        # Chunks end after a newline, so a CRLF pair is never split.
+        data = self.data
+        pos = self.start
+        while pos < self.size:
+            end = min(self.size, pos + chunk_bytes)
+            if end < self.size:
+                newline = data.rfind(b"\n", pos, end)
+                if newline < 0:
+                    newline = data.find(b"\n", end)
+                end = newline + 1 if newline >= 0 else self.size
+            self.check(end)
+            for line in data[pos:end].splitlines(keepends=True):
+                yield line.decode(self.codec, DECODE_ERRORS), len(line)
+            pos = end
@@ -0,0 +1,220 @@
+import re
+
+# Tokenizes one block of Markdown straight into the start tag / end tag / data
+# calls of the run builder (render_ops.MarkdownRenderParser), the same calls
+# the builder gets from the HTML markdown2 writes. Only the common constructs
+# are handled, and only in the shapes where the result is known to match
+# markdown2; anything else raises Unsupported and the block goes to markdown2.
+
+class Unsupported(Exception):
+    pass
+
+HEADING_RE = re.compile(r"(#{1,6})[ ]*(.+?)[ ]*#*$")
+BULLET_RE = re.compile(r"[*+-] +(?=\S)")
+ORDERED_RE = re.compile(r"\d+\. +(?=\S)")
+FENCE_RE = re.compile(r"(`{3,}) *([\w+-]+)? *$")
+SEPARATOR_RE = re.compile(r"\|(?: *:?-+:? *\|)+$")
+# Setext underlines and horizontal rules
+RULE_RE = re.compile(r"[-=_* ]+$")
+SPECIAL_RE = re.compile(r"[`*_\[\]!\\<&|]")
+LINK_RE = re.compile(r"\[([^\[\]\n]*)\]\(([^()\s<>\\]+)(?: +\"[^\"\n]*\")?\)")
+# Characters allowed right before an opening and right after a closing
+# emphasis delimiter, besides whitespace and the ends of the text
+OPEN_AFTER = "([\""
+CLOSE_BEFORE = ".,;:!?)]\"'"
+
+def convert(source: str, out):
+    if "\t" in source or "\r" in source:
+        # markdown2 expands tabs and normalizes line endings first
+        raise Unsupported
+    lines = source.split("\n")
+    start = 0
+    while start < len(lines) and not lines[start].strip():
+        start += 1
+    end = len(lines)
+    while end > start and not lines[end - 1].strip():
+        end -= 1
+    lines = lines[start:end]
+    if not lines:
+        # markdown2 writes an empty paragraph for blank input
+        out.handle_starttag("p", [])
+        out.handle_endtag("p")
+        return
+    if lines[0].startswith("```"):
+        fenced_code(lines, out)
+    elif len(lines) > 1 and lines[0].startswith("|") and SEPARATOR_RE.match(lines[1]):
+        table(lines, out)
+    else:
+        flow(lines, out)
+
+def flow(lines, out):
+    # Headings, paragraphs and tight single-level lists
+    paragraph = []
+    list_tag = None
+    for line in lines:
+        if not line.strip() or line[0] in " ><|" or line[-1] == " " or line.startswith("```") or RULE_RE.match(line):
+            raise Unsupported
+        if line[0] == "#":
+            if list_tag or line.startswith("#######"):
+                raise Unsupported
+            end_paragraph(paragraph, out)
+            match = HEADING_RE.match(line)
+            if match is None or not match.group(2).strip("#"):
+                raise Unsupported
+            tag = f"h{len(match.group(1))}"
+            out.handle_starttag(tag, [])
+            inline(match.group(2), out)
+            out.handle_endtag(tag)
+            continue
+        match = BULLET_RE.match(line) or ORDERED_RE.match(line)
+        if match:
+            tag = "ol" if line[0].isdigit() else "ul"
+            if paragraph or list_tag not in (None, tag):
+                raise Unsupported
+            item = line[match.end():]
+            if item[0] in "#>`" or BULLET_RE.match(item) or ORDERED_RE.match(item) or RULE_RE.match(item):
+                raise Unsupported
+            if list_tag is None:
+                list_tag = tag
+                out.handle_starttag(tag, [])
+            out.handle_data("\n")
+            out.handle_starttag("li", [])
+            inline(item, out)
+            out.handle_endtag("li")
+            continue
+        if list_tag:
+            # Lazy continuation of a list item
+            raise Unsupported
+        paragraph.append(line)
+    end_paragraph(paragraph, out)
+    if list_tag:
+        out.handle_data("\n")
+        out.handle_endtag(list_tag)
+
+def end_paragraph(paragraph, out):
+    if paragraph:
+        out.handle_starttag("p", [])
+        inline("\n".join(paragraph), out)
+        out.handle_endtag("p")
+        paragraph.clear()
+
+def fenced_code(lines, out):
+    match = FENCE_RE.match(lines[0])
+    fence = match and match.group(1)
+    if not match or len(lines) < 2 or lines[-1].rstrip(" ") != fence:
+        raise Unsupported
+    body = lines[1:-1]
+    if any(line.lstrip(" ").startswith("```") for line in body):
+        raise Unsupported
+    code = "".join(line + "\n" for line in body) or "\n"
+    language = match.group(2)
+    out.handle_starttag("pre", [])
+    # As markdown2 writes it with the highlightjs-lang extra
+    out.handle_starttag("code", [("class", f"{language} language-{language}")] if language else [])
+    out.handle_data(code)
+    out.handle_endtag("code")
+    out.handle_endtag("pre")
+
+def table(lines, out):
+    rows = [lines[0]] + lines[2:]
+    for line in rows:
+        if len(line) < 2 or line[0] != "|" or line[-1] != "|" or "`|" in line or "\\" in line:
+            raise Unsupported
+    out.handle_starttag("table", [])
+    out.handle_data("\n")
+    out.handle_starttag("thead", [])
+    out.handle_data("\n")
+    table_row(rows[0], "th", out)
+    out.handle_data("\n")
+    out.handle_endtag("thead")
+    out.handle_data("\n")
+    if len(rows) > 1:
+        out.handle_starttag("tbody", [])
+        out.handle_data("\n")
+        for line in rows[1:]:
+            table_row(line, "td", out)
+            out.handle_data("\n")
+        out.handle_endtag("tbody")
+        out.handle_data("\n")
+    out.handle_endtag("table")
+
+def table_row(line: str, tag: str, out):
+    out.handle_starttag("tr", [])
+    for cell in line[1:-1].split("|"):
+        out.handle_data("\n  ")
+        out.handle_starttag(tag, [])
+        inline(cell.strip(), out)
+        out.handle_endtag(tag)
+    out.handle_data("\n")
+    out.handle_endtag("tr")
+
+def inline(text: str, out):
+    # Code spans, inline links and emphasis. Emphasis is only accepted at
+    # word boundaries and properly nested, where every Markdown flavour
+    # agrees; intraword or unmatched delimiters go to markdown2.
+    stack = []
+    pos = 0
+    n = len(text)
+    while True:
+        match = SPECIAL_RE.search(text, pos)
+        if match is None:
+            break
+        i = match.start()
+        c = text[i]
+        if i > pos:
+            out.handle_data(text[pos:i])
+        if c == "`":
+            end = text.find("`", i + 1)
+            code = text[i + 1:end]
+            if end < 0 or not code.strip(" ") or code[0] == " " or code[-1] == " ":
+                raise Unsupported
+            if text.startswith("``", end) or (i and text[i - 1] == "`"):
+                # Runs of backticks delimit spans by their length
+                raise Unsupported
+            out.handle_starttag("code", [])
+            out.handle_data(code)
+            out.handle_endtag("code")
+            pos = end + 1
+        elif c == "[":
+            link = LINK_RE.match(text, i)
+            if link is None:
+                raise Unsupported
+            out.handle_starttag("a", [])
+            inline(link.group(1), out)
+            out.handle_endtag("a")
+            pos = link.end()
+        elif c in "*_":
+            j = i + 1
+            while j < n and text[j] == c:
+                j += 1
+            delim = text[i:j]
+            before = text[i - 1] if i else " "
+            after = text[j] if j < n else " "
+            if len(delim) > 2:
+                raise Unsupported
+            if stack and stack[-1] == delim and (before.isalnum() or before in CLOSE_BEFORE or before == "`") and (after.isspace() or after in CLOSE_BEFORE):
+                stack.pop()
+                out.handle_endtag("em" if len(delim) == 1 else "strong")
+            elif (before.isspace() or before in OPEN_AFTER) and (after.isalnum() or after in "`[") and delim not in stack and (not stack or stack[-1][0] == c):
+                stack.append(delim)
+                out.handle_starttag("em" if len(delim) == 1 else "strong", [])
+            else:
+                raise Unsupported
+            pos = j
+        elif c == "!":
+            if text.startswith("[", i + 1):
+                raise Unsupported
+            out.handle_data("!")
+            pos = i + 1
+        elif c == "&":
+            if i + 1 < n and (text[i + 1].isalnum() or text[i + 1] == "#"):
+                # Possibly an entity, which markdown2 leaves in place
+                raise Unsupported
+            out.handle_data("&")
+            pos = i + 1
+        else:
+            raise Unsupported
+    if stack:
+        raise Unsupported
+    if pos < n:
+        out.handle_data(text[pos:])
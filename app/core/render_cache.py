@@ -0,0 +1,165 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "tarqim", "render")
+CACHE_FORMAT = 3
+
+CacheKey = Tuple[str, int, int]  # (path, st_mtime_ns, st_size)
+
+def cache_key_for(path: str, st: Optional[os.stat_result] = None) -> CacheKey:
+    if st is None:
+        st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+def estimate_size(doc: list) -> int:
+    # Rough in-memory footprint of a parsed document: string payload plus the
+    # tuple/str overhead of each run.
+    size = 0
+    for _, runs in doc:
+        size += 100
+        for text, tags in runs:
+            size += len(text) + 120 + 8 * len(tags)
+    return size
+
+class RenderCache:
+    # Parsed documents (lists of (block key, runs)) keyed by path, mtime and size.
+    # Entries live in a byte-bounded LRU and are optionally mirrored on disk, so
+    # unchanged documents never go through markdown2 again.
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[str] = CACHE_DIR, disk_max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.entries: "OrderedDict[str, Tuple[CacheKey, list, int]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def configure(self, max_bytes: Optional[int] = None, use_disk: Optional[bool] = None, disk_max_bytes: Optional[int] = None):
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        if use_disk is not None:
+            self.disk_dir = CACHE_DIR if use_disk else None
+        if disk_max_bytes is not None:
+            self.disk_max_bytes = disk_max_bytes
+        with self.lock:
+            self.evict()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+        }
+
+    def get(self, key: CacheKey) -> Optional[list]:
+        path = key[0]
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry and entry[0] == key:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+
+        doc = self.load_from_disk(key)
+        with self.lock:
+            if doc is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self.store(key, doc)
+        return doc
+
+    def blocks(self, path: str) -> Dict[bytes, list]:
+        # Runs of the last cached version of a file, even a stale one, so that a
+        # changed file only needs its changed blocks parsed again.
+        with self.lock:
+            entry = self.entries.get(os.path.abspath(path))
+        return dict(entry[1]) if entry else {}
+
+    def put(self, key: CacheKey, doc: list):
+        self.store(key, doc)
+        if self.disk_dir:
+            threading.Thread(target=self.save_to_disk, args=(key, doc), daemon=True).start()
+
+    def store(self, key: CacheKey, doc: list):
+        size = estimate_size(doc)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key[0], None)
+            if old:
+                self.total_bytes -= old[2]
+            self.entries[key[0]] = (key, doc, size)
+            self.total_bytes += size
+            self.evict()
+
+    def evict(self):
+        while self.entries and self.total_bytes > self.max_bytes:
+            _, (_, _, size) = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    # --- Disk store ---
+    def disk_path(self, path: str) -> str:
+        name = hashlib.blake2b(path.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+        return os.path.join(self.disk_dir, name + ".pickle")
+
+    def load_from_disk(self, key: CacheKey) -> Optional[list]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self.disk_path(key[0]), "rb") as f:
+                version, stored_key, doc = pickle.load(f)
+        except Exception:
+            return None
+        if version != CACHE_FORMAT or tuple(stored_key) != key:
+            return None
+        return doc
+
+    def save_to_disk(self, key: CacheKey, doc: list):
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            target = self.disk_path(key[0])
+            tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump((CACHE_FORMAT, key, doc), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, target)
+            self.prune_disk()
+        except Exception:
+            pass
+
+    def prune_disk(self):
+        # Drop the least recently written files once the store grows too big
+        files = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".pickle"):
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+render_cache = RenderCache()
@@ -0,0 +1,575 @@
+import bisect
+import hashlib
+import re
+import threading
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from html.parser import HTMLParser
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from app.core import native_parser
+from app.core.highlight import LANGUAGE_TAG
+from app.core.images import IMAGE_TAG
+from app.core.render_cache import CacheKey, render_cache
+from app.core.loader import DECODE_ERRORS, MappedFile
+from app.core.trace import tracer
+
+# The pure half of rendering: Markdown source -> blocks -> (text, tags) runs ->
+# block ops. Nothing here touches Tk; ops are applied by a sink, which is a
+# Text widget in the app (renderer.TkSink) and a recording or null sink when
+# running headless.
+
+# Code blocks are highlighted by the preview when they scroll into view;
+# highlightjs-lang makes markdown2 only tag their language instead of running
+# Pygments on every render
+MARKDOWN_EXTRAS = ["fenced-code-blocks", "tables", "highlightjs-lang"]
+
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+LIST_ITEM_RE = re.compile(r"^ {0,3}([*+-]|\d{1,9}[.)])(\s|$)")
+LINK_DEF_RE = re.compile(r"^ {0,3}\[[^\]\n]+\]:[ \t]*\S.*$", re.MULTILINE)
+LINK_DEF_BYTES_RE = re.compile(LINK_DEF_RE.pattern.encode(), re.MULTILINE)
+
+# Virtual documents are cut into chunks of about this many estimated lines;
+# the worker parses the first two for the first paint
+CHUNK_LINES = 400
+
+Run = Tuple[str, Tuple[str, ...]]
+
+class MarkdownRenderParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.current_tags = []
+        self.runs: List[Run] = []
+        self.pending_text: List[str] = []
+        self.pending_tags: Tuple[str, ...] = ()
+        self.language: Optional[str] = None  # of the code block being read
+
+    def feed_block(self, html: str) -> List[Run]:
+        # Returns the block as a list of (text, tags) runs; neighbouring runs
+        # that share the same tags are merged.
+        self.reset()
+        self.begin()
+        self.feed(html)
+        self.close()
+        return self.finish()
+
+    def begin(self):
+        # The handle_* methods can also be driven directly, between begin()
+        # and finish(), by a parser that does not go through HTML
+        self.current_tags = []
+        self.runs = []
+        self.pending_text = []
+        self.pending_tags = ()
+        self.language = None
+
+    def finish(self) -> List[Run]:
+        self.flush_pending()
+        return self.runs
+
+    def emit(self, text: str, tags: Tuple[str, ...] = ()):
+        if tags != self.pending_tags:
+            self.flush_pending()
+            self.pending_tags = tags
+        self.pending_text.append(text)
+
+    def flush_pending(self):
+        if self.pending_text:
+            self.runs.append(("".join(self.pending_text), self.pending_tags))
+            self.pending_text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'img':
+            self.handle_image(dict(attrs))
+            return
+        self.current_tags.append(tag)
+        if tag == 'li':
+            self.emit("• ", tuple(self.current_tags))
+        elif tag == 'code' and 'pre' in self.current_tags:
+            # class="python language-python" for fenced blocks with a language
+            classes = dict(attrs).get("class") or ""
+            self.language = next((c[9:] for c in classes.split() if c.startswith("language-")), None)
+
+    def handle_image(self, attrs):
+        # A run of its own holding the alt text, which the preview swaps for
+        # the image; images are void elements, so they never go on the stack
+        src = attrs.get("src")
+        if not src:
+            return
+        alt = " ".join((attrs.get("alt") or "").split()) or src.rsplit("/", 1)[-1]
+        self.flush_pending()
+        self.emit(alt, tuple(self.current_tags) + ("img", IMAGE_TAG + src))
+        self.flush_pending()
+
+    def handle_endtag(self, tag):
+        # Insert newline after block elements
+        if tag in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'li', 'pre', 'div', 'blockquote']:
+            self.emit("\n")
+
+        if tag == 'pre':
+            self.language = None
+
+        if tag in self.current_tags:
+            for i in range(len(self.current_tags) - 1, -1, -1):
+                if self.current_tags[i] == tag:
+                    self.current_tags.pop(i)
+                    break
+
+    def handle_data(self, data):
+        if not self.current_tags:
+            if not data.strip():
+                return
+
+        if self.language and 'pre' in self.current_tags:
+            self.emit(data, tuple(self.current_tags) + (LANGUAGE_TAG + self.language,))
+        else:
+            self.emit(data, tuple(self.current_tags))
+
+def split_blocks(md_text: str) -> List[str]:
+    # Split the source into top-level blocks at blank lines. Each block keeps its
+    # trailing blank lines, so "".join(split_blocks(text)) == text.
+    return [block for block, _ in iter_blocks(md_text.splitlines(keepends=True))]
+
+def iter_blocks(lines: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    # split_blocks over a stream of lines (line endings kept), yielding every
+    # block with its number of lines as soon as the next block starts
+    current = []
+    first_line = None
+    fence = None
+    after_blank = False
+
+    for line in lines:
+        if fence:
+            current.append(line)
+            stripped = line.strip()
+            if stripped.startswith(fence) and not stripped.strip(fence[0]):
+                fence = None
+            continue
+
+        if not line.strip():
+            current.append(line)
+            after_blank = first_line is not None
+            continue
+
+        if after_blank and not _continues_block(line, first_line):
+            yield "".join(current), len(current)
+            current = []
+            first_line = None
+        after_blank = False
+
+        if first_line is None:
+            first_line = line
+        match = FENCE_RE.match(line)
+        if match:
+            fence = match.group(1)
+        current.append(line)
+
+    if current:
+        yield "".join(current), len(current)
+
+def _continues_block(line: str, first_line: str) -> bool:
+    # Indented lines belong to the previous list item or code block, and list
+    # items separated by blank lines form a single (loose) list.
+    if line[0] in " \t":
+        return True
+    return bool(LIST_ITEM_RE.match(line) and LIST_ITEM_RE.match(first_line))
+
+def link_references(md_text: str) -> str:
+    # Reference-style link definitions apply document-wide, so they are appended
+    # to every block that may use them.
+    return "\n".join(LINK_DEF_RE.findall(md_text))
+
+def with_references(block: str, refs: str) -> str:
+    if refs and "[" in block:
+        return f"{block}\n\n{refs}\n"
+    return block
+
+def block_key(block: str, refs: str = "") -> bytes:
+    block = with_references(block, refs)
+    return hashlib.blake2b(block.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+# Heading tag -> level
+HEADING_TAGS = {f"h{level}": level for level in range(1, 7)}
+
+def block_headings(runs: Sequence[Run]) -> List[Tuple[int, int, str]]:
+    # (line within the block, level, title) of every heading in a block's
+    # runs, read from their tags, so cached renders have them too
+    headings = []
+    line = 0
+    current = None
+    for text, tags in runs:
+        level = next((HEADING_TAGS[tag] for tag in tags if tag in HEADING_TAGS), 0)
+        if level:
+            if current is None:
+                current = [line, level, []]
+                headings.append(current)
+            current[2].append(text)
+        else:
+            current = None
+        line += text.count("\n")
+    return [(line, level, "".join(parts).strip()) for line, level, parts in headings]
+
+def count_lines(runs: List[Run]) -> int:
+    return max(1, sum(text.count("\n") for text, _ in runs))
+
+def diff_blocks(old: List[bytes], new: List[bytes]) -> List[Tuple[str, int, int, int, int]]:
+    # Trim the common prefix/suffix first; edits are usually local, which keeps the
+    # SequenceMatcher input small.
+    lo = 0
+    limit = min(len(old), len(new))
+    while lo < limit and old[lo] == new[lo]:
+        lo += 1
+    old_hi, new_hi = len(old), len(new)
+    while old_hi > lo and new_hi > lo and old[old_hi - 1] == new[new_hi - 1]:
+        old_hi -= 1
+        new_hi -= 1
+
+    matcher = SequenceMatcher(None, old[lo:old_hi], new[lo:new_hi], autojunk=False)
+    return [
+        (tag, i1 + lo, i2 + lo, j1 + lo, j2 + lo)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+_local = threading.local()
+
+def block_html(source: str, refs: str = "") -> str:
+    # markdown2 and the HTML parser keep per-instance state, so every thread
+    # gets its own pair. markdown2 is imported on first use: a first paint from
+    # the render cache does not need it.
+    if not hasattr(_local, "parser"):
+        import markdown2
+        _local.md = markdown2.Markdown(extras=MARKDOWN_EXTRAS)
+        _local.parser = MarkdownRenderParser()
+    with tracer.span("markdown2", "render"):
+        return _local.md.convert(with_references(source, refs))
+
+def html_runs(html: str) -> List[Run]:
+    if not hasattr(_local, "parser"):
+        block_html("")
+    with tracer.span("html", "render"):
+        return _local.parser.feed_block(html)
+
+class ParserBackend:
+    # Turns the source of one block into runs
+    name = ""
+
+    def parse(self, source: str, refs: str = "") -> List[Run]:
+        raise NotImplementedError
+
+class Markdown2Backend(ParserBackend):
+    # Markdown -> HTML (markdown2) -> runs (MarkdownRenderParser)
+    name = "markdown2"
+
+    def parse(self, source: str, refs: str = "") -> List[Run]:
+        return html_runs(block_html(source, refs))
+
+class NativeBackend(ParserBackend):
+    # Markdown -> runs without the HTML round-trip. Blocks using constructs
+    # the native parser does not handle go to `fallback`.
+    name = "native"
+
+    def __init__(self, fallback: Optional[ParserBackend] = None):
+        self.fallback = fallback or Markdown2Backend()
+        self.native = 0
+        self.fallbacks = 0
+
+    def parse(self, source: str, refs: str = "") -> List[Run]:
+        if not hasattr(_local, "builder"):
+            _local.builder = MarkdownRenderParser()
+        builder = _local.builder
+        try:
+            with tracer.span("native", "render"):
+                builder.begin()
+                native_parser.convert(source, builder)
+                runs = builder.finish()
+        except native_parser.Unsupported:
+            self.fallbacks += 1
+            return self.fallback.parse(source, refs)
+        self.native += 1
+        return runs
+
+PARSER_BACKENDS = {"native": NativeBackend, "markdown2": Markdown2Backend}
+DEFAULT_BACKEND = "native"
+
+_backend: ParserBackend = NativeBackend()
+
+def set_parser_backend(name: str) -> ParserBackend:
+    # Unknown names get the default backend
+    global _backend
+    if name not in PARSER_BACKENDS:
+        name = DEFAULT_BACKEND
+    if _backend.name != name:
+        _backend = PARSER_BACKENDS[name]()
+    return _backend
+
+def parser_backend() -> ParserBackend:
+    return _backend
+
+def parse_block(source: str, refs: str = "") -> List[Run]:
+    return _backend.parse(source, refs)
+
+def warm_up():
+    # Import and set up markdown2 on the calling (worker) thread ahead of use
+    block_html("")
+
+class RenderJob:
+    # Generation token of one render request. Starting a new render cancels the
+    # previous job; workers and the apply stage check the flag and stop early.
+    def __init__(self):
+        self.cancelled = False
+        self.partial: Optional["Document"] = None  # early first paint of a streamed document
+
+class Document:
+    # Output of the worker stage: block keys and estimated heights of the whole
+    # document, and the runs of the blocks parsed so far. Missing blocks are
+    # parsed on demand, and the document goes to the render cache once complete.
+    def __init__(self, keys: List[bytes], heights: List[int], runs: List[Optional[List[Run]]], virtual: bool,
+                 sources: Optional[List[str]] = None, refs: str = "", cache_key: Optional[CacheKey] = None):
+        self.keys = keys
+        self.heights = heights
+        self.runs = runs
+        self.virtual = virtual
+        self.sources = sources
+        self.refs = refs
+        self.cache_key = cache_key
+        self.missing = sum(1 for block in runs if block is None)
+        self.chars: Optional[int] = None  # set when the text itself is not in memory
+        self.lock = threading.Lock()
+
+    def get_runs(self, j: int) -> List[Run]:
+        runs = self.runs[j]
+        if runs is not None:
+            return runs
+        runs = parse_block(self.sources[j], self.refs)
+        with self.lock:
+            if self.runs[j] is not None:
+                return self.runs[j]
+            self.runs[j] = runs
+            self.missing -= 1
+            complete = self.missing == 0
+        if complete:
+            self.store()
+        return runs
+
+    def parse(self, blocks, job: Optional[RenderJob] = None) -> bool:
+        for j in blocks:
+            if job and job.cancelled:
+                return False
+            self.get_runs(j)
+        return True
+
+    def release(self, blocks: Iterable[int]):
+        # Drop the runs of blocks that left the window; they are parsed again
+        # from their sources when needed
+        with self.lock:
+            for j in blocks:
+                if self.runs[j] is not None:
+                    self.runs[j] = None
+                    self.missing += 1
+
+    def store(self):
+        if self.cache_key is not None:
+            render_cache.put(self.cache_key, list(zip(self.keys, self.runs)))
+
+def prepare_document(md_text: str, cache_key: Optional[CacheKey], virtual: bool, rendered=frozenset(), job: Optional[RenderJob] = None) -> Optional[Document]:
+    # Worker stage: markdown -> runs, without touching Tk. Blocks whose
+    # keys are in `rendered` are already in the widget and only parsed when the
+    # document has to be complete for the cache. Returns None when cancelled.
+    with tracer.span("cache", "render"):
+        doc = render_cache.get(cache_key) if cache_key else None
+    if doc is not None:
+        runs = [block for _, block in doc]
+        return Document([key for key, _ in doc], [count_lines(block) for block in runs], runs, virtual)
+
+    with tracer.span("split", "render"):
+        sources = split_blocks(md_text)
+        refs = link_references(md_text)
+        keys = [block_key(source, refs) for source in sources]
+        heights = [max(1, source.count("\n")) for source in sources]
+
+    # Blocks of a previously cached version of the file are reused
+    runs = [None] * len(keys)
+    if cache_key is not None:
+        known = render_cache.blocks(cache_key[0])
+        runs = [known.get(key) for key in keys]
+    document = Document(keys, heights, runs, virtual, sources, refs, cache_key)
+    if document.missing == 0:
+        document.store()
+
+    if virtual:
+        # Only the first screens are needed for the first paint; the rest is
+        # parsed when scrolled to, or by a follow-up job.
+        first_paint = bisect.bisect_left(document_offsets(heights), 2 * CHUNK_LINES) + 1
+        blocks = range(min(first_paint, len(keys)))
+    elif cache_key is not None:
+        blocks = range(len(keys))
+    else:
+        blocks = [j for j, key in enumerate(keys) if key not in rendered]
+    if not document.parse(blocks, job):
+        return None
+    return document
+
+class MappedSources:
+    # Block sources of a streamed document: byte offsets into the memory-mapped
+    # file, one per block plus the end, decoded when a block is parsed
+    def __init__(self, mapped: MappedFile, offsets: array):
+        self.mapped = mapped
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, j: int) -> str:
+        return self.mapped.decode(self.offsets[j], self.offsets[j + 1])
+
+def prepare_stream(mapped: MappedFile, job: RenderJob) -> Optional[Document]:
+    # Worker stage for large files: blocks are split, hashed and measured
+    # straight from the memory map, so only a block at a time is decoded. Once
+    # the first chunk is parsed, a copy of the document so far is left in
+    # job.partial for an early first paint; parsing goes on up to the usual
+    # first window. Returns None when cancelled.
+    refs = ""
+    if mapped.data.find(b"]:", mapped.start) >= 0:
+        refs = "\n".join(m.group().decode(mapped.codec, DECODE_ERRORS) for m in LINK_DEF_BYTES_RE.finditer(mapped.data, mapped.start))
+    keys: List[bytes] = []
+    heights: List[int] = []
+    runs: List[Optional[List[Run]]] = []
+    offsets = array("Q", [mapped.start])
+    sizes = deque()
+
+    def lines():
+        for line, size in mapped.iter_lines():
+            sizes.append(size)
+            yield line
+
+    lines_parsed = 0
+    chars = 0
+    for block, count in iter_blocks(lines()):
+        if job.cancelled:
+            return None
+        end = offsets[-1]
+        for _ in range(count):
+            end += sizes.popleft()
+        offsets.append(end)
+        keys.append(block_key(block, refs))
+        heights.append(max(1, block.count("\n")))
+        chars += len(block)
+        if lines_parsed >= 2 * CHUNK_LINES:
+            runs.append(None)
+            continue
+        runs.append(parse_block(block, refs))
+        lines_parsed += heights[-1]
+        if lines_parsed >= CHUNK_LINES and job.partial is None:
+            partial = Document(keys[:], heights[:], runs[:], True, MappedSources(mapped, offsets[:]), refs)
+            partial.chars = chars
+            job.partial = partial
+
+    document = Document(keys, heights, runs, True, MappedSources(mapped, offsets), refs)
+    document.chars = chars
+    return document
+
+def document_offsets(heights: List[int]) -> List[int]:
+    offsets = [0]
+    for height in heights:
+        offsets.append(offsets[-1] + height)
+    return offsets
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def render_executor() -> ThreadPoolExecutor:
+    # A single worker: renders are sequential anyway and stale jobs bail out early
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tarqim-render")
+    return _executor
+
+class BlockOp(NamedTuple):
+    # One edit of the rendered block list: "delete" removes blocks
+    # [index, stop), "insert" puts one block at index
+    kind: str
+    index: int
+    stop: int = 0
+    key: bytes = b""
+    runs: Sequence[Run] = ()
+
+def block_ops(old: List[bytes], keys: List[bytes], get_runs: Callable[[int], List[Run]]) -> Iterator[BlockOp]:
+    # The edits that turn the blocks `old` into `keys`. Back to front, so the
+    # indexes of the remaining edits stay valid; runs are fetched as needed.
+    for _, i1, i2, j1, j2 in reversed(diff_blocks(old, keys)):
+        if i2 > i1:
+            yield BlockOp("delete", i1, i2)
+        for offset, j in enumerate(range(j1, j2)):
+            yield BlockOp("insert", i1 + offset, key=keys[j], runs=get_runs(j))
+
+class BlockView:
+    # The blocks currently held by a sink, by key. A new block list is applied
+    # as ops, one inserted block per step, so an apply can stop between any
+    # two blocks and keys always match what the sink holds.
+    def __init__(self, sink):
+        self.sink = sink
+        self.keys: List[bytes] = []
+
+    def apply(self, op: BlockOp):
+        if op.kind == "delete":
+            self.sink.delete(op.index, op.stop)
+            del self.keys[op.index:op.stop]
+        else:
+            self.sink.insert(op.index, op.runs)
+            self.keys.insert(op.index, op.key)
+
+    def apply_steps(self, keys: List[bytes], get_runs: Callable[[int], List[Run]]) -> Iterator[None]:
+        for op in block_ops(self.keys, keys, get_runs):
+            self.apply(op)
+            if op.kind == "insert":
+                yield
+
+    def replace_steps(self, start: int, stop: int, keys: List[bytes], get_runs: Callable[[int], List[Run]]) -> Iterator[None]:
+        # apply_steps for the blocks [start, stop) only; get_runs is indexed
+        # like `keys`
+        for op in block_ops(self.keys[start:stop], keys, get_runs):
+            self.apply(op._replace(index=op.index + start, stop=op.stop + start))
+            if op.kind == "insert":
+                yield
+
+    def reset(self):
+        # Forget the blocks; the sink's output is left alone
+        self.sink.reset()
+        self.keys = []
+
+class NullSink:
+    # Headless sink that only counts what it is given
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.blocks = 0
+        self.inserted = 0
+        self.deleted = 0
+        self.runs = 0
+
+    def delete(self, start: int, stop: int):
+        self.blocks -= stop - start
+        self.deleted += stop - start
+
+    def insert(self, index: int, runs: Sequence[Run]):
+        self.blocks += 1
+        self.inserted += 1
+        self.runs += len(runs)
+
+class RecordingSink:
+    # Headless sink that keeps the runs of every block, in order
+    def __init__(self):
+        self.blocks: List[Sequence[Run]] = []
+
+    def reset(self):
+        self.blocks = []
+
+    def delete(self, start: int, stop: int):
+        del self.blocks[start:stop]
+
+    def insert(self, index: int, runs: Sequence[Run]):
+        self.blocks.insert(index, runs)
+
+    def text(self) -> str:
+        return "".join(text for runs in self.blocks for text, _ in runs)
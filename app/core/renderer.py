@@ -1,86 +1,624 @@
+import bisect
+import os
+import time
 import tkinter as tk
-from tkinter import font
-from html.parser import HTMLParser
-import markdown2
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from app.core.theme import styles
+from app.core.render_cache import CacheKey
+from app.core.loader import MappedFile
+from app.core.trace import tracer
+from app.core.highlight import HIGHLIGHTED_TAG, LANGUAGE_TAG, highlight_cache, highlight_executor
+from app.core.images import IMAGE_TAG, ImageKey, decode_image, image_cache, image_executor, target_size
+from app.core.render_ops import (
+    CHUNK_LINES, BlockView, Document, MappedSources, RenderJob, Run, block_headings, document_offsets,
+    prepare_document, prepare_stream, render_executor,
+)
 
-class MarkdownRenderParser(HTMLParser):
+INSERT_MARK = "tq_insert"
+VIEW_MARK = "tq_view"
+
+# Number of (text, tags) pairs passed to a single Text.insert call
+RUN_BATCH_SIZE = 256
+
+# Documents above this many characters are rendered in virtual mode, a window
+# of at most WINDOW_CHUNKS chunks of about CHUNK_LINES lines each at a time.
+VIRTUAL_THRESHOLD = 1024 * 1024
+WINDOW_CHUNKS = 3
+WINDOW_EDGE = 0.15
+
+# The apply stage of render_async runs in slices of this many seconds
+SLICE_SECONDS = 0.012
+POLL_MS = 10
+
+# Ranges passed to a single tag_add call when highlighting a code block
+HIGHLIGHT_BATCH_SIZE = 2048
+
+# Images are shrunk to the width of the preview, less this many pixels for
+# indentation; before the preview is laid out, its width is taken as
+# DEFAULT_PREVIEW_WIDTH
+IMAGE_MARGIN = 40
+IMAGE_MIN_WIDTH = 100
+DEFAULT_PREVIEW_WIDTH = 800
+
+def insert_runs(text_widget: tk.Text, index: str, runs: List[Run], batch_size: int = RUN_BATCH_SIZE):
+    # Insert runs with multi-pair Text.insert calls: one Tcl round-trip per batch
+    # instead of one per run. The index must be a right-gravity mark so that
+    # successive batches end up after each other.
+    for start in range(0, len(runs), batch_size):
+        args = []
+        for text, tags in runs[start:start + batch_size]:
+            args.append(text)
+            args.append(tags)
+        text_widget.insert(index, *args)
+
+class InlineImages:
+    # Photos for the image runs of a preview, from the shared image_cache. A
+    # photo missing from the cache is created blank at the size it is shown
+    # at, so the layout does not move when the pixels arrive: they are decoded
+    # on a worker and copied in once ready. Relative paths are resolved
+    # against base_dir.
     def __init__(self, text_widget: tk.Text):
-        super().__init__()
         self.text_widget = text_widget
-        self.current_tags = []
-        self.configure_styles()
-        
-    def configure_styles(self):
-        # Fonts
-        available_fonts = font.families()
-        base_font_family = "Helvetica"
-        if "Segoe UI" in available_fonts:
-            base_font_family = "Segoe UI"
-        elif "Roboto" in available_fonts:
-            base_font_family = "Roboto"
-        elif "Arial" in available_fonts:
-            base_font_family = "Arial"
-            
-        code_font_family = "Courier"
-        if "Consolas" in available_fonts:
-            code_font_family = "Consolas"
-        elif "Courier New" in available_fonts:
-            code_font_family = "Courier New"
-
-        base_font = (base_font_family, 11)
-        code_font = (code_font_family, 10)
-        
-        # Configure Tags
-        self.text_widget.tag_configure("h1", font=(base_font_family, 24, "bold"), spacing1=20, spacing3=10, foreground="#2c3e50")
-        self.text_widget.tag_configure("h2", font=(base_font_family, 20, "bold"), spacing1=15, spacing3=8, foreground="#34495e")
-        self.text_widget.tag_configure("h3", font=(base_font_family, 16, "bold"), spacing1=12, spacing3=5, foreground="#2c3e50")
-        self.text_widget.tag_configure("h4", font=(base_font_family, 14, "bold"), spacing1=10, spacing3=5, foreground="#2c3e50")
-        self.text_widget.tag_configure("h5", font=(base_font_family, 12, "bold"), spacing1=10, spacing3=5, foreground="#2c3e50")
-        self.text_widget.tag_configure("h6", font=(base_font_family, 11, "bold"), spacing1=10, spacing3=5, foreground="#2c3e50")
-        
-        self.text_widget.tag_configure("p", font=base_font, spacing1=5, spacing3=5)
-        self.text_widget.tag_configure("code", font=code_font, background="#f0f0f0", foreground="#c7254e")
-        self.text_widget.tag_configure("pre", font=code_font, background="#f8f9fa", lmargin1=20, lmargin2=20)
-        self.text_widget.tag_configure("strong", font=(base_font_family, 11, "bold"))
-        self.text_widget.tag_configure("em", font=(base_font_family, 11, "italic"))
-        self.text_widget.tag_configure("ul", lmargin1=20, lmargin2=20)
-        self.text_widget.tag_configure("li", lmargin1=20, lmargin2=20, spacing1=2)
-        self.text_widget.tag_configure("a", foreground="#3498db", underline=True)
-        self.text_widget.tag_configure("blockquote", lmargin1=20, lmargin2=20, background="#f9f9f9", foreground="#555")
-
-    def handle_starttag(self, tag, attrs):
-        self.current_tags.append(tag)
-        if tag == 'li':
-            self.text_widget.insert("end", "• ", tuple(self.current_tags))
-
-    def handle_endtag(self, tag):
-        # Insert newline after block elements
-        if tag in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'li', 'pre', 'div', 'blockquote']:
-            self.text_widget.insert("end", "\n")
-            
-        if tag in self.current_tags:
-            for i in range(len(self.current_tags) - 1, -1, -1):
-                if self.current_tags[i] == tag:
-                    self.current_tags.pop(i)
-                    break
-
-    def handle_data(self, data):
-        if not self.current_tags:
-            if not data.strip():
-                return
-        
-        if 'pre' in self.current_tags:
-            self.text_widget.insert("end", data, tuple(self.current_tags))
+        self.base_dir = ""
+        self.pending: Dict[ImageKey, Future] = {}  # photos still being decoded
+
+    def max_width(self) -> int:
+        tw = self.text_widget
+        width = tw.winfo_width()
+        if width <= 1:
+            width = DEFAULT_PREVIEW_WIDTH
+        return max(IMAGE_MIN_WIDTH, width - 2 * int(tw.cget("padx")) - IMAGE_MARGIN)
+
+    def photo(self, src: str) -> Optional[tk.PhotoImage]:
+        # None for images that cannot be shown; remote ones are not fetched
+        if src.startswith("file://"):
+            src = src[7:]
+        elif "://" in src or src.startswith("data:"):
+            return None
+        path = os.path.normpath(os.path.join(self.base_dir, os.path.expanduser(src)))
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        size = image_cache.size(path, mtime)
+        if size is None:
+            return None
+        width, height, subsample = target_size(size, self.max_width())
+        key = (path, mtime, width)
+        photo = image_cache.get(key)
+        if photo is None:
+            photo = tk.PhotoImage(master=self.text_widget, width=width, height=height)
+            image_cache.put(key, photo, width * height * 4)
+            future = self.pending[key] = image_executor().submit(decode_image, path, width, height)
+            self.wait_decode(key, photo, subsample, future)
+        return photo
+
+    def wait_decode(self, key: ImageKey, photo: tk.PhotoImage, subsample: int, future: Future):
+        if self.pending.get(key) is not future:
+            # Closed
+            return
+        if not future.done():
+            self.text_widget.after(POLL_MS, self.wait_decode, key, photo, subsample, future)
+            return
+        del self.pending[key]
+        try:
+            decoded = tk.PhotoImage(master=self.text_widget, data=future.result())
+            with tracer.span("tk", "render"):
+                photo.tk.call(photo.name, "copy", decoded.name, "-subsample", subsample, subsample)
+        except Exception as e:
+            # Decoded again the next time it is shown, e.g. once the file is fixed
+            image_cache.discard(key, photo)
+            print(f"Error loading image: {e}")
+
+    def close(self):
+        # Photos left blank are dropped from the cache, to be decoded again
+        # by whichever preview shows them next
+        for key, future in self.pending.items():
+            future.cancel()
+            image_cache.discard(key)
+        self.pending = {}
+
+class TkSink:
+    # Applies block ops to a Text widget. Every block with content starts at a
+    # right-gravity mark, so blocks are found without tracking line numbers.
+    # Headings get a mark of their own as their block is inserted, and the
+    # photos shown in a block are kept with it.
+    def __init__(self, text_widget: tk.Text, batch_size: int = RUN_BATCH_SIZE):
+        self.text_widget = text_widget
+        self.batch_size = batch_size
+        self.images = InlineImages(text_widget)
+        self.marks: List[Optional[str]] = []  # start mark per block
+        self.headings: List[List[Tuple[str, int, str]]] = []  # (mark, level, title) per block
+        self.photos: List[List[tk.PhotoImage]] = []  # per block
+        self.mark_seq = 0
+        self.version = 0  # bumped when blocks with headings come or go
+
+    def reset(self):
+        for mark in self.marks:
+            if mark:
+                self.text_widget.mark_unset(mark)
+        for headings in self.headings:
+            for mark, _, _ in headings:
+                self.text_widget.mark_unset(mark)
+        if any(self.headings):
+            self.version += 1
+        self.marks = []
+        self.headings = []
+        self.photos = []
+
+    def block_start(self, i: int) -> str:
+        # Blocks that rendered nothing have no mark; their position is that of the
+        # next block with content.
+        for mark in self.marks[i:]:
+            if mark:
+                return self.text_widget.index(mark)
+        return self.text_widget.index("end-1c")
+
+    def delete(self, start: int, stop: int):
+        tw = self.text_widget
+        with tracer.span("tk", "render"):
+            tw.delete(self.block_start(start), self.block_start(stop))
+            for mark in self.marks[start:stop]:
+                if mark:
+                    tw.mark_unset(mark)
+            for headings in self.headings[start:stop]:
+                for mark, _, _ in headings:
+                    tw.mark_unset(mark)
+        if any(self.headings[start:stop]):
+            self.version += 1
+        del self.marks[start:stop]
+        del self.headings[start:stop]
+        del self.photos[start:stop]
+
+    def insert(self, index: int, runs: Sequence[Run]):
+        # Inserting in front of the following block's mark pushes it along
+        mark = None
+        headings = []
+        photos = []
+        if runs:
+            tw = self.text_widget
+            with tracer.span("tk", "render"):
+                position = self.block_start(index)
+                tw.mark_set(INSERT_MARK, position)
+                photos = self.insert_block(runs)
+                tw.mark_unset(INSERT_MARK)
+                self.mark_seq += 1
+                mark = f"tq_block{self.mark_seq}"
+                tw.mark_set(mark, position)
+                for line, level, title in block_headings(runs):
+                    self.mark_seq += 1
+                    heading_mark = f"tq_heading{self.mark_seq}"
+                    tw.mark_set(heading_mark, f"{position}+{line} lines")
+                    headings.append((heading_mark, level, title))
+        self.marks.insert(index, mark)
+        self.headings.insert(index, headings)
+        self.photos.insert(index, photos)
+        if headings:
+            self.version += 1
+
+    def insert_block(self, runs: Sequence[Run]) -> List[tk.PhotoImage]:
+        # Inserts the runs at INSERT_MARK. An image run becomes its photo,
+        # with the run's other tags, or stays alt text if it cannot be shown.
+        tw = self.text_widget
+        photos = []
+        start = 0
+        for i, (_, tags) in enumerate(runs):
+            if not tags or not tags[-1].startswith(IMAGE_TAG):
+                continue
+            photo = self.images.photo(tags[-1][len(IMAGE_TAG):])
+            if photo is None:
+                continue
+            insert_runs(tw, INSERT_MARK, runs[start:i], self.batch_size)
+            tw.image_create(INSERT_MARK, image=photo)
+            for tag in tags[:-2]:
+                tw.tag_add(tag, f"{INSERT_MARK}-1c")
+            photos.append(photo)
+            start = i + 1
+        insert_runs(tw, INSERT_MARK, runs[start:] if start else runs, self.batch_size)
+        return photos
+
+class HeadingIndex:
+    # The headings held by a TkSink, in document order. Their marks move with
+    # the text, so the index only goes stale when headings come or go; the
+    # section containing a line is found by bisection, resolving only the
+    # marks it looks at.
+    def __init__(self, sink: TkSink):
+        self.version = sink.version
+        self.marks: List[str] = []
+        self.levels: List[int] = []
+        self.titles: List[str] = []
+        for headings in sink.headings:
+            for mark, level, title in headings:
+                self.marks.append(mark)
+                self.levels.append(level)
+                self.titles.append(title)
+        self.text_widget = sink.text_widget
+
+    def line(self, i: int) -> int:
+        return int(self.text_widget.index(self.marks[i]).split(".")[0])
+
+    def section_at(self, line: int) -> int:
+        # Index of the last heading at or above `line`, -1 before the first
+        lo, hi = 0, len(self.marks)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.line(mid) <= line:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo - 1
+
+class MarkdownRenderer:
+    # Keeps track of which Markdown blocks are currently rendered in a Text widget
+    # and only re-renders the blocks that changed between calls.
+    #
+    # render_async() parses on a worker thread and applies the result on the
+    # main loop in small time slices; a newer request cancels older ones. A
+    # hidden view pauses its render so the single worker is free for the one
+    # in view, and starts it over when shown again.
+    #
+    # Documents larger than virtual_threshold are virtualized: only a window of
+    # block chunks around the viewport is parsed and kept in the widget, and the
+    # scroll position is mapped onto estimated line counts of the whole document.
+    def __init__(self, text_widget: tk.Text, batch_size: int = RUN_BATCH_SIZE, virtual_threshold: int = VIRTUAL_THRESHOLD):
+        self.text_widget = text_widget
+        self.virtual_threshold = virtual_threshold
+        self.sink = TkSink(text_widget, batch_size)
+        self.view = BlockView(self.sink)  # blocks currently in the widget
+        self.images = self.sink.images
+        # Tags are configured once per widget
+        styles.apply(text_widget)
+
+        self.job: Optional[RenderJob] = None
+        self.steps: Optional[Iterator[None]] = None  # apply stage in progress
+        self.request: Optional[Callable[[], None]] = None  # starts the render in progress over
+        self.paused: Optional[Callable[[], None]] = None
+
+        # Whole-document state, used by the virtual mode
+        self.document = Document([], [], [], False)
+        self.offsets = [0]  # cumulative estimated line counts, one entry per block + 1
+        self.chunks = [0]  # first block of every chunk, plus the block count
+        self.window = (0, 0)  # loaded chunk range
+        self.loaded = (0, 0)  # block range of the window
+
+        self.headings: Optional[HeadingIndex] = None  # built on demand
+
+        # Code blocks are highlighted when they come into view
+        self.highlight_job = None
+        self.highlight_pending = set()  # cache keys being tokenized
+        self.closed = False
+
+    @property
+    def virtual(self) -> bool:
+        return self.document.virtual
+
+    def reset(self):
+        self.start_job()
+        self.view.reset()
+        self.window = (0, 0)
+
+    def clear(self):
+        self.reset()
+        self.text_widget.config(state=tk.NORMAL)
+        self.text_widget.delete("1.0", tk.END)
+        self.text_widget.config(state=tk.DISABLED)
+
+    def start_job(self) -> RenderJob:
+        if self.job:
+            self.job.cancelled = True
+        self.stop_apply()
+        self.request = None
+        self.paused = None
+        self.job = RenderJob()
+        return self.job
+
+    def stop_apply(self):
+        if self.steps:
+            self.steps.close()
+            self.steps = None
+
+    def pause(self):
+        # Cancels the render in progress, and the background parse of a
+        # virtual document, until resume()
+        if self.job:
+            self.job.cancelled = True
+        self.stop_apply()
+        if self.request:
+            self.paused, self.request = self.request, None
+        elif self.paused is None and self.document.missing and self.document.cache_key is not None:
+            document = self.document
+            self.paused = lambda: render_executor().submit(document.parse, range(len(document.keys)), self.start_job())
+
+    def resume(self):
+        paused, self.paused = self.paused, None
+        if paused:
+            paused()
+
+    def close(self):
+        # The widget is about to be destroyed: cancel the render, the slices
+        # and polls scheduled for it, and pending highlights and images
+        self.closed = True
+        if self.job:
+            self.job.cancelled = True
+        self.stop_apply()
+        if self.highlight_job:
+            self.text_widget.after_cancel(self.highlight_job)
+            self.highlight_job = None
+        self.images.close()
+
+    def render(self, md_text: str, cache_key: Optional[CacheKey] = None, keep_position: bool = True):
+        # Synchronous render. With a cache key (path, mtime, size) the parsed
+        # document is looked up in and stored to the render cache; a hit skips
+        # markdown2 entirely.
+        self.start_job()
+        document = prepare_document(md_text, cache_key, len(md_text) > self.virtual_threshold, self.rendered_keys())
+        self.run_steps(self.show(document, keep_position))
+
+    def render_async(self, md_text: str, cache_key: Optional[CacheKey] = None, keep_position: bool = True,
+                     on_done: Optional[Callable[[], None]] = None):
+        job = self.start_job()
+        self.request = lambda: self.render_async(md_text, cache_key, keep_position, on_done)
+        future = render_executor().submit(prepare_document, md_text, cache_key, len(md_text) > self.virtual_threshold, self.rendered_keys(), job)
+        self.wait_for(job, future, lambda document: self.apply_async(job, document, keep_position, on_done))
+
+    def render_stream(self, mapped: MappedFile, keep_position: bool = True, on_done: Optional[Callable[[], None]] = None):
+        # Large files are rendered from the memory map, always in virtual mode.
+        # A new file is painted as soon as its first screens are parsed; a
+        # reload of the same file waits for the full scan to keep its position.
+        job = self.start_job()
+        self.request = lambda: self.render_stream(mapped, keep_position, on_done)
+        future = render_executor().submit(prepare_stream, mapped, job)
+        self.wait_stream(job, future, keep_position, on_done)
+
+    def wait_stream(self, job: RenderJob, future: Future, keep_position: bool, on_done: Optional[Callable[[], None]]):
+        if job.partial is not None and not keep_position and not future.done():
+            partial, job.partial = job.partial, None
+            self.apply_async(job, partial, False, None, final=False)
+            keep_position = True
+        if job.cancelled or future.done():
+            self.wait_for(job, future, lambda document: self.apply_async(job, document, keep_position, on_done))
         else:
-            self.text_widget.insert("end", data, tuple(self.current_tags))
+            self.text_widget.after(POLL_MS, self.wait_stream, job, future, keep_position, on_done)
+
+    def rendered_keys(self) -> frozenset:
+        return frozenset(self.view.keys)
+
+    def wait_for(self, job: RenderJob, future: Future, callback: Callable):
+        if job.cancelled:
+            future.cancel()
+            return
+        if not future.done():
+            self.text_widget.after(POLL_MS, self.wait_for, job, future, callback)
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            self.request = None
+            print(f"Error rendering: {e}")
+            return
+        if result is not None:
+            callback(result)
+
+    def apply_async(self, job: RenderJob, document: Document, keep_position: bool, on_done: Optional[Callable[[], None]],
+                    final: bool = True):
+        # A streamed document replaces its early first paint mid-apply
+        self.stop_apply()
+        steps = self.steps = self.show(document, keep_position)
+
+        def run_slice():
+            if job.cancelled or self.steps is not steps:
+                return
+            if not self.run_steps(steps, SLICE_SECONDS):
+                self.text_widget.after(1, run_slice)
+                return
+            self.steps = None
+            if final:
+                self.request = None
+            if document.missing and document.cache_key is not None:
+                # Virtual mode: finish parsing in the background for the cache
+                render_executor().submit(document.parse, range(len(document.keys)), job)
+            self.check_window()
+            self.schedule_highlight()
+            if on_done:
+                on_done()
+
+        run_slice()
+
+    def show(self, document: Document, keep_position: bool) -> Iterator[None]:
+        self.document = document
+        self.loaded = (0, 0)
+        self.offsets = document_offsets(document.heights)
+        if not keep_position:
+            self.window = (0, 0)
+            self.text_widget.yview_moveto(0)
+
+        keys = document.keys
+        if not document.virtual:
+            self.chunks = [0, len(keys)]
+            self.window = (0, 1)
+            return self.apply_steps(keys, document.get_runs)
+
+        # Group blocks into chunks of roughly CHUNK_LINES estimated lines
+        self.chunks = [0]
+        for j in range(len(keys)):
+            if self.offsets[j + 1] - self.offsets[self.chunks[-1]] >= CHUNK_LINES:
+                self.chunks.append(j + 1)
+        if self.chunks[-1] != len(keys):
+            self.chunks.append(len(keys))
+
+        # Keep the current position when re-rendering the same document
+        lo = min(self.window[0], len(self.chunks) - 2)
+        return self.window_steps(lo, lo + 2)
+
+    def window_steps(self, lo: int, hi: int) -> Iterator[None]:
+        chunk_count = len(self.chunks) - 1
+        lo = max(0, lo)
+        hi = min(chunk_count, hi)
+        self.window = (lo, hi)
+        first = self.chunks[lo]
+        last = self.chunks[hi]
+        if isinstance(self.document.sources, MappedSources):
+            # Streamed documents only keep the runs of the loaded window
+            self.document.release(j for j in range(*self.loaded) if not first <= j < last)
+        self.loaded = (first, last)
+        return self.apply_steps(self.document.keys[first:last], lambda j: self.document.get_runs(first + j))
+
+    def load_window(self, lo: int, hi: int):
+        self.run_steps(self.window_steps(lo, hi))
+
+    @property
+    def total_lines(self) -> int:
+        return self.offsets[-1]
+
+    def scroll_fractions(self, first: float, last: float) -> Tuple[float, float]:
+        # Map the Text widget's yview of the loaded window onto the whole document
+        if not self.virtual or not self.total_lines:
+            return first, last
+        start = self.offsets[self.chunks[self.window[0]]]
+        end = self.offsets[self.chunks[self.window[1]]]
+        span = end - start
+        return (start + first * span) / self.total_lines, (start + last * span) / self.total_lines
+
+    def check_window(self):
+        # Load the neighbouring chunk when the viewport gets close to an edge of
+        # the loaded window, and drop chunks that moved far out of view.
+        if not self.virtual or self.steps:
+            return
+        first, last = self.text_widget.yview()
+        lo, hi = self.window
+        if first < WINDOW_EDGE and lo > 0:
+            lo -= 1
+            if hi - lo > WINDOW_CHUNKS:
+                hi -= 1
+        elif last > 1 - WINDOW_EDGE and hi < len(self.chunks) - 1:
+            hi += 1
+            if hi - lo > WINDOW_CHUNKS:
+                lo += 1
+        if (lo, hi) != self.window:
+            self.load_window(lo, hi)
+
+    def jump_to(self, fraction: float):
+        # Scrollbar drag in virtual mode: load the chunks around the target line
+        # and bring the block containing it to the top.
+        if not self.virtual:
+            self.text_widget.yview_moveto(fraction)
+            return
+        self.stop_apply()
+        line = max(0.0, min(1.0, fraction)) * self.total_lines
+        block = max(0, min(len(self.document.keys) - 1, bisect.bisect_right(self.offsets, line) - 1))
+        chunk = bisect.bisect_right(self.chunks, block) - 1
+        self.load_window(chunk - 1, chunk + 2)
+        first = self.chunks[self.window[0]]
+        self.text_widget.yview(self.sink.block_start(block - first))
+
+    def heading_index(self) -> HeadingIndex:
+        # Rebuilt only after headings were added or removed
+        if self.headings is None or self.headings.version != self.sink.version:
+            self.headings = HeadingIndex(self.sink)
+        return self.headings
+
+    def schedule_highlight(self):
+        # The view moved or changed; code blocks in view are highlighted once
+        # the main loop is idle
+        if not self.highlight_job:
+            self.highlight_job = self.text_widget.after_idle(self.highlight_visible)
+
+    def highlight_visible(self):
+        self.highlight_job = None
+        tw = self.text_widget
+        top = tw.index("@0,0")
+        bottom = tw.index(f"@0,{tw.winfo_height()} lineend")
+        # The first code block in view may start above it
+        start = top
+        previous = tw.tag_prevrange("pre", f"{top} +1c")
+        if previous and tw.compare(previous[1], ">", top):
+            start = previous[0]
+        while True:
+            found = tw.tag_nextrange("pre", start, bottom)
+            if not found:
+                break
+            self.highlight_block(*found)
+            start = found[1]
+
+    def highlight_block(self, start: str, end: str):
+        # Tokens are looked up in the highlight cache, or tokenized on a worker
+        # and applied on a later pass. The ranges of each token type go in with
+        # as few tag_add calls as possible.
+        tw = self.text_widget
+        names = tw.tag_names(start)
+        if HIGHLIGHTED_TAG in names:
+            return
+        language = next((name[len(LANGUAGE_TAG):] for name in names if name.startswith(LANGUAGE_TAG)), None)
+        ranges = None
+        if language:
+            code = tw.get(start, end)
+            key = highlight_cache.key(language, code)
+            found, ranges = highlight_cache.lookup(key)
+            if not found:
+                if key not in self.highlight_pending:
+                    self.highlight_pending.add(key)
+                    future = highlight_executor().submit(highlight_cache.highlight, language, code)
+                    self.wait_highlight(key, future)
+                return
+        with tracer.span("tk", "render"):
+            line, col = map(int, start.split("."))
+            for tag, tag_ranges in (ranges or {}).items():
+                for i in range(0, len(tag_ranges), HIGHLIGHT_BATCH_SIZE):
+                    args = []
+                    for l1, c1, l2, c2 in tag_ranges[i:i + HIGHLIGHT_BATCH_SIZE]:
+                        args.append(f"{line + l1}.{c1 + col if l1 == 0 else c1}")
+                        args.append(f"{line + l2}.{c2 + col if l2 == 0 else c2}")
+                    tw.tag_add(tag, *args)
+            tw.tag_add(HIGHLIGHTED_TAG, start, end)
+
+    def wait_highlight(self, key, future: Future):
+        if self.closed:
+            return
+        if not future.done():
+            self.text_widget.after(POLL_MS, self.wait_highlight, key, future)
+            return
+        self.highlight_pending.discard(key)
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Error highlighting code: {e}")
+            return
+        self.schedule_highlight()
+
+    def run_steps(self, steps: Iterator[None], budget: Optional[float] = None) -> bool:
+        # Runs apply steps until done or until the time budget is used up, and
+        # keeps the top visible line in place. Returns True once finished.
+        tw = self.text_widget
+        deadline = time.perf_counter() + budget if budget is not None else None
+        top = tw.index("@0,0")
+        tw.config(state=tk.NORMAL)
+        tw.mark_set(VIEW_MARK, top)
+        tw.mark_gravity(VIEW_MARK, tk.LEFT)
+        try:
+            for _ in steps:
+                if deadline is not None and time.perf_counter() > deadline:
+                    return False
+            return True
+        finally:
+            if tw.index(VIEW_MARK) != top:
+                tw.yview(VIEW_MARK)
+            tw.mark_unset(VIEW_MARK)
+            tw.config(state=tk.DISABLED)
+
+    def replace_blocks(self, start: int, stop: int, keys: List[bytes], get_runs: Callable[[int], List[Run]]):
+        # Live preview: re-render the blocks [start, stop) as `keys` right away.
+        # Edits are small, so this is not sliced like a full apply.
+        with tracer.span("live_update", "render", blocks=stop - start):
+            self.run_steps(self.view.replace_steps(start, stop, keys, get_runs))
+        self.schedule_highlight()
+
+    def apply_steps(self, keys: List[bytes], get_runs: Callable[[int], List[Run]]) -> Iterator[None]:
+        # Turn the rendered blocks into `keys`, one block per step
+        return self.view.apply_steps(keys, get_runs)
 
 def render_markdown(text_widget: tk.Text, md_text: str):
     text_widget.config(state=tk.NORMAL)
     text_widget.delete("1.0", tk.END)
-    
-    html = markdown2.markdown(md_text, extras=["fenced-code-blocks", "tables"])
-    
-    parser = MarkdownRenderParser(text_widget)
-    parser.feed(html)
-    
     text_widget.config(state=tk.DISABLED)
+    MarkdownRenderer(text_widget).render(md_text)
@@ -0,0 +1,294 @@
+import hashlib
+import heapq
+import math
+import operator
+import os
+import pickle
+import re
+import stat
+import sys
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from app.core.dirscan import is_markdown, walk_markdown
+from app.core.fileio import atomic_write
+from app.core.loader import MappedFile
+
+INDEX_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "tarqim", "search")
+INDEX_FORMAT = 2
+
+TOKEN_RE = re.compile(r"\w+")
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Seconds to wait for more file changes before writing the index
+SAVE_DELAY = 5.0
+
+class SearchHit(NamedTuple):
+    path: str
+    score: float
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+def parse_query(query: str) -> List[List[str]]:
+    # Each part is a list of tokens that must appear next to each other. Quoted
+    # phrases and words like "foo-bar" give several tokens, plain words one.
+    parts = []
+    for phrase, word in QUERY_RE.findall(query):
+        tokens = tokenize(phrase or word)
+        if tokens:
+            parts.append(tokens)
+    return parts
+
+class SearchIndex:
+    # Positional inverted index over the Markdown files under `root`:
+    # term -> {doc id -> token positions}. Files are re-indexed when their
+    # (mtime, size) changes and the index is kept on disk between runs.
+    def __init__(self, root: str, index_dir: Optional[str] = INDEX_DIR):
+        self.root = os.path.abspath(root)
+        self.index_dir = index_dir
+        self.docs: Dict[int, Tuple[str, int, int, int]] = {}  # id -> (path, mtime_ns, size, length)
+        self.ids: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[int, array]] = {}
+        self.doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self.next_id = 0
+        self.total_length = 0
+        self.ready = False
+        self.lock = threading.Lock()
+        self.cancel = threading.Event()
+        self.save_timer: Optional[threading.Timer] = None
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    # --- Building ---
+    def refresh(self) -> int:
+        # Bring the whole index up to date with the disk. Meant to run on a
+        # worker thread; returns the number of files (re)indexed or removed.
+        if not self.docs:
+            self.load()
+        seen = set()
+        changed = 0
+        for entry in walk_markdown(self.root, self.cancel):
+            seen.add(entry.path)
+            try:
+                if self.update_file(entry.path, entry.stat()):
+                    changed += 1
+            except OSError:
+                pass
+        if self.cancel.is_set():
+            return changed
+        for path in list(self.ids):
+            if path not in seen:
+                self.remove(path)
+                changed += 1
+        self.ready = True
+        if changed:
+            self.save()
+        return changed
+
+    def update_paths(self, paths: Iterable[str]) -> int:
+        # Re-check files and folders, e.g. after filesystem events
+        changed = 0
+        for path in paths:
+            if not path.startswith(self.root + os.sep):
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            if st is None:
+                # A removed folder takes its files with it
+                prefix = path + os.sep
+                for p in [path] if path in self.ids else [p for p in list(self.ids) if p.startswith(prefix)]:
+                    self.remove(p)
+                    changed += 1
+            elif stat.S_ISDIR(st.st_mode):
+                for entry in walk_markdown(path, self.cancel):
+                    try:
+                        if self.update_file(entry.path, entry.stat()):
+                            changed += 1
+                    except OSError:
+                        pass
+            elif is_markdown(path) and self.update_file(path, st):
+                changed += 1
+        if changed:
+            self.schedule_save()
+        return changed
+
+    def update_file(self, path: str, st: os.stat_result) -> bool:
+        doc_id = self.ids.get(path)
+        if doc_id is not None:
+            _, mtime_ns, size, _ = self.docs[doc_id]
+            if (mtime_ns, size) == (st.st_mtime_ns, st.st_size):
+                return False
+        try:
+            # Decoded like the preview decodes it (UTF-16, Windows-1252, ...)
+            tokens = tokenize(MappedFile(path).read_text())
+        except OSError:
+            return False
+
+        # Tokenize outside the lock; interned terms are shared by the posting
+        # keys and doc_terms, which also keeps the pickle small.
+        positions: Dict[str, array] = {}
+        for pos, token in enumerate(tokens):
+            term = positions.get(token)
+            if term is None:
+                positions[sys.intern(token)] = array("I", (pos,))
+            else:
+                term.append(pos)
+
+        with self.lock:
+            if doc_id is not None:
+                self.drop(doc_id)
+            else:
+                doc_id = self.next_id
+                self.next_id += 1
+                self.ids[path] = doc_id
+            for term, pos in positions.items():
+                self.postings.setdefault(term, {})[doc_id] = pos
+            self.doc_terms[doc_id] = tuple(positions)
+            self.docs[doc_id] = (path, st.st_mtime_ns, st.st_size, len(tokens))
+            self.total_length += len(tokens)
+        return True
+
+    def remove(self, path: str):
+        with self.lock:
+            doc_id = self.ids.pop(path, None)
+            if doc_id is not None:
+                self.drop(doc_id)
+                del self.docs[doc_id]
+
+    def drop(self, doc_id: int):
+        # Remove a document's postings (lock held)
+        for term in self.doc_terms.pop(doc_id, ()):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_length -= self.docs[doc_id][3]
+
+    # --- Querying ---
+    def search(self, query: str, limit: int = 100) -> List[SearchHit]:
+        # Documents containing every term, phrases as consecutive tokens,
+        # ranked by BM25
+        parts = parse_query(query)
+        if not parts:
+            return []
+        terms = {token for part in parts for token in part}
+        with self.lock:
+            lists = [self.postings.get(term) for term in terms]
+            if not all(lists):
+                return []
+            lists.sort(key=len)
+            candidates = set(lists[0])
+            for docs in lists[1:]:
+                candidates.intersection_update(docs)
+                if not candidates:
+                    return []
+
+            n = len(self.docs)
+            avg_length = self.total_length / n if n else 1.0
+            weights = []
+            for term in terms:
+                df = len(self.postings[term])
+                weights.append((self.postings[term], math.log(1 + (n - df + 0.5) / (df + 0.5))))
+            scored = []
+            for doc_id in candidates:
+                norm = K1 * (1 - B + B * self.docs[doc_id][3] / avg_length)
+                score = 0.0
+                for docs, idf in weights:
+                    tf = len(docs[doc_id])
+                    score += idf * tf * (K1 + 1) / (tf + norm)
+                scored.append((score, doc_id))
+
+            # Phrases are checked best-first and only until the page is full,
+            # which keeps common-word phrases cheap
+            phrases = [part for part in parts if len(part) > 1]
+            if phrases:
+                scored.sort(reverse=True)
+                hits = []
+                for score, doc_id in scored:
+                    if all(self.has_phrase(doc_id, phrase) for phrase in phrases):
+                        hits.append(SearchHit(self.docs[doc_id][0], score))
+                        if len(hits) == limit:
+                            break
+                return hits
+            best = heapq.nlargest(limit, scored)
+            return [SearchHit(self.docs[doc_id][0], score) for score, doc_id in best]
+
+    def has_phrase(self, doc_id: int, tokens: List[str]) -> bool:
+        # Intersect the start positions implied by each token, rarest first;
+        # the shifting runs in C through map()
+        lists = sorted(((self.postings[token][doc_id], i) for i, token in enumerate(tokens)), key=lambda item: len(item[0]))
+        positions, offset = lists[0]
+        starts = set(map(operator.sub, positions, repeat(offset)))
+        for positions, offset in lists[1:]:
+            starts.intersection_update(map(operator.sub, positions, repeat(offset)))
+            if not starts:
+                return False
+        return True
+
+    # --- Disk store ---
+    def index_path(self) -> str:
+        name = hashlib.blake2b(self.root.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+        return os.path.join(self.index_dir, name + ".pickle")
+
+    def load(self):
+        if not self.index_dir:
+            return
+        try:
+            with open(self.index_path(), "rb") as f:
+                version, root, docs, postings, doc_terms = pickle.load(f)
+        except Exception:
+            return
+        if version != INDEX_FORMAT or root != self.root:
+            return
+        with self.lock:
+            self.docs = docs
+            self.postings = postings
+            self.doc_terms = doc_terms
+            self.ids = {doc[0]: doc_id for doc_id, doc in docs.items()}
+            self.next_id = max(docs, default=-1) + 1
+            self.total_length = sum(doc[3] for doc in docs.values())
+
+    def schedule_save(self):
+        if self.save_timer:
+            self.save_timer.cancel()
+        self.save_timer = threading.Timer(SAVE_DELAY, self.save)
+        self.save_timer.daemon = True
+        self.save_timer.start()
+
+    def save(self):
+        if not self.index_dir:
+            return
+        try:
+            with self.lock:
+                data = pickle.dumps((INDEX_FORMAT, self.root, self.docs, self.postings, self.doc_terms), protocol=pickle.HIGHEST_PROTOCOL)
+            os.makedirs(self.index_dir, exist_ok=True)
+            atomic_write(self.index_path(), data)
+        except Exception as e:
+            print(f"Error saving search index: {e}")
+
+    def close(self):
+        self.cancel.set()
+        if self.save_timer and self.save_timer.is_alive():
+            self.save_timer.cancel()
+            self.save()
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def search_executor() -> ThreadPoolExecutor:
+    # One worker, so index updates never run concurrently
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tarqim-search")
+    return _executor
@@ -0,0 +1,130 @@
+import tkinter as tk
+import weakref
+from tkinter import font
+from typing import Dict, Any, Optional, Tuple
+
+BASE_FONT_CANDIDATES = ("Segoe UI", "Roboto", "Arial")
+CODE_FONT_CANDIDATES = ("Consolas", "Courier New")
+
+THEMES: Dict[str, Dict[str, str]] = {
+    "light": {
+        "background": "#ffffff",
+        "foreground": "#000000",
+        "heading": "#2c3e50",
+        "heading2": "#34495e",
+        "code_bg": "#f0f0f0",
+        "code_fg": "#c7254e",
+        "pre_bg": "#f8f9fa",
+        "link": "#3498db",
+        "quote_bg": "#f9f9f9",
+        "quote_fg": "#555555",
+        "match_bg": "#fff3a3",
+        "syntax_comment": "#6a737d",
+        "syntax_keyword": "#d73a49",
+        "syntax_string": "#032f62",
+        "syntax_number": "#005cc5",
+        "syntax_builtin": "#005cc5",
+        "syntax_function": "#6f42c1",
+        "syntax_decorator": "#e36209",
+    },
+    "dark": {
+        "background": "#1e1f22",
+        "foreground": "#d4d4d4",
+        "heading": "#e6edf3",
+        "heading2": "#c9d1d9",
+        "code_bg": "#2b2d30",
+        "code_fg": "#f78c6c",
+        "pre_bg": "#26282b",
+        "link": "#4fa3e0",
+        "quote_bg": "#25272a",
+        "quote_fg": "#a0a0a0",
+        "match_bg": "#6b5b1e",
+        "syntax_comment": "#8b949e",
+        "syntax_keyword": "#ff7b72",
+        "syntax_string": "#a5d6ff",
+        "syntax_number": "#79c0ff",
+        "syntax_builtin": "#79c0ff",
+        "syntax_function": "#d2a8ff",
+        "syntax_decorator": "#ffa657",
+    },
+}
+
+_font_families: Optional[Tuple[str, str]] = None
+
+def resolve_font_families() -> Tuple[str, str]:
+    # font.families() lists every installed font, so only ask Tk once per process
+    global _font_families
+    if _font_families is None:
+        available_fonts = set(font.families())
+        base_font_family = next((f for f in BASE_FONT_CANDIDATES if f in available_fonts), "Helvetica")
+        code_font_family = next((f for f in CODE_FONT_CANDIDATES if f in available_fonts), "Courier")
+        _font_families = (base_font_family, code_font_family)
+    return _font_families
+
+def tag_styles(colors: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    base_font_family, code_font_family = resolve_font_families()
+    base_font = (base_font_family, 11)
+    code_font = (code_font_family, 10)
+    return {
+        "h1": dict(font=(base_font_family, 24, "bold"), spacing1=20, spacing3=10, foreground=colors["heading"]),
+        "h2": dict(font=(base_font_family, 20, "bold"), spacing1=15, spacing3=8, foreground=colors["heading2"]),
+        "h3": dict(font=(base_font_family, 16, "bold"), spacing1=12, spacing3=5, foreground=colors["heading"]),
+        "h4": dict(font=(base_font_family, 14, "bold"), spacing1=10, spacing3=5, foreground=colors["heading"]),
+        "h5": dict(font=(base_font_family, 12, "bold"), spacing1=10, spacing3=5, foreground=colors["heading"]),
+        "h6": dict(font=(base_font_family, 11, "bold"), spacing1=10, spacing3=5, foreground=colors["heading"]),
+        "p": dict(font=base_font, spacing1=5, spacing3=5),
+        "code": dict(font=code_font, background=colors["code_bg"], foreground=colors["code_fg"]),
+        "pre": dict(font=code_font, background=colors["pre_bg"], lmargin1=20, lmargin2=20),
+        "strong": dict(font=(base_font_family, 11, "bold")),
+        "em": dict(font=(base_font_family, 11, "italic")),
+        "ul": dict(lmargin1=20, lmargin2=20),
+        "li": dict(lmargin1=20, lmargin2=20, spacing1=2),
+        "a": dict(foreground=colors["link"], underline=True),
+        # Alt text of images that cannot be shown
+        "img": dict(font=(base_font_family, 11, "italic"), foreground=colors["quote_fg"]),
+        "blockquote": dict(lmargin1=20, lmargin2=20, background=colors["quote_bg"], foreground=colors["quote_fg"]),
+        # Code block tokens (app.core.highlight)
+        "hl_comment": dict(font=(code_font_family, 10, "italic"), foreground=colors["syntax_comment"]),
+        "hl_keyword": dict(foreground=colors["syntax_keyword"]),
+        "hl_string": dict(foreground=colors["syntax_string"]),
+        "hl_number": dict(foreground=colors["syntax_number"]),
+        "hl_builtin": dict(foreground=colors["syntax_builtin"]),
+        "hl_function": dict(foreground=colors["syntax_function"]),
+        "hl_class": dict(foreground=colors["syntax_function"]),
+        "hl_decorator": dict(foreground=colors["syntax_decorator"]),
+        # Search matches; configured last so it draws over the block backgrounds
+        "search": dict(background=colors["match_bg"]),
+    }
+
+class StyleRegistry:
+    # Configures the Markdown tags once per Text widget and restyles every
+    # registered widget in place when the theme changes.
+    def __init__(self, theme: str = "light"):
+        self.theme = theme if theme in THEMES else "light"
+        self.widgets = weakref.WeakKeyDictionary()  # widget -> configures tags
+
+    def apply(self, text_widget: tk.Text, tags: bool = True):
+        if text_widget in self.widgets:
+            return
+        self.widgets[text_widget] = tags
+        self.configure_widget(text_widget, tags)
+
+    def configure_widget(self, text_widget: tk.Text, tags: bool):
+        colors = THEMES[self.theme]
+        text_widget.configure(background=colors["background"], foreground=colors["foreground"], insertbackground=colors["foreground"])
+        if tags:
+            for tag, options in tag_styles(colors).items():
+                text_widget.tag_configure(tag, **options)
+
+    def set_theme(self, theme: str):
+        if theme not in THEMES or theme == self.theme:
+            return
+        self.theme = theme
+        for text_widget, tags in list(self.widgets.items()):
+            try:
+                self.configure_widget(text_widget, tags)
+            except tk.TclError:
+                # Widget was destroyed
+                del self.widgets[text_widget]
+
+styles = StyleRegistry()
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from app.core.fileio import atomic_write_text
+
+# Set to a file path (or 1 for TRACE_FILE) to record spans and write them as
+# Chrome trace-event JSON on exit; main.py --trace does the same
+TRACE_ENV = "TARQIM_TRACE"
+TRACE_FILE = "tarqim-trace.json"
+# Events kept in memory; the oldest are dropped first
+MAX_EVENTS = 200000
+# Phases shown in the status bar breakdown, in this order
+BREAKDOWN = ("read", "split", "native", "markdown2", "html", "tk", "highlight", "stats")
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    __slots__ = ("tracer", "name", "cat", "args", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, cat: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add(self.name, self.cat, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+class Tracer:
+    # Timed spans for chrome://tracing or Perfetto, also summed per name since
+    # the last start_frame() for the status bar. While disabled, span() returns
+    # a shared no-op, so an instrumented block costs a call and a with.
+    def __init__(self):
+        self.enabled = False
+        self.path = TRACE_FILE
+        self.events: deque = deque(maxlen=MAX_EVENTS)
+        self.threads: Dict[int, str] = {}
+        self.totals: Dict[str, float] = {}  # ms per span name in the current frame
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def enable(self, path: Optional[str] = None):
+        self.enabled = True
+        if path:
+            self.path = path
+
+    def span(self, name: str, cat: str = "app", **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, cat, args)
+
+    def add(self, name: str, cat: str, start_ns: int, end_ns: int, args: Optional[Dict[str, Any]] = None):
+        tid = threading.get_ident()
+        event = {"name": name, "cat": cat, "ph": "X", "ts": start_ns / 1000, "dur": (end_ns - start_ns) / 1000, "pid": self.pid, "tid": tid}
+        if args:
+            event["args"] = args
+        with self.lock:
+            if tid not in self.threads:
+                self.threads[tid] = threading.current_thread().name
+            self.events.append(event)
+            self.totals[name] = self.totals.get(name, 0.0) + (end_ns - start_ns) / 1e6
+
+    def start_frame(self):
+        # A new user action (opening a file, leaving edit mode): the breakdown
+        # starts from zero
+        with self.lock:
+            self.totals = {}
+
+    def breakdown(self) -> str:
+        with self.lock:
+            totals = dict(self.totals)
+        parts = [f"{name} {totals[name]:.1f}" for name in BREAKDOWN if name in totals]
+        return " · ".join(parts) + " ms" if parts else ""
+
+    def export(self, path: Optional[str] = None) -> str:
+        path = path or self.path
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        names = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}} for tid, name in threads.items()]
+        atomic_write_text(path, json.dumps({"traceEvents": names + events, "displayTimeUnit": "ms"}))
+        return path
+
+tracer = Tracer()
+if os.environ.get(TRACE_ENV):
+    value = os.environ[TRACE_ENV]
+    tracer.enable(None if value.lower() in ("1", "true", "yes") else value)
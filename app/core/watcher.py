@@ -0,0 +1,252 @@
+import ctypes
+import os
+import select
+import struct
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# Changes are delivered as {path: kind}, kind being "created", "deleted",
+# "modified" or "rescan" (events were lost, re-list the directory).
+Changes = Dict[str, str]
+
+COALESCE_SECONDS = 0.15
+POLL_INTERVAL = 1.0
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+              | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")
+
+class FileWatcher:
+    # Reference-counted set of watched files and directories. A background thread
+    # collects events, merges bursts for COALESCE_SECONDS and hands them to
+    # `callback` (on the watcher thread).
+    def __init__(self, callback: Callable[[Changes], None], coalesce: float = COALESCE_SECONDS):
+        self.callback = callback
+        self.coalesce = coalesce
+        self.counts: Dict[str, int] = {}
+        self.pending: Changes = {}
+        self.lock = threading.Lock()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="tarqim-watcher", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def watch(self, path: str):
+        path = os.path.abspath(path)
+        with self.lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+            if self.counts[path] == 1:
+                self.add(path)
+
+    def unwatch(self, path: str):
+        path = os.path.abspath(path)
+        with self.lock:
+            count = self.counts.get(path, 0) - 1
+            if count > 0:
+                self.counts[path] = count
+            elif count == 0:
+                del self.counts[path]
+                self.remove(path)
+
+    def record(self, path: str, kind: str):
+        # Only the latest kind per path is kept; receivers check the filesystem
+        # for the current state anyway.
+        if self.pending.get(path) == "rescan":
+            return
+        self.pending[path] = kind
+
+    def close(self):
+        self.closed = True
+
+    def add(self, path: str):
+        raise NotImplementedError
+
+    def remove(self, path: str):
+        raise NotImplementedError
+
+    def run(self):
+        raise NotImplementedError
+
+class InotifyWatcher(FileWatcher):
+    # Linux inotify through ctypes. Files are watched through their parent
+    # directory, which also catches editors and generators that replace files
+    # by renaming a temp file over them.
+    def __init__(self, callback: Callable[[Changes], None], coalesce: float = COALESCE_SECONDS):
+        super().__init__(callback, coalesce)
+        # The C library is already loaded; find_library would run ldconfig
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.wake_r, self.wake_w = os.pipe()
+        self.targets: Dict[str, str] = {}  # watched path -> directory holding the watch
+        self.dir_refs: Dict[str, int] = {}
+        self.wd_by_dir: Dict[str, int] = {}
+        self.dir_by_wd: Dict[int, str] = {}
+
+    def add(self, path: str):
+        directory = path if os.path.isdir(path) else os.path.dirname(path)
+        self.targets[path] = directory
+        self.dir_refs[directory] = self.dir_refs.get(directory, 0) + 1
+        if self.dir_refs[directory] > 1:
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self.wd_by_dir[directory] = wd
+            self.dir_by_wd[wd] = directory
+
+    def remove(self, path: str):
+        directory = self.targets.pop(path, None)
+        if directory is None:
+            return
+        self.dir_refs[directory] -= 1
+        if self.dir_refs[directory] > 0:
+            return
+        del self.dir_refs[directory]
+        wd = self.wd_by_dir.pop(directory, None)
+        if wd is not None:
+            self.dir_by_wd.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def close(self):
+        super().close()
+        os.write(self.wake_w, b"x")
+
+    def run(self):
+        deadline = 0.0
+        try:
+            while not self.closed:
+                timeout = max(0.0, deadline - time.monotonic()) if self.pending else None
+                readable, _, _ = select.select([self.fd, self.wake_r], [], [], timeout)
+                if self.wake_r in readable:
+                    os.read(self.wake_r, 512)
+                if self.fd in readable:
+                    try:
+                        data = os.read(self.fd, 64 * 1024)
+                    except BlockingIOError:
+                        data = b""
+                    with self.lock:
+                        had_pending = bool(self.pending)
+                        self.parse(data)
+                    if self.pending and not had_pending:
+                        deadline = time.monotonic() + self.coalesce
+                if self.pending and time.monotonic() >= deadline:
+                    with self.lock:
+                        changes, self.pending = self.pending, {}
+                    self.callback(changes)
+        finally:
+            os.close(self.fd)
+            os.close(self.wake_r)
+            os.close(self.wake_w)
+
+    def parse(self, data: bytes):
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            start = offset + EVENT_HEADER.size
+            name = data[start:start + length].split(b"\0", 1)[0]
+            offset = start + length
+
+            if mask & IN_Q_OVERFLOW:
+                for directory in self.wd_by_dir:
+                    self.pending[directory] = "rescan"
+                continue
+            directory = self.dir_by_wd.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                # The watched directory is gone
+                self.dir_by_wd.pop(wd, None)
+                self.wd_by_dir.pop(directory, None)
+                continue
+
+            path = os.path.join(directory, os.fsdecode(name)) if name else directory
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self.record(path, "created")
+            elif mask & (IN_DELETE | IN_MOVED_FROM | IN_DELETE_SELF | IN_MOVE_SELF):
+                self.record(path, "deleted")
+            elif mask & (IN_MODIFY | IN_CLOSE_WRITE):
+                self.record(path, "modified")
+
+class PollingWatcher(FileWatcher):
+    # Fallback for systems without inotify: stats the watched paths every
+    # POLL_INTERVAL. Directories are only re-listed when their mtime changed.
+    def __init__(self, callback: Callable[[Changes], None], poll_interval: float = POLL_INTERVAL):
+        super().__init__(callback)
+        self.poll_interval = poll_interval
+        self.snapshots: Dict[str, Optional[Tuple]] = {}
+        self.wake = threading.Event()
+
+    def snapshot(self, path: str, previous: Optional[Tuple] = None) -> Optional[Tuple]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isdir(path):
+            return ("file", st.st_mtime_ns, st.st_size)
+        if previous and previous[0] == "dir" and previous[1] == st.st_mtime_ns:
+            return previous
+        try:
+            names = frozenset(os.listdir(path))
+        except OSError:
+            names = frozenset()
+        return ("dir", st.st_mtime_ns, names)
+
+    def add(self, path: str):
+        self.snapshots[path] = self.snapshot(path)
+
+    def remove(self, path: str):
+        self.snapshots.pop(path, None)
+
+    def close(self):
+        super().close()
+        self.wake.set()
+
+    def run(self):
+        while not self.closed:
+            self.wake.wait(self.poll_interval)
+            with self.lock:
+                for path, old in list(self.snapshots.items()):
+                    new = self.snapshot(path, old)
+                    if new == old:
+                        continue
+                    self.snapshots[path] = new
+                    if new is None:
+                        self.record(path, "deleted")
+                    elif old is None:
+                        self.record(path, "created")
+                    elif new[0] == "dir" and old[0] == "dir":
+                        for name in new[2] - old[2]:
+                            self.record(os.path.join(path, name), "created")
+                        for name in old[2] - new[2]:
+                            self.record(os.path.join(path, name), "deleted")
+                    else:
+                        self.record(path, "modified")
+                changes, self.pending = self.pending, {}
+            if changes:
+                self.callback(changes)
+
+def create_watcher(callback: Callable[[Changes], None]) -> FileWatcher:
+    try:
+        watcher = InotifyWatcher(callback)
+    except (OSError, AttributeError):
+        # No inotify (non-Linux libc, or out of instances)
+        watcher = PollingWatcher(callback)
+    watcher.start()
+    return watcher
@@ -0,0 +1,36 @@
+import queue
+import tkinter as tk
+from typing import Callable
+
+class Dispatcher:
+    # Runs callbacks from worker threads on the Tk main loop. Tk is not
+    # thread-safe, so workers queue calls here and the main loop drains them.
+    def __init__(self, widget: tk.Misc, interval_ms: int = 30):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.widget.after(self.interval_ms, self.poll)
+
+    def call_soon(self, callback: Callable, *args):
+        self.queue.put((callback, args))
+
+    def poll(self):
+        try:
+            while True:
+                callback, args = self.queue.get_nowait()
+                try:
+                    callback(*args)
+                except Exception as e:
+                    print(f"Error in dispatched callback: {e}")
+        except queue.Empty:
+            pass
+        self.widget.after(self.interval_ms, self.poll)
+
+def get_dispatcher(widget: tk.Misc) -> Dispatcher:
+    # One dispatcher per Tk root
+    root = widget._root()
+    dispatcher = getattr(root, "_tarqim_dispatcher", None)
+    if dispatcher is None:
+        dispatcher = Dispatcher(root)
+        root._tarqim_dispatcher = dispatcher
+    return dispatcher
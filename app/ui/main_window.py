@@ -2,12 +2,33 @@ import tkinter as tk
 from tkinter import ttk, filedialog
 import os
 import time
+from typing import List, Optional, Sequence
 from app.ui.sidebar import Sidebar
 from app.ui.preview import PreviewPanel
+from app.ui.tabs import DocumentTab, DocumentTabs
+from app.ui.outline import OutlinePane
+from app.ui.search_dialog import SearchDialog
+from app.ui.quick_open import QuickOpen
 from app.core.config import ConfigManager
+from app.core.theme import styles
+from app.core.images import image_cache
+from app.core.instance import InstanceServer
+from app.core.render_cache import render_cache, cache_key_for
+from app.core.loader import MappedFile
+from app.core.trace import tracer
+from app.core.render_ops import DEFAULT_BACKEND, render_executor, set_parser_backend, warm_up
+from app.core.watcher import create_watcher
+from app.core.search import SearchIndex, parse_query, search_executor
+from app.core.finder import PathIndex
+from app.core.dirscan import scan_executor
+from app.ui.dispatcher import get_dispatcher
+
+# Folder indexing starts this long after startup, so that its crawl does not
+# compete with the first paint
+INDEX_DELAY_MS = 1000
 
 class MainWindow:
-    def __init__(self, root: tk.Tk):
+    def __init__(self, root: tk.Tk, paths: Sequence[str] = ()):
         self.root = root
         self.root.title("Tarqim - Markdown Viewer")
         self.root.geometry("1000x700")
@@ -18,22 +39,62 @@ class MainWindow:
         self.current_dir = self.config.get("last_dir", os.getcwd())
         if not os.path.exists(self.current_dir):
             self.current_dir = os.getcwd()
+        # A folder given on the command line replaces the last one
+        folders = [path for path in paths if os.path.isdir(path)]
+        if folders:
+            self.current_dir = os.path.abspath(folders[-1])
+        render_cache.configure(
+            max_bytes=int(self.config.get("render_cache_mb", 64) * 1024 * 1024),
+            use_disk=self.config.get("render_cache_disk", True),
+        )
+        image_cache.configure(int(self.config.get("image_cache_mb", 64) * 1024 * 1024))
+        set_parser_backend(self.config.get("parser", DEFAULT_BACKEND))
 
         # Theme
         style = ttk.Style()
         style.theme_use('clam')
+        styles.set_theme(self.config.get("theme", "light"))
+        
+        # Filesystem watcher: bursts of events arrive coalesced on the main loop
+        dispatcher = get_dispatcher(root)
+        self.watcher = create_watcher(lambda changes: dispatcher.call_soon(self.on_fs_changes, changes))
+        self.watched_file = None
+        
+        # Later launches hand their paths to this window and exit
+        self.instance = InstanceServer(lambda paths: dispatcher.call_soon(self.on_forwarded, paths))
+        self.instance.start()
+        
+        # Full-text search and quick-open indexes of the opened folder, built
+        # in the background. Only folders expanded in the sidebar are watched,
+        # so the whole folder is rescanned whenever search or quick open opens.
+        self.search_index = None
+        self.search_dialog = None
+        self.path_index = None
+        self.quick_open = None
+        self.rescans = []
+        self.index_job = root.after(INDEX_DELAY_MS, lambda: self.start_indexing(self.current_dir))
         
         # Layout
         self.paned = ttk.PanedWindow(root, orient=tk.HORIZONTAL)
         self.paned.pack(fill=tk.BOTH, expand=True)
         
         # Sidebar
-        self.sidebar = Sidebar(self.paned, self.load_file, self.on_folder_change, self.current_dir)
+        self.sidebar = Sidebar(self.paned, lambda path: self.load_file(path, preview=True), self.on_folder_change, self.current_dir, self.watcher)
         self.paned.add(self.sidebar, weight=1)
         
-        # Preview
-        self.preview = PreviewPanel(self.paned, self.update_stats)
-        self.paned.add(self.preview, weight=4)
+        # Documents, one tab each. The most recently shown ones stay rendered;
+        # the others are loaded again when shown.
+        self.tabs = DocumentTabs(self.paned, self.make_panel, self.activate_tab,
+                                 max_views=self.config.get("tab_pool_views", 4),
+                                 max_bytes=int(self.config.get("tab_pool_mb", 256) * 1024 * 1024))
+        self.active_tab = self.tabs.current
+        self.paned.add(self.tabs, weight=4)
+        
+        # Outline of the shown document
+        self.outline = OutlinePane(self.paned)
+        self.outline_visible = False
+        if self.config.get("outline_visible", False):
+            self.toggle_outline()
         
         # Status Bar Frame
         self.status_frame = ttk.Frame(root, relief=tk.SUNKEN)
@@ -43,12 +104,31 @@ class MainWindow:
         self.btn_sidebar = ttk.Button(self.status_frame, text="◀ ☰", width=4, command=self.toggle_sidebar)
         self.btn_sidebar.pack(side=tk.LEFT)
         
+        self.btn_search = ttk.Button(self.status_frame, text="🔍", width=3, command=self.open_search)
+        self.btn_search.pack(side=tk.LEFT)
+        
+        self.btn_outline = ttk.Button(self.status_frame, text="≡", width=3, command=self.toggle_outline)
+        self.btn_outline.pack(side=tk.LEFT)
+        
+        # Message Label (errors, notices)
+        self.message_var = tk.StringVar()
+        self.message_job = None
+        self.lbl_message = ttk.Label(self.status_frame, textvariable=self.message_var, foreground="#c0392b")
+        self.lbl_message.pack(side=tk.LEFT, padx=5)
+        
         # Stats Label
         self.stats_var = tk.StringVar()
         self.stats_var.set("0 lines | 0 Chars")
         self.lbl_stats = ttk.Label(self.status_frame, textvariable=self.stats_var, anchor=tk.CENTER)
         self.lbl_stats.pack(side=tk.LEFT, expand=True, fill=tk.X)
         
+        # Tracing: time per phase of the last render; click to export the trace
+        self.trace_var = tk.StringVar()
+        if tracer.enabled:
+            self.lbl_trace = ttk.Label(self.status_frame, textvariable=self.trace_var, foreground="#555", cursor="hand2")
+            self.lbl_trace.pack(side=tk.LEFT, padx=5)
+            self.lbl_trace.bind("<Button-1>", lambda e: self.export_trace())
+        
         # Scroll Buttons
         self.btn_scroll_up = ttk.Button(self.status_frame, text="▲", width=3, command=lambda: self.preview.scroll_view(-1))
         self.btn_scroll_up.pack(side=tk.RIGHT)
@@ -59,13 +139,89 @@ class MainWindow:
         # Bindings
         root.bind("<Control-o>", lambda e: self.sidebar.browse_folder())
         root.bind("<Control-q>", lambda e: self.quit())
+        root.bind("<Control-F>", lambda e: self.open_search())
+        root.bind("<Control-p>", lambda e: self.open_quick_open())
+        root.bind("<Control-w>", lambda e: self.tabs.close_tab(self.active_tab))
+        root.bind("<Control-O>", lambda e: self.toggle_outline())
         
         # Save config on exit
         root.protocol("WM_DELETE_WINDOW", self.quit)
+        
+        # Open the files given on the command line, or else reopen the last
+        # document; unchanged, it comes from the render cache without
+        # markdown2, which is then loaded on the render worker
+        files = [path for path in paths if not os.path.isdir(path)]
+        last_file = self.config.get("last_file")
+        if files:
+            self.open_paths(files)
+        elif last_file and os.path.isfile(last_file):
+            self.load_file(last_file)
+        render_executor().submit(warm_up)
+
+    @property
+    def preview(self) -> PreviewPanel:
+        return self.active_tab.panel
+
+    def make_panel(self, master: tk.Misc) -> PreviewPanel:
+        def on_stats(*stats):
+            # Views in the background finish renders too
+            if panel is self.preview:
+                self.update_stats(*stats)
+        def on_view_change():
+            if panel is self.preview and self.outline_visible:
+                self.outline.update_view()
+        panel = PreviewPanel(master, on_stats, self.show_message, on_view_change)
+        return panel
 
     def on_folder_change(self, new_path: str):
         self.current_dir = new_path
         self.save_state()
+        self.start_indexing(new_path)
+
+    def start_indexing(self, path: str):
+        if self.index_job:
+            self.root.after_cancel(self.index_job)
+            self.index_job = None
+        if self.search_index:
+            self.search_index.close()
+            self.path_index.close()
+        self.path_index = PathIndex(path)
+        scan_executor().submit(self.path_index.build)
+        index = SearchIndex(path)
+        self.search_index = index
+        search_executor().submit(self.build_index, index)
+
+    def build_index(self, index: SearchIndex):
+        # Runs on the search worker
+        try:
+            index.refresh()
+        except Exception as e:
+            print(f"Error indexing {index.root}: {e}")
+
+    def rescan_indexes(self):
+        if self.search_index is None or not (self.search_index.ready and self.path_index.ready):
+            # Still being built
+            return
+        if any(not future.done() for future in self.rescans):
+            return
+        self.rescans = [search_executor().submit(self.build_index, self.search_index),
+                        scan_executor().submit(self.path_index.rescan)]
+
+    def open_search(self):
+        self.rescan_indexes()
+        if self.search_dialog is None:
+            self.search_dialog = SearchDialog(self.root, lambda: self.search_index, self.open_search_result)
+        self.search_dialog.show()
+
+    def open_quick_open(self):
+        self.rescan_indexes()
+        if self.quick_open is None:
+            self.quick_open = QuickOpen(self.root, lambda: self.path_index, self.load_file)
+        self.quick_open.show()
+
+    def open_search_result(self, path: str, query: str):
+        self.load_file(path)
+        self.preview.highlight_terms(parse_query(query))
 
     def toggle_sidebar(self):
         if self.sidebar_visible:
@@ -76,24 +232,164 @@ class MainWindow:
             self.btn_sidebar.config(text="◀ ☰")
         self.sidebar_visible = not self.sidebar_visible
 
-    def update_stats(self, lines: int, chars: int):
-        self.stats_var.set(f"{lines} lines | {chars} Chars")
+    def toggle_outline(self):
+        if self.outline_visible:
+            self.paned.forget(self.outline)
+            self.outline.attach(None)
+        else:
+            self.paned.add(self.outline, weight=1)
+            self.outline.attach(self.preview.renderer)
+            self.outline.entry.focus_set()
+        self.outline_visible = not self.outline_visible
+        ConfigManager.set("outline_visible", self.outline_visible)
+
+    def update_stats(self, lines: int, chars: int, words: Optional[int] = None):
+        # Words are only counted while editing
+        if words is None:
+            self.stats_var.set(f"{lines} lines | {chars} Chars")
+        else:
+            self.stats_var.set(f"{lines} lines | {words} words | {chars} Chars")
+        if tracer.enabled:
+            self.trace_var.set(tracer.breakdown())
 
-    def load_file(self, path: str):
+    def export_trace(self):
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                text = f.read()
-            
-            self.preview.load_content(text, path)
+            self.show_message(f"Trace written to {tracer.export()}")
+        except Exception as e:
+            self.show_message(f"Error writing trace: {e}")
+
+    def show_message(self, text: str, timeout_ms: int = 8000):
+        self.message_var.set(text)
+        if self.message_job:
+            self.root.after_cancel(self.message_job)
+        self.message_job = self.root.after(timeout_ms, lambda: self.message_var.set(""))
+
+    def load_file(self, path: str, preview: bool = False):
+        # Pending edits of the current file must hit the disk before we read
+        # (possibly the same) file again. A preview opens in the preview tab.
+        if not self.preview.flush_save(timeout=5):
+            self.show_message("Still saving the previous file…")
+        tracer.start_frame()
+        self.activate_tab(self.tabs.open_tab(path, preview))
+
+    def open_paths(self, paths: List[str]):
+        # Folders become the sidebar root, files open in tabs
+        for path in paths:
+            if os.path.isdir(path):
+                self.sidebar.current_path = path
+                self.sidebar.populate_root(path)
+                self.on_folder_change(os.path.abspath(path))
+            elif os.path.isfile(path):
+                self.load_file(path)
+            else:
+                self.show_message(f"Not found: {path}")
+
+    def on_forwarded(self, paths: List[str]):
+        # Another launch handed its paths over
+        self.root.deiconify()
+        self.root.lift()
+        self.root.focus_force()
+        self.open_paths(paths)
+
+    def activate_tab(self, tab: DocumentTab):
+        # A pooled view is shown as it is, and only reloaded if its file changed
+        # in the meantime; a new or evicted one is loaded and its saved state
+        # restored. A render paused while the view was hidden starts over.
+        self.active_tab = tab
+        created = self.tabs.show(tab)
+        path = tab.path
+        if path is None:
+            self.root.title("Tarqim - Markdown Viewer")
+        else:
+            try:
+                if created or tab.panel.current_file_path != path:
+                    self.open_document(path, path)
+                    if tab.state:
+                        tab.panel.restore_view(tab.state)
+                        tab.state = None
+                elif not tab.panel.is_editing:
+                    self.reload_file(path)
+                tab.panel.resume()
+            except Exception as e:
+                print(f"Error loading file: {e}")
+                self.show_message(f"Error loading {os.path.basename(path)}: {e}")
+                return
             self.root.title(f"Tarqim - {os.path.basename(path)}")
+            self.watch_file(path)
+            ConfigManager.set("last_file", os.path.abspath(path))
+        tab.panel.update_stats()
+        if self.outline_visible:
+            self.outline.attach(tab.panel.renderer)
+
+    def open_document(self, path: str, file_path: str):
+        # Small files are decoded in one go and go through the render cache;
+        # large ones are rendered block by block from the memory map. The map
+        # is stat'ed before reading, so a concurrent write can only make the
+        # cache key stale.
+        with tracer.span("load_file", path=path):
+            with tracer.span("read"):
+                mapped = MappedFile(path)
+                key = cache_key_for(path, mapped.stat)
+                streamed = mapped.streamable and mapped.size > self.preview.renderer.virtual_threshold
+                text = None if streamed else mapped.read_text()
+            self.preview.load_content(text, file_path, key, mapped.encoding, mapped if streamed else None, mapped.lossy)
+        if mapped.lossy:
+            self.show_message(f"{os.path.basename(path)} is not valid {mapped.encoding}; it is shown read-only")
+        elif mapped.encoding not in ("utf-8", "utf-8-sig"):
+            self.show_message(f"{os.path.basename(path)} was read as {mapped.encoding}")
+
+    def watch_file(self, path: str):
+        path = os.path.abspath(path)
+        if path == self.watched_file:
+            return
+        if self.watched_file:
+            self.watcher.unwatch(self.watched_file)
+        self.watched_file = path
+        self.watcher.watch(path)
+
+    def on_fs_changes(self, changes):
+        self.sidebar.apply_fs_changes(changes)
+        if self.search_index:
+            search_executor().submit(self.search_index.update_paths, list(changes))
+            scan_executor().submit(self.path_index.update_paths, list(changes))
+        
+        path = self.watched_file
+        if not path or path not in changes or path != os.path.abspath(self.preview.current_file_path or ""):
+            return
+        if not os.path.exists(path):
+            self.show_message(f"{os.path.basename(path)} was moved or deleted")
+        elif not self.preview.is_editing:
+            # Live reload; the same file keeps its scroll position and only the
+            # changed blocks are rendered again. While editing, the changes are
+            # our own autosaves.
+            self.reload_file(path)
+
+    def reload_file(self, path: str):
+        try:
+            st = os.stat(path)
+            key = cache_key_for(path, st)
+            if key == self.preview.cache_key:
+                return
+            tracer.start_frame()
+            self.open_document(path, self.preview.current_file_path)
         except Exception as e:
-            print(f"Error loading file: {e}")
+            print(f"Error reloading file: {e}")
 
     def save_state(self):
-        config = ConfigManager.load_config()
-        config["last_dir"] = self.current_dir
-        ConfigManager.save_config(config)
+        ConfigManager.set("last_dir", self.current_dir)
 
     def quit(self):
+        self.instance.close()
+        self.tabs.close_views(timeout=10)
+        self.watcher.close()
+        if self.search_index:
+            self.search_index.close()
+            self.path_index.close()
         self.save_state()
+        ConfigManager.flush()
+        if tracer.enabled:
+            try:
+                tracer.export()
+            except Exception as e:
+                print(f"Error writing trace: {e}")
         self.root.quit()
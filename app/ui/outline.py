@@ -0,0 +1,95 @@
+import tkinter as tk
+from tkinter import ttk
+import bisect
+from typing import List, Optional
+
+from app.core.renderer import HeadingIndex, MarkdownRenderer
+
+class OutlinePane(ttk.Frame):
+    # Headings of the shown document, from the heading index its renderer
+    # keeps. Typing in the filter narrows the list, clicking a heading scrolls
+    # the preview to it, and the section at the top of the preview stays
+    # selected while it scrolls.
+    def __init__(self, master):
+        super().__init__(master)
+        self.renderer: Optional[MarkdownRenderer] = None
+        self.index: Optional[HeadingIndex] = None
+        self.shown: List[int] = []  # headings listed, by position in the index
+        self.current = -1  # listed row of the current section
+
+        self.filter_var = tk.StringVar()
+        self.entry = ttk.Entry(self, textvariable=self.filter_var)
+        self.entry.pack(fill=tk.X, padx=5, pady=5)
+
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.headings = tk.Listbox(self, borderwidth=0, highlightthickness=0, activestyle="none", font=("Helvetica", 10),
+                                   exportselection=False, yscrollcommand=self.scrollbar.set)
+        self.headings.pack(fill=tk.BOTH, expand=True, padx=(5, 0), pady=(0, 5))
+        self.scrollbar.config(command=self.headings.yview)
+
+        # Bindings
+        self.filter_var.trace_add("write", lambda *args: self.apply_filter())
+        self.entry.bind("<Return>", lambda e: self.jump(0))
+        self.entry.bind("<Escape>", lambda e: self.filter_var.set(""))
+        self.headings.bind("<<ListboxSelect>>", lambda e: self.jump_selected())
+
+    def attach(self, renderer: Optional[MarkdownRenderer]):
+        self.renderer = renderer
+        self.index = None
+        self.apply_filter()
+        self.update_view()
+
+    def update_view(self):
+        # Called when the preview scrolled or changed
+        if self.renderer is None:
+            return
+        index = self.renderer.heading_index()
+        if index is not self.index:
+            changed = self.index is None or index.titles != self.index.titles or index.levels != self.index.levels
+            self.index = index
+            if changed:
+                self.apply_filter()
+        self.track()
+
+    def apply_filter(self):
+        index = self.index
+        self.headings.delete(0, tk.END)
+        self.current = -1
+        if index is None:
+            self.shown = []
+            return
+        query = self.filter_var.get().strip().casefold()
+        self.shown = [i for i, title in enumerate(index.titles) if query in title.casefold()]
+        if self.shown:
+            self.headings.insert(tk.END, *("    " * (index.levels[i] - 1) + index.titles[i] for i in self.shown))
+        self.track()
+
+    def track(self):
+        # Select the listed heading of the section at the top of the preview
+        if self.index is None or not self.shown:
+            return
+        top = int(self.renderer.text_widget.index("@0,0").split(".")[0])
+        section = self.index.section_at(top)
+        row = bisect.bisect_right(self.shown, section) - 1
+        if row == self.current:
+            return
+        self.current = row
+        self.headings.selection_clear(0, tk.END)
+        if row >= 0:
+            self.headings.selection_set(row)
+            self.headings.see(row)
+
+    def jump_selected(self):
+        selection = self.headings.curselection()
+        if selection:
+            self.jump(selection[0])
+
+    def jump(self, row: int):
+        if self.index is None or not 0 <= row < len(self.shown):
+            return
+        if self.renderer.heading_index() is not self.index:
+            # The marks of a stale index may be gone
+            self.update_view()
+            return
+        self.renderer.text_widget.yview(self.index.marks[self.shown[row]])
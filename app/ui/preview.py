@@ -1,17 +1,70 @@
 import tkinter as tk
 from tkinter import ttk
-from app.core.renderer import render_markdown
+from app.core.renderer import MarkdownRenderer
+from app.core.render_ops import parse_block
+from app.core.live_preview import LiveDocument
+from app.core.edit_buffer import EditBuffer
+from app.core.theme import styles
+from app.core.config import ConfigManager
+from app.core.render_cache import CacheKey
+from app.core.autosave import AutoSaver
+from app.core.loader import MappedFile
+from app.core.trace import tracer
+from app.ui.dispatcher import get_dispatcher
+from app.ui.text_tracker import TextChangeTracker
 
 import os
-from typing import Callable, Optional
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+# Cap on highlighted search matches per document
+MAX_HIGHLIGHTS = 1000
+
+class ViewState(NamedTuple):
+    # What a view needs to be shown again as it was, once its widgets are
+    # gone: the scroll position in the document and the editor's state
+    fraction: float
+    editing: bool = False
+    insert: str = "1.0"
+    editor_fraction: float = 0.0
 
 class PreviewPanel(ttk.Frame):
-    def __init__(self, master, on_stats_change: Optional[Callable[[int, int], None]] = None):
+    def __init__(self, master, on_stats_change: Optional[Callable[[int, int, Optional[int]], None]] = None,
+                 on_message: Optional[Callable[[str], None]] = None, on_view_change: Optional[Callable[[], None]] = None):
         super().__init__(master)
         self.on_stats_change = on_stats_change
+        self.on_message = on_message
+        self.on_view_change = on_view_change  # the preview scrolled or its blocks changed
         self.current_file_path = None
-        self.current_content = ""
+        self.current_content: Optional[str] = ""  # None while a large file is only mapped
+        self.buffer: Optional[EditBuffer] = None  # the text while editing, ahead of current_content
+        self.mapped: Optional[MappedFile] = None
+        self.encoding = "utf-8"
+        self.lossy = False  # the text is not exactly what is on disk; never saved
+        self.cache_key = None
         self.is_editing = False
+        self.edited = False  # edit mode was entered at some point
+        self.highlight: List[List[str]] = []  # search terms/phrases to mark after rendering
+        self.pending_view: Optional[ViewState] = None  # restored once rendered
+        
+        # Autosave: edits are debounced on the main loop and written atomically
+        # by a background thread
+        config = ConfigManager.load_config()
+        self.autosave_delay_ms = config.get("autosave_delay_ms", 500)
+        self.autosave_max_latency_ms = config.get("autosave_max_latency_ms", 3000)
+        self.save_job = None
+        self.dirty_since = None
+        dispatcher = get_dispatcher(self)
+        self.autosaver = AutoSaver(on_error=lambda path, e: dispatcher.call_soon(self.report_save_error, path, e))
+        
+        # Live preview: while editing, the blocks around the edited lines are
+        # re-rendered once the main loop has been idle for live_delay_ms
+        self.live_delay_ms = config.get("live_preview_delay_ms", 100)
+        self.live: Optional[LiveDocument] = None  # None when the preview is virtual
+        self.live_synced = False  # the preview holds exactly the blocks of self.live
+        self.live_job = None
+        self.live_paused = False  # a live update was due when the panel was hidden
+        self.sync_job = None
         
         # Header
         self.header = ttk.Frame(self)
@@ -26,31 +79,51 @@ class PreviewPanel(ttk.Frame):
         self.btn_copy = ttk.Button(self.header, text="📋", width=3, command=self.copy_to_clipboard)
         self.btn_copy.pack(side=tk.RIGHT, padx=2)
         
-        # Text Area
-        self.text_area = tk.Text(self, wrap=tk.WORD, padx=30, pady=30, borderwidth=0, highlightthickness=0, state=tk.DISABLED, undo=True)
+        self.btn_theme = ttk.Button(self.header, text="🌓", width=3, command=self.toggle_theme)
+        self.btn_theme.pack(side=tk.RIGHT, padx=2)
+        
+        # Scrollbar, shared by the preview and the editor. In virtual mode it
+        # reflects the estimated position in the whole document.
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.window_check_job = None
+        
+        # Text Area (rendered preview)
+        self.text_area = tk.Text(self, wrap=tk.WORD, padx=30, pady=30, borderwidth=0, highlightthickness=0, state=tk.DISABLED, yscrollcommand=self.on_preview_scroll)
         self.text_area.pack(fill=tk.BOTH, expand=True)
+        self.renderer = MarkdownRenderer(self.text_area, virtual_threshold=config.get("virtual_threshold_kb", 1024) * 1024)
+        
+        # Editor (raw source), shown next to the preview in edit mode. Every
+        # change is reported with its line range for the live preview.
+        self.editor = tk.Text(self, wrap=tk.WORD, padx=30, pady=30, borderwidth=0, highlightthickness=0, undo=True, font=("Courier New", 11), yscrollcommand=self.on_editor_scroll)
+        styles.apply(self.editor, tags=False)
+        self.tracker = TextChangeTracker(self.editor, self.on_editor_change)
         
         # Bindings
-        self.text_area.bind("<KeyRelease>", self.on_text_change)
         self.setup_shortcuts()
 
+    @property
+    def active_text(self) -> tk.Text:
+        return self.editor if self.is_editing else self.text_area
+
     def setup_shortcuts(self):
-        self.text_area.bind("<Control-a>", self.select_all)
-        self.text_area.bind("<Control-c>", self.copy_text)
-        self.text_area.bind("<Control-v>", self.paste_text)
-        self.text_area.bind("<Control-x>", self.cut_text)
-        self.text_area.bind("<Control-z>", self.undo_text)
-        self.text_area.bind("<Control-y>", self.redo_text)
+        for widget in (self.text_area, self.editor):
+            widget.bind("<Control-a>", self.select_all)
+            widget.bind("<Control-c>", self.copy_text)
+            widget.bind("<Control-v>", self.paste_text)
+            widget.bind("<Control-x>", self.cut_text)
+            widget.bind("<Control-z>", self.undo_text)
+            widget.bind("<Control-y>", self.redo_text)
 
     def select_all(self, event=None):
-        self.text_area.tag_add("sel", "1.0", "end")
+        self.active_text.tag_add("sel", "1.0", "end")
         return "break"
 
     def copy_text(self, event=None):
-        if not self.text_area.tag_ranges("sel"):
+        if not self.active_text.tag_ranges("sel"):
             return
         self.clipboard_clear()
-        text = self.text_area.get("sel.first", "sel.last")
+        text = self.active_text.get("sel.first", "sel.last")
         self.clipboard_append(text)
         return "break"
 
@@ -58,28 +131,25 @@ class PreviewPanel(ttk.Frame):
         if not self.is_editing: return
         try:
             text = self.clipboard_get()
-            if self.text_area.tag_ranges("sel"):
-                self.text_area.delete("sel.first", "sel.last")
-            self.text_area.insert("insert", text)
-            self.on_text_change()
+            if self.editor.tag_ranges("sel"):
+                self.editor.delete("sel.first", "sel.last")
+            self.editor.insert("insert", text)
         except tk.TclError:
             pass
         return "break"
 
     def cut_text(self, event=None):
         if not self.is_editing: return
-        if not self.text_area.tag_ranges("sel"):
+        if not self.editor.tag_ranges("sel"):
             return
         self.copy_text()
-        self.text_area.delete("sel.first", "sel.last")
-        self.on_text_change()
+        self.editor.delete("sel.first", "sel.last")
         return "break"
 
     def undo_text(self, event=None):
         if not self.is_editing: return
         try:
-            self.text_area.edit_undo()
-            self.on_text_change()
+            self.editor.edit_undo()
         except tk.TclError:
             pass
         return "break"
@@ -87,80 +157,356 @@ class PreviewPanel(ttk.Frame):
     def redo_text(self, event=None):
         if not self.is_editing: return
         try:
-            self.text_area.edit_redo()
-            self.on_text_change()
+            self.editor.edit_redo()
         except tk.TclError:
             pass
         return "break"
 
-    def load_content(self, text: str, file_path: str = ""):
+    def load_content(self, text: Optional[str], file_path: str = "", cache_key: Optional[CacheKey] = None,
+                     encoding: str = "utf-8", mapped: Optional[MappedFile] = None, lossy: bool = False):
+        # Without text, the document is rendered block by block from `mapped`
+        # and only decoded as a whole when needed (editing, copying)
+        self.save_file()
+        
+        # Reloading the same file keeps the scroll position, a new file starts at the top
+        same_file = file_path == self.current_file_path
+        if not same_file:
+            self.highlight = []
+        self.pending_view = None
         self.current_content = text
+        self.buffer = None
+        self.mapped = mapped if text is None else None
+        self.encoding = encoding
+        self.lossy = lossy
         self.current_file_path = file_path
+        self.renderer.images.base_dir = os.path.dirname(os.path.abspath(file_path)) if file_path else ""
+        self.cache_key = cache_key
         self.path_label.config(text=file_path)
         self.is_editing = False
         self.btn_edit.config(text="📝") # Reset to edit icon
         
         # Clear undo stack on load
         try:
-            self.text_area.edit_reset()
+            self.editor.edit_reset()
         except:
             pass
         
-        self.render_view()
+        self.render_view(keep_position=same_file)
         self.update_stats()
 
-    def render_view(self):
+    def render_view(self, keep_position: bool = True):
+        self.cancel_live_update()
+        self.live = None
         if self.is_editing:
-            # Edit Mode: Show raw text
-            self.text_area.config(state=tk.NORMAL, font=("Courier New", 11))
-            self.text_area.delete("1.0", tk.END)
-            self.text_area.insert("1.0", self.current_content)
+            # Edit Mode: raw text on the left, the preview follows on the right
+            content = self.get_content()
+            self.buffer = None
+            self.editor.delete("1.0", tk.END)
+            self.editor.insert("1.0", content)
+            self.cancel_live_update()
+            self.buffer = EditBuffer(content)
+            self.editor.edit_reset()
+            self.editor.edit_modified(False)
+            self.text_area.pack_forget()
+            self.editor.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            self.text_area.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            self.editor.focus_set()
+            if not self.renderer.virtual:
+                # Brought in line with the text once, then updated block by block
+                self.live = LiveDocument(content)
+                self.live_synced = False
+                self.renderer.render_async(content, self.cache_key, keep_position=True, on_done=self.on_live_synced)
         else:
-            # Preview Mode: Render Markdown
-            render_markdown(self.text_area, self.current_content)
+            # Preview Mode: Render Markdown (only the blocks that changed)
+            self.editor.pack_forget()
+            self.text_area.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+            if self.current_content is None:
+                self.renderer.render_stream(self.mapped, keep_position, on_done=self.on_render_done)
+            else:
+                self.renderer.render_async(self.current_content, self.cache_key, keep_position, on_done=self.on_render_done)
+
+    def get_content(self) -> str:
+        if self.buffer is not None:
+            return self.buffer.text()
+        if self.current_content is None:
+            self.current_content = self.mapped.read_text()
+            self.lossy = self.mapped.lossy
+        return self.current_content
+
+    def on_live_synced(self):
+        if self.live is None:
+            return
+        if self.renderer.virtual or self.renderer.view.keys != self.live.keys:
+            # Blocks split differently than the renderer's (e.g. at form feeds):
+            # fall back to whole-text renders
+            self.live = None
+            return
+        self.live_synced = True
+        self.sync_preview()
+
+    def on_editor_change(self, first: int, old_end: int, new_end: int):
+        if self.buffer is not None:
+            # Only the changed lines are read back. Every change goes through
+            # here, whether typed, pasted, dropped or undone.
+            self.buffer.replace(first, old_end, self.editor.get(f"{first + 1}.0", f"{new_end}.end").split("\n"))
+            self.mark_dirty()
+        if self.live is not None:
+            self.live.mark_changed(first, old_end, new_end)
+        if self.is_editing:
+            # Debounced: every change pushes the update back, so it runs once
+            # typing has paused for live_delay_ms
+            self.cancel_live_update()
+            self.live_job = self.after(self.live_delay_ms, self.update_live_preview)
+
+    def cancel_live_update(self):
+        if self.live_job:
+            self.after_cancel(self.live_job)
+            self.live_job = None
+        self.live_paused = False
+
+    def update_live_preview(self):
+        self.live_job = None
+        if not self.is_editing:
+            return
+        self.update_stats()
+        if self.live is None:
+            # Virtual previews are re-rendered from the whole text
+            self.renderer.render_async(self.buffer.text(), None, keep_position=True)
+            return
+        if not self.live_synced:
+            self.live_job = self.after(self.live_delay_ms, self.update_live_preview)
+            return
+        change = self.live.update(self.buffer.iter_lines)
+        if change:
+            start, stop, sources, keys = change
+            refs = self.live.refs
+            self.renderer.replace_blocks(start, stop, keys, lambda j: parse_block(sources[j], refs))
+            if self.on_view_change:
+                self.on_view_change()
+        self.sync_preview()
+
+    def on_editor_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.live is not None and not self.sync_job:
+            self.sync_job = self.after_idle(self.sync_preview)
+
+    def sync_preview(self):
+        # Scrolls the preview to the block at the top of the editor, at the same
+        # relative position within the block
+        self.sync_job = None
+        live = self.live
+        if live is None or not self.live_synced or not live.counts or live.dirty is not None:
+            return
+        top = int(self.editor.index("@0,0").split(".")[0]) - 1
+        j = live.block_at(top)
+        start = int(self.renderer.sink.block_start(j).split(".")[0])
+        end = int(self.renderer.sink.block_start(j + 1).split(".")[0])
+        within = min(1.0, (top - live.first_line(j)) / live.counts[j])
+        self.text_area.yview(f"{start + int(within * (end - start))}.0")
+
+    def on_render_done(self):
+        self.update_stats()
+        if self.on_view_change:
+            self.on_view_change()
+        if self.pending_view:
+            state, self.pending_view = self.pending_view, None
+            self.renderer.jump_to(state.fraction)
+            if state.editing and not self.is_editing:
+                self.toggle_edit()
+                self.editor.mark_set(tk.INSERT, state.insert)
+                self.editor.yview_moveto(state.editor_fraction)
+        if self.highlight:
+            self.apply_highlight()
+
+    def view_state(self) -> ViewState:
+        fraction = self.renderer.scroll_fractions(*self.text_area.yview())[0]
+        if self.is_editing:
+            return ViewState(fraction, True, self.editor.index(tk.INSERT), self.editor.yview()[0])
+        return ViewState(fraction)
+
+    def restore_view(self, state: ViewState):
+        # Applied when the render started by load_content is done
+        self.pending_view = state
+
+    def text_chars(self) -> int:
+        # Characters held by the preview and the editor
+        chars = (self.text_area.count("1.0", tk.END, "chars") or (0,))[0]
+        if self.buffer is not None:
+            chars += self.buffer.chars
+        return chars
+
+    def highlight_terms(self, parts: List[List[str]]):
+        # Marked once the pending render is done; each part is a word or a phrase
+        self.highlight = parts
+
+    def apply_highlight(self):
+        # Matches in the rendered (loaded) text, scrolled to the first one
+        self.text_area.tag_remove("search", "1.0", tk.END)
+        patterns = [r"\m" + r"\W+".join(part) + r"\M" for part in self.highlight]
+        count = tk.IntVar()
+        first = None
+        found = 0
+        index = "1.0"
+        while found < MAX_HIGHLIGHTS:
+            index = self.text_area.search("|".join(patterns), index, stopindex=tk.END, regexp=True, nocase=True, count=count)
+            if not index or not count.get():
+                break
+            end = f"{index}+{count.get()}c"
+            self.text_area.tag_add("search", index, end)
+            first = first or index
+            found += 1
+            index = end
+        if first:
+            self.text_area.see(first)
 
     def toggle_edit(self):
         if not self.current_file_path:
             return
+        if not self.is_editing:
+            self.get_content()
+            if self.lossy:
+                # Saving would write the replacement characters over the original bytes
+                if self.on_message:
+                    self.on_message(f"{os.path.basename(self.current_file_path)} is not valid {self.encoding} and cannot be edited")
+                return
 
         self.is_editing = not self.is_editing
         
         if self.is_editing:
+            self.edited = True
             self.btn_edit.config(text="💾") # Show save/done icon (visual cue)
             self.render_view()
         else:
-            # Saving is handled automatically on change, but let's ensure we capture the latest
-            self.current_content = self.text_area.get("1.0", "end-1c")
+            # Autosave is debounced, so write out whatever is still pending
+            tracer.start_frame()
             self.save_file()
+            self.current_content = self.buffer.text()
+            self.buffer = None
             self.btn_edit.config(text="📝")
             self.render_view()
-
-    def on_text_change(self, event=None):
-        if self.is_editing:
-            content = self.text_area.get("1.0", "end-1c")
-            self.current_content = content
             self.update_stats()
-            self.save_file()
+
+    def mark_dirty(self):
+        # The buffer is saved once typing pauses, or after the max latency
+        # during continuous typing. The cached render belongs to the version
+        # that was loaded.
+        self.cache_key = None
+        now = time.monotonic()
+        if self.dirty_since is None:
+            self.dirty_since = now
+        if self.save_job:
+            self.after_cancel(self.save_job)
+        remaining = self.autosave_max_latency_ms - (now - self.dirty_since) * 1000
+        self.save_job = self.after(int(max(0, min(self.autosave_delay_ms, remaining))), self.save_file)
 
     def save_file(self):
-        if self.current_file_path and self.is_editing:
-            try:
-                with open(self.current_file_path, 'w', encoding='utf-8') as f:
-                    f.write(self.current_content)
-            except Exception as e:
-                print(f"Error saving file: {e}")
+        if self.save_job:
+            self.after_cancel(self.save_job)
+            self.save_job = None
+        if self.dirty_since is None:
+            return
+        self.dirty_since = None
+        if self.lossy:
+            return
+        with tracer.span("save_file", "save"):
+            # A copy of the line list, joined and encoded by the writer
+            lines = self.buffer.snapshot()
+            self.editor.edit_modified(False)
+            if self.current_file_path:
+                self.autosaver.submit(self.current_file_path, lines, self.encoding)
+        self.update_stats()
+
+    def flush_save(self, timeout: Optional[float] = None) -> bool:
+        # Submit pending edits and wait until they are written
+        self.save_file()
+        return self.autosaver.flush(timeout)
+
+    def pause(self):
+        # Hidden behind another tab: nothing of this panel may hold up the
+        # render worker for the one in view
+        if self.live_job:
+            self.cancel_live_update()
+            self.live_paused = True
+        self.renderer.pause()
+
+    def resume(self):
+        self.renderer.resume()
+        if self.live_paused:
+            self.live_paused = False
+            self.update_live_preview()
+
+    def close(self, timeout: Optional[float] = None):
+        # Before the panel is destroyed: pending edits are written out, and
+        # nothing scheduled may run on the destroyed widgets or keep the view
+        # alive
+        self.save_file()
+        self.autosaver.close(timeout)
+        self.cancel_live_update()
+        for job in (self.sync_job, self.window_check_job):
+            if job:
+                self.after_cancel(job)
+        self.sync_job = None
+        self.window_check_job = None
+        self.renderer.close()
+        self.tracker.close()
+
+    def report_save_error(self, path: str, error: Exception):
+        if self.on_message:
+            self.on_message(f"Error saving {os.path.basename(path)}: {error}")
+
+    def toggle_theme(self):
+        # Tags are restyled in place, no re-render needed
+        theme = "light" if styles.theme == "dark" else "dark"
+        styles.set_theme(theme)
+        ConfigManager.set("theme", theme)
 
     def copy_to_clipboard(self):
+        self.save_file()
         self.clipboard_clear()
-        self.clipboard_append(self.current_content)
+        self.clipboard_append(self.get_content())
         self.update()
 
     def update_stats(self):
         if self.on_stats_change:
-            lines = int(self.text_area.index('end-1c').split('.')[0])
-            chars = len(self.current_content)
-            self.on_stats_change(lines, chars)
+            with tracer.span("stats"):
+                words = None
+                if self.buffer is not None:
+                    # Running totals of the edit buffer
+                    lines, chars, words = self.buffer.line_count, self.buffer.chars, self.buffer.words
+                else:
+                    if self.renderer.virtual:
+                        # Only a window of the document is loaded
+                        lines = self.renderer.total_lines
+                    else:
+                        lines = int(self.text_area.index('end-1c').split('.')[0])
+                    if self.current_content is None:
+                        chars = self.renderer.document.chars or 0
+                    else:
+                        chars = len(self.current_content)
+            self.on_stats_change(lines, chars, words)
 
     def scroll_view(self, direction: int):
         # direction: 1 for down, -1 for up
-        self.text_area.yview_scroll(direction * 20, "units")
+        self.active_text.yview_scroll(direction * 20, "units")
+
+    def on_preview_scroll(self, first, last):
+        if not self.is_editing:
+            # In edit mode the scrollbar follows the editor
+            self.scrollbar.set(*self.renderer.scroll_fractions(float(first), float(last)))
+        self.renderer.schedule_highlight()
+        if self.on_view_change:
+            self.on_view_change()
+        if self.renderer.virtual and not self.window_check_job:
+            self.window_check_job = self.after_idle(self.check_window)
+
+    def check_window(self):
+        self.window_check_job = None
+        self.renderer.check_window()
+
+    def on_scrollbar(self, *args):
+        if self.is_editing:
+            self.editor.yview(*args)
+        elif args[0] == "moveto":
+            self.renderer.jump_to(float(args[1]))
+        else:
+            self.text_area.yview(*args)
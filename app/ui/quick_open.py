@@ -0,0 +1,74 @@
+import tkinter as tk
+from tkinter import ttk
+import os
+from typing import Callable, List, Optional
+
+from app.core.finder import PathIndex
+
+class QuickOpen(tk.Toplevel):
+    # Ctrl+P palette: fuzzy file names under the opened folder, updated on
+    # every keystroke. Each index query is time-boxed; when it returns partial
+    # results the rest of the scan continues from the main loop.
+    def __init__(self, master, get_index: Callable[[], Optional[PathIndex]], on_open: Callable[[str], None]):
+        super().__init__(master)
+        self.title("Open File")
+        self.geometry("520x360")
+        self.transient(master)
+        self.get_index = get_index
+        self.on_open = on_open
+        self.paths: List[str] = []
+        self.continue_job = None
+
+        self.query_var = tk.StringVar()
+        self.entry = ttk.Entry(self, textvariable=self.query_var)
+        self.entry.pack(fill=tk.X, padx=5, pady=5)
+
+        self.results = tk.Listbox(self, borderwidth=0, highlightthickness=0, activestyle="none", font=("Helvetica", 10))
+        self.results.pack(fill=tk.BOTH, expand=True, padx=5, pady=(0, 5))
+
+        # Bindings
+        self.query_var.trace_add("write", lambda *args: self.update_results())
+        self.entry.bind("<Return>", self.open_selected)
+        self.entry.bind("<Down>", lambda e: self.move_selection(1))
+        self.entry.bind("<Up>", lambda e: self.move_selection(-1))
+        self.results.bind("<Double-Button-1>", self.open_selected)
+        self.bind("<Escape>", lambda e: self.withdraw())
+        self.protocol("WM_DELETE_WINDOW", self.withdraw)
+
+    def show(self):
+        self.query_var.set("")
+        self.deiconify()
+        self.lift()
+        self.entry.focus_set()
+
+    def update_results(self):
+        if self.continue_job:
+            self.after_cancel(self.continue_job)
+            self.continue_job = None
+        index = self.get_index()
+        self.results.delete(0, tk.END)
+        self.paths, complete = index.search(self.query_var.get()) if index else ([], True)
+        if not complete:
+            self.continue_job = self.after(1, self.update_results)
+        for path in self.paths:
+            rel = os.path.relpath(path, index.root)
+            self.results.insert(tk.END, f" {os.path.basename(rel)}  —  {os.path.dirname(rel) or '.'}")
+        if self.paths:
+            self.results.selection_set(0)
+
+    def move_selection(self, step: int):
+        if not self.paths:
+            return "break"
+        selection = self.results.curselection()
+        index = min(max((selection[0] if selection else -1) + step, 0), len(self.paths) - 1)
+        self.results.selection_clear(0, tk.END)
+        self.results.selection_set(index)
+        self.results.see(index)
+        return "break"
+
+    def open_selected(self, event=None):
+        selection = self.results.curselection()
+        if selection and selection[0] < len(self.paths):
+            self.withdraw()
+            self.on_open(self.paths[selection[0]])
+        return "break"
@@ -0,0 +1,94 @@
+import tkinter as tk
+from tkinter import ttk
+import os
+import time
+from typing import Callable, List, Optional
+
+from app.core.search import SearchHit, SearchIndex
+
+# Wait for typing to pause before querying
+SEARCH_DELAY_MS = 80
+
+class SearchDialog(tk.Toplevel):
+    # Full-text search over the opened folder. Queries run against the
+    # in-memory index on the main loop; Enter or double-click opens a result.
+    def __init__(self, master, get_index: Callable[[], Optional[SearchIndex]], on_open: Callable[[str, str], None]):
+        super().__init__(master)
+        self.title("Search")
+        self.geometry("520x420")
+        self.transient(master)
+        self.get_index = get_index
+        self.on_open = on_open
+        self.hits: List[SearchHit] = []
+        self.search_job = None
+
+        self.query_var = tk.StringVar()
+        self.entry = ttk.Entry(self, textvariable=self.query_var)
+        self.entry.pack(fill=tk.X, padx=5, pady=5)
+
+        self.status_var = tk.StringVar()
+        ttk.Label(self, textvariable=self.status_var, foreground="#555").pack(fill=tk.X, padx=5)
+
+        self.results = tk.Listbox(self, borderwidth=0, highlightthickness=0, activestyle="none", font=("Helvetica", 10))
+        self.results.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        # Bindings
+        self.query_var.trace_add("write", lambda *args: self.schedule_search())
+        self.entry.bind("<Return>", self.open_selected)
+        self.entry.bind("<Down>", lambda e: self.move_selection(1))
+        self.entry.bind("<Up>", lambda e: self.move_selection(-1))
+        self.results.bind("<Double-Button-1>", self.open_selected)
+        self.results.bind("<Return>", self.open_selected)
+        self.bind("<Escape>", lambda e: self.withdraw())
+        self.protocol("WM_DELETE_WINDOW", self.withdraw)
+
+    def show(self):
+        self.deiconify()
+        self.lift()
+        self.entry.focus_set()
+        self.entry.select_range(0, tk.END)
+        self.schedule_search()
+
+    def schedule_search(self):
+        if self.search_job:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(SEARCH_DELAY_MS, self.run_search)
+
+    def run_search(self):
+        self.search_job = None
+        index = self.get_index()
+        query = self.query_var.get()
+        self.results.delete(0, tk.END)
+        self.hits = []
+        if index is None:
+            self.status_var.set("No folder opened")
+            return
+        if not query.strip():
+            self.status_var.set(f"{len(index)} files indexed" if index.ready else "Indexing…")
+            return
+
+        start = time.perf_counter()
+        self.hits = index.search(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        for hit in self.hits:
+            self.results.insert(tk.END, f" {os.path.relpath(hit.path, index.root)}")
+        if self.hits:
+            self.results.selection_set(0)
+        status = f"{len(self.hits)} results in {elapsed:.1f} ms"
+        self.status_var.set(status if index.ready else status + " (indexing…)")
+
+    def move_selection(self, step: int):
+        if not self.hits:
+            return "break"
+        selection = self.results.curselection()
+        index = min(max((selection[0] if selection else -1) + step, 0), len(self.hits) - 1)
+        self.results.selection_clear(0, tk.END)
+        self.results.selection_set(index)
+        self.results.see(index)
+        return "break"
+
+    def open_selected(self, event=None):
+        selection = self.results.curselection()
+        if selection and selection[0] < len(self.hits):
+            self.on_open(self.hits[selection[0]].path, self.query_var.get())
+        return "break"
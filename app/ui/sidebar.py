@@ -1,15 +1,29 @@
 import tkinter as tk
 from tkinter import ttk, filedialog
 import os
-from typing import Callable, Optional
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
 from app.core.config import ConfigManager
+from app.core.dirscan import SNAPSHOT_LIMIT, DirEntryInfo, is_markdown, load_snapshot, save_snapshot, scan_directory, scan_executor
+from app.core.watcher import FileWatcher
+from app.core.trace import tracer
+from app.ui.dispatcher import get_dispatcher
+
+# Rows inserted into the tree per main-loop tick
+TREE_CHUNK = 200
+PLACEHOLDER = "loading…"
 
 class Sidebar(ttk.Frame):
-    def __init__(self, master, on_file_select: Callable[[str], None], on_folder_change: Callable[[str], None], initial_path: str):
+    def __init__(self, master, on_file_select: Callable[[str], None], on_folder_change: Callable[[str], None], initial_path: str, watcher: Optional[FileWatcher] = None):
         super().__init__(master, width=250)
         self.on_file_select = on_file_select
         self.on_folder_change = on_folder_change
         self.current_path = initial_path
+        self.watcher = watcher
+        self.scans: Dict[str, threading.Event] = {}  # tree node -> cancel flag of its listing
+        self.nodes: Dict[str, str] = {}  # path -> tree node, for filesystem events
+        self.watched = set()  # folders with a listing in the tree
         
         # --- Pinned Section ---
         self.pinned_frame = ttk.Frame(self)
@@ -27,6 +41,8 @@ class Sidebar(ttk.Frame):
         self.pinned_list.pack(fill=tk.X, padx=5)
         self.pinned_list.bind("<<ListboxSelect>>", self.on_pinned_select)
         self.refresh_pinned()
+        # Redraw the list only when the pinned files actually change
+        ConfigManager.subscribe("pinned_files", self.refresh_pinned)
 
         # --- Explorer Section ---
         self.explorer_frame = ttk.Frame(self)
@@ -51,13 +67,15 @@ class Sidebar(ttk.Frame):
         # Bindings
         self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
         self.tree.bind("<<TreeviewOpen>>", self.on_tree_open)
+        self.tree.bind("<<TreeviewClose>>", self.on_tree_close)
         
         self.create_context_menus()
         self.populate_root(initial_path)
 
-    def refresh_pinned(self):
+    def refresh_pinned(self, files: Optional[list] = None):
         self.pinned_list.delete(0, tk.END)
-        files = ConfigManager.get_pinned_files()
+        if files is None:
+            files = ConfigManager.get_pinned_files()
         for f in files:
             self.pinned_list.insert(tk.END, f" {os.path.basename(f)}")
             
@@ -65,7 +83,6 @@ class Sidebar(ttk.Frame):
         path = filedialog.askopenfilename(filetypes=[("Markdown Files", "*.md *.markdown"), ("All Files", "*.*")])
         if path:
             ConfigManager.add_pinned_file(path)
-            self.refresh_pinned()
 
     def on_pinned_select(self, event):
         selection = self.pinned_list.curselection()
@@ -88,49 +105,168 @@ class Sidebar(ttk.Frame):
             self.on_folder_change(folder)
 
     def populate_root(self, path: str):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.cancel_scans()
+        self.delete_children("")
         
+        path = os.path.abspath(path)
         root_text = os.path.basename(path) or path
-        root_node = self.tree.insert("", "end", text=root_text, open=True, values=[path])
-        self.populate_node(root_node, path)
+        root_node = self.tree.insert("", "end", text=root_text, open=True, values=[path], tags=("dir",))
+        self.nodes[path] = root_node
+        self.populate_node(root_node, path, load_snapshot(path))
 
-    def populate_node(self, parent_id, path):
-        children = self.tree.get_children(parent_id)
-        if children:
-            self.tree.delete(*children)
-            
+    def populate_node(self, parent_id, path, snapshot: Optional[List[DirEntryInfo]] = None):
+        # The listing runs on a worker thread; the node shows a placeholder until
+        # the rows are inserted in chunks on the main loop. The root folder shows
+        # the snapshot of the last session instead, until the scan confirms it.
+        with tracer.span("populate_node", "tree", path=path):
+            self.cancel_scan(parent_id)
+            self.delete_children(parent_id)
+            if snapshot:
+                for entry in snapshot:
+                    self.insert_entry(parent_id, entry)
+            else:
+                snapshot = None
+                self.tree.insert(parent_id, "end", text=PLACEHOLDER, tags=("placeholder",))
+            if self.watcher and path not in self.watched:
+                self.watched.add(path)
+                self.watcher.watch(path)
+        
+            cancel = threading.Event()
+            self.scans[parent_id] = cancel
+            dispatcher = get_dispatcher(self)
+            future = scan_executor().submit(scan_directory, path, cancel)
+            future.add_done_callback(lambda f: dispatcher.call_soon(self.on_scan_done, parent_id, path, cancel, f, snapshot))
+
+    def on_scan_done(self, parent_id, path: str, cancel: threading.Event, future: Future, snapshot: Optional[List[DirEntryInfo]] = None):
+        if cancel.is_set() or not self.tree.exists(parent_id):
+            return
         try:
-            items = os.listdir(path)
-            items.sort(key=lambda x: (not os.path.isdir(os.path.join(path, x)), x.lower()))
-            
-            for p in items:
-                abspath = os.path.join(path, p)
-                isdir = os.path.isdir(abspath)
-                
-                if not isdir and not p.lower().endswith(('.md', '.markdown')):
-                    continue
-                
-                oid = self.tree.insert(parent_id, "end", text=p, open=False, values=[abspath])
-                
-                if isdir:
-                    self.tree.insert(oid, "end", text="dummy")
-                    
+            entries = future.result()
         except PermissionError:
-            pass
+            entries = []
         except Exception as e:
             print(f"Error reading {path}: {e}")
+            entries = []
+        if entries is None:
+            return
+        
+        if parent_id in self.tree.get_children("") and entries[:SNAPSHOT_LIMIT] != snapshot:
+            scan_executor().submit(save_snapshot, path, entries)
+        if snapshot is not None and entries[:len(snapshot)] == snapshot:
+            # The snapshot is still right; add what it left out
+            self.insert_entries(parent_id, entries, len(snapshot), cancel)
+            return
+        self.delete_children(parent_id)
+        self.insert_entries(parent_id, entries, 0, cancel)
 
-    def on_tree_open(self, event):
-        selected = self.tree.selection()
-        if not selected: return
-        item_id = selected[0]
-        item = self.tree.item(item_id)
-        path = item['values'][0]
+    def insert_entries(self, parent_id, entries: List[DirEntryInfo], start: int, cancel: threading.Event):
+        if cancel.is_set() or not self.tree.exists(parent_id):
+            return
+        with tracer.span("tree_insert", "tree"):
+            for entry in entries[start:start + TREE_CHUNK]:
+                self.insert_entry(parent_id, entry)
         
-        if os.path.isdir(path):
+        start += TREE_CHUNK
+        if start < len(entries):
+            self.after(1, self.insert_entries, parent_id, entries, start, cancel)
+        elif self.scans.get(parent_id) is cancel:
+            del self.scans[parent_id]
+
+    def insert_entry(self, parent_id, entry: DirEntryInfo, index="end"):
+        if entry.is_dir:
+            oid = self.tree.insert(parent_id, index, text=entry.name, open=False, values=[entry.path], tags=("dir",))
+            self.tree.insert(oid, "end", text=PLACEHOLDER, tags=("placeholder",))
+        else:
+            oid = self.tree.insert(parent_id, index, text=entry.name, open=False, values=[entry.path], tags=("file",))
+        self.nodes[entry.path] = oid
+
+    def delete_children(self, node_id):
+        children = self.tree.get_children(node_id)
+        for child in children:
+            self.forget(child)
+        if children:
+            self.tree.delete(*children)
+
+    def forget(self, node_id):
+        # Drop a subtree from the path index and stop watching its folders
+        for child in self.tree.get_children(node_id):
+            self.forget(child)
+        self.cancel_scan(node_id)
+        values = self.tree.item(node_id, "values")
+        if not values:
+            return
+        path = str(values[0])
+        if self.nodes.get(path) == node_id:
+            del self.nodes[path]
+        if path in self.watched:
+            self.watched.discard(path)
+            self.watcher.unwatch(path)
+
+    def is_loaded(self, node_id) -> bool:
+        if node_id in self.scans:
+            return False
+        children = self.tree.get_children(node_id)
+        return not (children and "placeholder" in self.tree.item(children[0], "tags"))
+
+    def apply_fs_changes(self, changes: Dict[str, str]):
+        # Patch only the rows of the changed paths. Folders that are still
+        # loading (or not loaded yet) get the change from their own listing.
+        for path, kind in changes.items():
+            node_id = self.nodes.get(path)
+            if kind == "rescan":
+                if node_id and self.is_loaded(node_id):
+                    self.populate_node(node_id, path)
+                continue
+            exists = os.path.exists(path)
+            if node_id is not None:
+                if not exists and self.tree.parent(node_id):
+                    self.forget(node_id)
+                    self.tree.delete(node_id)
+                continue
+
+            parent_id = self.nodes.get(os.path.dirname(path))
+            if not exists or parent_id is None or not self.is_loaded(parent_id):
+                continue
+            name = os.path.basename(path)
+            is_dir = os.path.isdir(path)
+            if is_dir or is_markdown(name):
+                self.insert_entry(parent_id, DirEntryInfo(name, path, is_dir), self.sorted_index(parent_id, name, is_dir))
+
+    def sorted_index(self, parent_id, name: str, is_dir: bool) -> int:
+        # Same order as scan_directory: folders first, then by name
+        key = (not is_dir, name.lower())
+        children = self.tree.get_children(parent_id)
+        for i, child in enumerate(children):
+            item = self.tree.item(child)
+            if key < ("dir" not in item["tags"], str(item["text"]).lower()):
+                return i
+        return len(children)
+
+    def cancel_scan(self, node_id):
+        cancel = self.scans.pop(node_id, None)
+        if cancel:
+            cancel.set()
+
+    def cancel_scans(self):
+        for cancel in self.scans.values():
+            cancel.set()
+        self.scans.clear()
+
+    def on_tree_open(self, event):
+        item_id = self.tree.focus()
+        if not item_id: return
+        if "dir" in self.tree.item(item_id, "tags"):
+            path = self.tree.item(item_id)['values'][0]
             self.populate_node(item_id, path)
 
+    def on_tree_close(self, event):
+        # Collapsing a folder that is still loading drops its listing
+        item_id = self.tree.focus()
+        if item_id in self.scans:
+            self.cancel_scan(item_id)
+            self.delete_children(item_id)
+            self.tree.insert(item_id, "end", text=PLACEHOLDER, tags=("placeholder",))
+
     def on_tree_select(self, event):
         selected = self.tree.selection()
         if not selected: return
@@ -180,7 +316,6 @@ class Sidebar(ttk.Frame):
             if index < len(files):
                 path = files[index]
                 ConfigManager.move_pinned_file(path, direction)
-                self.refresh_pinned()
                 
                 # Reselect the moved item
                 new_index = index
@@ -200,7 +335,6 @@ class Sidebar(ttk.Frame):
             if index < len(files):
                 path = files[index]
                 ConfigManager.remove_pinned_file(path)
-                self.refresh_pinned()
 
     def show_tree_menu(self, event):
         item_id = self.tree.identify_row(event.y)
@@ -223,7 +357,6 @@ class Sidebar(ttk.Frame):
             ConfigManager.add_pinned_file(path)
         else:
             ConfigManager.remove_pinned_file(path)
-        self.refresh_pinned()
 
     # --- Drag and Drop Logic ---
     def on_drag_start(self, event):
@@ -245,12 +378,8 @@ class Sidebar(ttk.Frame):
                 item = files.pop(self.drag_start_index)
                 files.insert(target_index, item)
                 
-                # Save
-                config = ConfigManager.load_config()
-                config["pinned_files"] = files
-                ConfigManager.save_config(config)
-                
-                self.refresh_pinned()
+                # Save (the list redraws through the config subscription)
+                ConfigManager.set("pinned_files", files)
                 
                 # Restore selection
                 self.pinned_list.selection_clear(0, tk.END)
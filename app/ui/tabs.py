@@ -0,0 +1,153 @@
+import tkinter as tk
+from tkinter import ttk
+from collections import OrderedDict
+import os
+from typing import Callable, Dict, List, Optional
+
+from app.ui.preview import PreviewPanel, ViewState
+
+# Rough memory cost of one character held by a Text widget, its tags and line
+# structures included
+VIEW_BYTES_PER_CHAR = 8
+
+class DocumentTab:
+    # An open document. While its view is pooled, `panel` is the rendered
+    # PreviewPanel; an evicted tab only keeps `state` and is loaded again the
+    # next time it is shown. A preview tab is taken over by the next file
+    # browsed to in the sidebar.
+    def __init__(self, frame: ttk.Frame, path: Optional[str] = None):
+        self.frame = frame
+        self.path = path
+        self.preview = False
+        self.panel: Optional[PreviewPanel] = None
+        self.state: Optional[ViewState] = None
+
+class DocumentTabs(ttk.Notebook):
+    # One tab per open document, over a pool of at most max_views rendered
+    # views holding at most max_bytes (estimated). Showing a tab moves it to
+    # the back of the LRU; the views at the front are evicted once either
+    # limit is exceeded. Only the view shown renders; the others pause their
+    # renders until shown again. There is always at least one tab, "Untitled"
+    # until a document is opened in it.
+    def __init__(self, master, make_panel: Callable[[tk.Misc], PreviewPanel], on_select: Callable[[DocumentTab], None],
+                 max_views: int = 4, max_bytes: int = 256 * 1024 * 1024):
+        super().__init__(master)
+        self.make_panel = make_panel
+        self.on_select = on_select
+        self.max_views = max(1, max_views)
+        self.max_bytes = max_bytes
+        self.tabs: List[DocumentTab] = []
+        self.pool: "OrderedDict[DocumentTab, None]" = OrderedDict()  # tabs with a view, least recent first
+        self.show(self.add_tab())
+
+        self.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.bind("<Button-2>", self.on_middle_click)
+
+    @property
+    def current(self) -> Optional[DocumentTab]:
+        selected = self.select()
+        for tab in self.tabs:
+            if str(tab.frame) == selected:
+                return tab
+        return None
+
+    def find(self, path: str) -> Optional[DocumentTab]:
+        path = os.path.abspath(path)
+        for tab in self.tabs:
+            if tab.path and os.path.abspath(tab.path) == path:
+                return tab
+        return None
+
+    def add_tab(self, path: Optional[str] = None) -> DocumentTab:
+        tab = DocumentTab(ttk.Frame(self), path)
+        self.tabs.append(tab)
+        self.add(tab.frame, text=os.path.basename(path) if path else "Untitled")
+        return tab
+
+    def preview_tab(self) -> Optional[DocumentTab]:
+        for tab in self.tabs:
+            if tab.preview:
+                # Kept once it has been edited
+                if tab.panel is None or not tab.panel.edited:
+                    return tab
+                tab.preview = False
+        return None
+
+    def open_tab(self, path: str, preview: bool = False) -> DocumentTab:
+        # The tab of `path`; a new document takes over the current tab if it
+        # is still empty, or else the preview tab when opened as a preview
+        tab = self.find(path)
+        if tab is None:
+            tab = self.current
+            if tab is None or tab.path:
+                tab = (self.preview_tab() if preview else None) or self.add_tab(path)
+            tab.path = path
+            tab.state = None
+            tab.preview = preview
+            self.tab(tab.frame, text=os.path.basename(path))
+        elif not preview:
+            tab.preview = False
+        return tab
+
+    def show(self, tab: DocumentTab) -> bool:
+        # Selects the tab, with a view. True if the view was just created and
+        # still has to be loaded.
+        created = tab.panel is None
+        if created:
+            tab.panel = self.make_panel(tab.frame)
+            tab.panel.pack(fill=tk.BOTH, expand=True)
+        for other in self.pool:
+            if other is not tab:
+                other.panel.pause()
+        self.pool[tab] = None
+        self.pool.move_to_end(tab)
+        if self.select() != str(tab.frame):
+            self.select(tab.frame)
+        self.evict(tab)
+        return created
+
+    def evict(self, keep: DocumentTab):
+        sizes: Dict[DocumentTab, int] = {tab: tab.panel.text_chars() * VIEW_BYTES_PER_CHAR for tab in self.pool}
+        total = sum(sizes.values())
+        for tab in list(self.pool):
+            if len(self.pool) <= self.max_views and total <= self.max_bytes:
+                break
+            if tab is not keep:
+                total -= sizes[tab]
+                self.release(tab)
+
+    def release(self, tab: DocumentTab, timeout: Optional[float] = 10):
+        # Drops the view of a tab, keeping what is needed to show it again.
+        # Pending edits are written out first.
+        del self.pool[tab]
+        tab.state = tab.panel.view_state()
+        if tab.panel.edited:
+            tab.preview = False
+        tab.panel.close(timeout)
+        tab.panel.destroy()
+        tab.panel = None
+
+    def close_tab(self, tab: DocumentTab):
+        if tab.panel is not None:
+            self.release(tab)
+        self.forget(tab.frame)
+        tab.frame.destroy()
+        self.tabs.remove(tab)
+        if not self.tabs:
+            self.show(self.add_tab())
+
+    def close_views(self, timeout: Optional[float] = None):
+        for tab in list(self.pool):
+            tab.panel.close(timeout)
+
+    def on_tab_changed(self, event=None):
+        tab = self.current
+        if tab is not None:
+            self.on_select(tab)
+
+    def on_middle_click(self, event):
+        try:
+            index = self.index(f"@{event.x},{event.y}")
+        except tk.TclError:
+            return
+        self.close_tab(self.tabs[index])
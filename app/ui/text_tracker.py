@@ -0,0 +1,51 @@
+import tkinter as tk
+from typing import Callable
+
+class TextChangeTracker:
+    # Reports the lines touched by every change to a Text widget. The widget's
+    # Tcl command is renamed and replaced by dispatch(), so inserts and deletes
+    # from key bindings, from Python and from the undo stack are all seen.
+    #
+    # on_change(first, old_end, new_end): lines [first, old_end) became
+    # [first, new_end), counted from 0.
+    def __init__(self, text_widget: tk.Text, on_change: Callable[[int, int, int], None]):
+        self.text_widget = text_widget
+        self.on_change = on_change
+        self.original = text_widget._w + "_tracked"
+        text_widget.tk.call("rename", text_widget._w, self.original)
+        text_widget.tk.createcommand(text_widget._w, self.dispatch)
+        self.closed = False
+
+    def close(self):
+        # Puts the widget's own command back. The proxy command would otherwise
+        # keep dispatch(), and everything on_change refers to, alive after the
+        # widget is destroyed.
+        if self.closed:
+            return
+        self.closed = True
+        tw = self.text_widget
+        tw.tk.deletecommand(tw._w)
+        tw.tk.call("rename", self.original, tw._w)
+
+    def line(self, index: str) -> int:
+        return int(self.text_widget.tk.call(self.original, "index", index).split(".")[0]) - 1
+
+    def dispatch(self, operation, *args):
+        call = self.text_widget.tk.call
+        if operation not in ("insert", "delete", "replace") or not args:
+            return call((self.original, operation) + args)
+        last = self.line("end-1c")
+        first = min(self.line(args[0]), last)
+        if operation == "insert":
+            old_end = first + 1
+        elif operation == "replace":
+            old_end = min(self.line(args[1]), last) + 1
+        else:
+            # delete takes one index or any number of ranges
+            ends = args[1::2] if len(args) > 1 else [args[0] + "+1c"]
+            first = min([first] + [min(self.line(index), last) for index in args[2::2]])
+            old_end = min(max(self.line(index) for index in ends), last) + 1
+        result = call((self.original, operation) + args)
+        # The change in line count gives the end of the changed lines afterwards
+        self.on_change(first, old_end, old_end + self.line("end-1c") - last)
+        return result
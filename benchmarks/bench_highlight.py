@@ -0,0 +1,62 @@
+"""Cost of code highlighting for a document made of many code blocks.
+
+Compares parsing the document with markdown2 running Pygments on every block
+(the old extras) against the current parse, which only tags each block's
+language, plus the highlighting of the blocks of one screen: tokenized cold,
+then served from the highlight cache.
+
+Usage: python3 -m benchmarks.bench_highlight [blocks] [lines_per_block]
+"""
+import sys
+import time
+
+import markdown2
+
+from app.core.highlight import HighlightCache
+from app.core.render_ops import MARKDOWN_EXTRAS, MarkdownRenderParser, parse_block, split_blocks
+from benchmarks.corpus import generate_code_block
+
+# Code blocks on one screen
+SCREEN_BLOCKS = 3
+
+def elapsed_ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    md_text = "\n".join(generate_code_block(lines, seed=i) for i in range(blocks))
+    sources = split_blocks(md_text)
+
+    pygments_md = markdown2.Markdown(extras=[extra for extra in MARKDOWN_EXTRAS if extra != "highlightjs-lang"])
+    parser = MarkdownRenderParser()
+    parser.feed_block(pygments_md.convert(sources[0]))
+    start = time.perf_counter()
+    for source in sources:
+        parser.feed_block(pygments_md.convert(source))
+    pygments_ms = elapsed_ms(start)
+
+    parse_block(sources[0])
+    start = time.perf_counter()
+    runs = [parse_block(source) for source in sources]
+    parse_ms = elapsed_ms(start)
+
+    cache = HighlightCache()
+    screen = [text for block in runs[:SCREEN_BLOCKS] for text, tags in block if "pre" in tags]
+    cache.highlight("python", "x = 1\n")
+    start = time.perf_counter()
+    for code in screen:
+        cache.highlight("python", code)
+    cold_ms = elapsed_ms(start)
+    start = time.perf_counter()
+    for code in screen:
+        cache.highlight("python", code)
+    cached_ms = elapsed_ms(start)
+
+    print(f"document:              {blocks} code blocks of {lines} lines")
+    print(f"parse, Pygments:       {pygments_ms:8.1f} ms")
+    print(f"parse, language tags:  {parse_ms:8.1f} ms  ({pygments_ms / parse_ms:.0f}x faster)")
+    print(f"highlight one screen:  {cold_ms:8.1f} ms cold, {cached_ms:.2f} ms cached ({len(screen)} blocks)")
+
+if __name__ == "__main__":
+    main()
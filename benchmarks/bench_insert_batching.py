@@ -0,0 +1,101 @@
+"""Compare Tcl calls needed to insert rendered runs one by one vs. batched.
+
+Usage: python3 -m benchmarks.bench_insert_batching [size_kb] [batch_size]
+"""
+import sys
+import time
+
+import markdown2
+
+from app.core import renderer
+from app.core.renderer import insert_runs
+from app.core.render_ops import MarkdownRenderParser, split_blocks, MARKDOWN_EXTRAS
+from benchmarks.corpus import generate_document
+
+class CountingText:
+    # Accepts Text.insert calls without a display and counts them
+    def __init__(self):
+        self.calls = 0
+
+    def insert(self, index, *args):
+        self.calls += 1
+
+class CountingTk:
+    # Wraps a real tkapp to count every Tcl round-trip made through a widget
+    def __init__(self, tk):
+        self._tk = tk
+        self.calls = 0
+
+    def call(self, *args):
+        self.calls += 1
+        return self._tk.call(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._tk, name)
+
+def collect_runs(md_text: str):
+    # Parse the document block by block, counting the run emits that used to be
+    # individual Text.insert calls.
+    emits = 0
+    original_emit = MarkdownRenderParser.emit
+
+    def counting_emit(self, text, tags=()):
+        nonlocal emits
+        emits += 1
+        original_emit(self, text, tags)
+
+    MarkdownRenderParser.emit = counting_emit
+    try:
+        parser = MarkdownRenderParser()
+        md = markdown2.Markdown(extras=MARKDOWN_EXTRAS)
+        blocks = [parser.feed_block(md.convert(block)) for block in split_blocks(md_text)]
+    finally:
+        MarkdownRenderParser.emit = original_emit
+    return emits, blocks
+
+def time_real_tk(blocks, batch_size):
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return None
+    root.withdraw()
+    results = {}
+    for label, size in (("unbatched", 1), ("batched", batch_size)):
+        text = tk.Text(root)
+        text.tk = CountingTk(text.tk)
+        text.mark_set("bench", "end")
+        start = time.perf_counter()
+        for runs in blocks:
+            insert_runs(text, "bench", runs, size)
+        results[label] = {"seconds": time.perf_counter() - start, "tcl_calls": text.tk.calls}
+        text.destroy()
+    root.destroy()
+    return results
+
+def main():
+    size_kb = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else renderer.RUN_BATCH_SIZE
+    md_text = generate_document(size_kb * 1024)
+    emits, blocks = collect_runs(md_text)
+
+    counter = CountingText()
+    for runs in blocks:
+        insert_runs(counter, "end", runs, batch_size)
+
+    runs = sum(len(b) for b in blocks)
+    print(f"document:            {len(md_text) / 1024:.0f} KiB, {len(blocks)} blocks")
+    print(f"per-node inserts:    {emits} Tcl calls")
+    print(f"merged runs:         {runs}")
+    print(f"batched inserts:     {counter.calls} Tcl calls (batch size {batch_size})")
+    print(f"reduction:           {emits / max(counter.calls, 1):.1f}x")
+
+    timings = time_real_tk(blocks, batch_size)
+    if timings is None:
+        print("no display available, skipping Tk timings")
+        return
+    for label, result in timings.items():
+        print(f"{label + ':':<20} {result['seconds'] * 1000:.0f} ms, {result['tcl_calls']} Tcl calls")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Cost of a live preview update per keystroke as the document grows.
+
+Types a word, one character at a time, into a paragraph in the middle of
+documents of growing size. Each keystroke is either handled incrementally (the
+edit buffer replaces the edited line, the live document re-splits and re-keys
+the blocks around it, the changed blocks are applied) or by a whole-text update
+(copy the text, split and key every block, then diff against the rendered
+keys), as edit mode did before.
+
+Also times what an autosave does on the main loop: a snapshot of the buffer's
+lines, against copying the whole text, and checks that a save of a document
+longer than one save chunk reads back unchanged in every encoding with a BOM.
+
+Usage: python3 -m benchmarks.bench_live_preview [max_kb] [keystrokes]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from app.core.edit_buffer import SAVE_CHUNK_LINES, EditBuffer, encode_lines
+from app.core.fileio import atomic_write_chunks
+from app.core.loader import MappedFile
+from app.core.live_preview import LiveDocument, source_lines
+from app.core.render_ops import BlockView, NullSink, block_key, link_references, parse_block, split_blocks
+from benchmarks.corpus import generate_document
+
+def type_live(md_text: str, line: int, keystrokes: int) -> float:
+    live = LiveDocument(md_text)
+    view = BlockView(NullSink())
+    for _ in view.apply_steps(live.keys, lambda j: parse_block(live.sources[j], live.refs)):
+        pass
+    buffer = EditBuffer(md_text)
+    start = time.perf_counter()
+    for _ in range(keystrokes):
+        buffer.replace(line, line + 1, ["x" + buffer.lines[line]])
+        live.mark_changed(line, line + 1, line + 1)
+        change = live.update(buffer.iter_lines)
+        begin, end, sources, keys = change
+        for _ in view.replace_steps(begin, end, keys, lambda j: parse_block(sources[j], live.refs)):
+            pass
+    return (time.perf_counter() - start) * 1000 / keystrokes
+
+def type_whole(md_text: str, line: int, keystrokes: int) -> float:
+    live = LiveDocument(md_text)
+    view = BlockView(NullSink())
+    for _ in view.apply_steps(live.keys, lambda j: parse_block(live.sources[j], live.refs)):
+        pass
+    buffer = EditBuffer(md_text)
+    start = time.perf_counter()
+    for _ in range(keystrokes):
+        buffer.lines[line] = "x" + buffer.lines[line]
+        text = buffer.text()
+        sources = split_blocks(text)
+        refs = link_references(text)
+        keys = [block_key(source, refs) for source in sources]
+        for _ in view.apply_steps(keys, lambda j: parse_block(sources[j], refs)):
+            pass
+    return (time.perf_counter() - start) * 1000 / keystrokes
+
+def save_ms(save, runs: int = 5) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        save()
+    return (time.perf_counter() - start) * 1000 / runs
+
+def save_round_trips(encoding: str) -> bool:
+    # Saves more lines than one chunk holds and reads them back
+    lines = [f"line {i} caf\u00e9" for i in range(SAVE_CHUNK_LINES + 904)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "doc.md")
+        atomic_write_chunks(path, encode_lines(lines, encoding))
+        mapped = MappedFile(path)
+        return mapped.encoding == encoding and mapped.read_text() == "\n".join(lines)
+
+def main():
+    max_kb = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+    keystrokes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    print(f"{'document':>10}  {'live':>10}  {'whole text':>12}  {'save snapshot':>14}  {'save copy':>10}")
+    size = 64
+    while size <= max_kb:
+        md_text = generate_document(size * 1024)
+        lines = source_lines(md_text)
+        # A paragraph line near the middle
+        line = len(lines) // 2
+        while not lines[line][0].isalpha():
+            line += 1
+        live_ms = type_live(md_text, line, keystrokes)
+        whole_ms = type_whole(md_text, line, max(2, keystrokes // 10))
+        buffer = EditBuffer(md_text)
+        snapshot_ms = save_ms(buffer.snapshot)
+        copy_ms = save_ms(buffer.text)
+        print(f"{size:>7} KiB  {live_ms:7.3f} ms  {whole_ms:9.1f} ms  {snapshot_ms:11.2f} ms  {copy_ms:7.2f} ms")
+        size *= 4
+    failed = [encoding for encoding in ("utf-8-sig", "utf-16", "utf-32") if not save_round_trips(encoding)]
+    if failed:
+        raise SystemExit(f"saves do not read back in {', '.join(failed)}")
+    print("saves read back in utf-8-sig, utf-16 and utf-32")
+
+if __name__ == "__main__":
+    main()
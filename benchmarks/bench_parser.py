@@ -0,0 +1,134 @@
+"""Conformance and throughput of the native parser against markdown2.
+
+Conformance: every block of the generated documents, of a list of edge cases
+and of randomly assembled snippets is parsed by both backends. Blocks the
+native parser accepts must give the same runs as markdown2. Blocks it hands
+to markdown2 are counted as fallbacks.
+
+Throughput: whole documents parsed block by block with each backend, the
+native one including its fallbacks.
+
+Usage: python3 -m benchmarks.bench_parser [--quick] [--fuzz N] [--show N]
+"""
+import argparse
+import random
+import time
+
+from app.core import native_parser
+from app.core.render_ops import (
+    Markdown2Backend, MarkdownRenderParser, NativeBackend, link_references, split_blocks,
+)
+from benchmarks.corpus import WORDS, generate_code_block, generate_document, generate_nested_list, generate_table
+
+MB = 1024 * 1024
+
+DOCUMENTS = {
+    "mixed": lambda scale: generate_document(int(MB * scale)),
+    "table": lambda scale: generate_table(int(5000 * scale)),
+    "nested_list": lambda scale: generate_nested_list(8, int(200 * scale)),
+    "code": lambda scale: generate_code_block(int(5000 * scale)),
+}
+
+EDGE_CASES = [
+    "# Title\n", "#Title\n", "## Title ##\n", "### C#\n", "####### seven\n", "#\n",
+    "Title\n=====\n", "Title\n-----\n", "---\n", "* * *\n",
+    "Plain paragraph\nover two lines.\n", "Trailing spaces  \nbreak.\n",
+    "*em* **strong** `code` [link](http://example.com)\n",
+    "**bold *nested em* text**\n", "*em **nested strong** text*\n", "***both***\n",
+    "snake_case_name and a*b*c\n", "_under_ __double__\n", "*unclosed\n", "2 * 3 * 4\n",
+    "**bold.** (*paren*) \"*quoted*\"\n", "[*em link*](http://x \"title\")\n", "[ref][1]\n\n[1]: http://x\n",
+    "![image](a.png)\n", "<b>html</b>\n", "a <http://x> b\n", "a & b &amp; &copy; &#169;\n", "back\\*slash\n",
+    "`` double `tick` ``\n", "` spaced `\n", "unmatched `tick\n", "`a``b`\n", "`a`` b\n", "``a`\n",
+    "- one\n- two\n- three\n", "+ plus\n* star\n", "1. one\n2. two\n", "5. five\n6. six\n",
+    "- one\n1. mixed\n", "- item\nlazy line\n", "text\n- not a list\n", "- one\n\n- loose\n",
+    "- one\n    - nested\n", "-not a list\n", "1) paren\n", "# Heading\n- list\n", "Text\n# Heading\nText\n",
+    "> quote\n", "    indented code\n", "\tTabbed\n",
+    "```\ncode <x> &amp;\n```\n", "```\n\nblank lines\n\n```\n", "```\n```\n", "```python\nx = 1\n```\n",
+    "```python\n\nx = 1\n\n```\n", "```unknownlang\nx\n```\n", "````\nfour\n````\n", "```\nunclosed\n",
+    "~~~\ntilde\n~~~\n", "Text\n```\ncode\n```\n",
+    "| a | b |\n|---|:---:|\n| 1 | *2* |\n", "| a | b |\n| --- | --- |\n", "a | b\n--|--\n1 | 2\n",
+    "| `a|b` | c |\n|---|---|\n", "| a |\n|---|\n| x \\| y |\n",
+]
+
+# Pieces randomly joined into snippets for the fuzz suite
+INLINE_PIECES = ["*", "**", "_", "__", "`", "[", "](http://x)", "!", "&", "<", " ", " ", ".", "(", ")", "#"]
+LINE_STARTS = ["", "", "", "# ", "## ", "- ", "* ", "1. ", "> ", "| ", "    ", "```", "---", "==="]
+
+def random_snippet(rng: random.Random) -> str:
+    lines = []
+    for _ in range(rng.randint(1, 4)):
+        parts = []
+        for _ in range(rng.randint(1, 8)):
+            parts.append(rng.choice(WORDS) if rng.random() < 0.6 else rng.choice(INLINE_PIECES))
+        joiner = rng.choice([" ", ""])
+        lines.append(rng.choice(LINE_STARTS) + joiner.join(parts) + "\n")
+    return "".join(lines)
+
+def native_runs(builder: MarkdownRenderParser, source: str):
+    # The runs of the native parser, or None when it falls back
+    builder.begin()
+    try:
+        native_parser.convert(source, builder)
+    except native_parser.Unsupported:
+        return None
+    return builder.finish()
+
+def check(name: str, sources: list, refs: str, show: int) -> int:
+    markdown2 = Markdown2Backend()
+    builder = MarkdownRenderParser()
+    native = mismatches = 0
+    for source in sources:
+        runs = native_runs(builder, source)
+        if runs is None:
+            continue
+        native += 1
+        expected = markdown2.parse(source, refs)
+        if runs != expected:
+            mismatches += 1
+            if show > 0:
+                show -= 1
+                print(f"  mismatch in {source!r}:\n    native    {runs}\n    markdown2 {expected}")
+    share = native / len(sources) * 100 if sources else 0.0
+    print(f"{name + ':':<14} {len(sources):6} blocks  native {share:5.1f}%  mismatches {mismatches}")
+    return mismatches
+
+def throughput(name: str, md_text: str) -> None:
+    sources = split_blocks(md_text)
+    refs = link_references(md_text)
+    size = len(md_text.encode("utf-8")) / MB
+    timings = {}
+    for backend in (Markdown2Backend(), NativeBackend()):
+        start = time.perf_counter()
+        for source in sources:
+            backend.parse(source, refs)
+        timings[backend.name] = time.perf_counter() - start
+    print(f"{name + ':':<14} {size:6.2f} MB  markdown2 {size / timings['markdown2']:6.2f} MB/s"
+          f"  native {size / timings['native']:6.2f} MB/s  speedup {timings['markdown2'] / timings['native']:5.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Native parser conformance and throughput")
+    parser.add_argument("--quick", action="store_true", help="use documents a tenth of the size")
+    parser.add_argument("--fuzz", type=int, default=2000, help="number of random snippets (default: 2000)")
+    parser.add_argument("--show", type=int, default=5, help="mismatches to print per suite (default: 5)")
+    args = parser.parse_args()
+    scale = 0.1 if args.quick else 1.0
+    documents = {name: make(scale) for name, make in DOCUMENTS.items()}
+    rng = random.Random(0)
+
+    # Both backends import and set up their dependencies before timing
+    Markdown2Backend().parse("```python\nx\n```\n")
+    NativeBackend().parse("```python\nx\n```\n")
+
+    print("conformance")
+    mismatches = check("edge_cases", EDGE_CASES, "", args.show)
+    mismatches += check("fuzz", [random_snippet(rng) for _ in range(args.fuzz)], "", args.show)
+    for name, md_text in documents.items():
+        mismatches += check(name, split_blocks(md_text), link_references(md_text), args.show)
+    print("throughput")
+    for name, md_text in documents.items():
+        throughput(name, md_text)
+    if mismatches:
+        raise SystemExit(f"{mismatches} blocks differ from markdown2")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Headless render pipeline benchmark over a generated corpus.
+
+Every case goes through the render stages separately: parse (split into
+blocks, markdown2 to HTML), ops (HTML to runs, then the block ops that fill an
+empty view) and apply (ops into a sink). It also times one edited block being
+re-rendered, and measures the peak memory of a whole pass with tracemalloc in
+a separate run. Results can be written as JSON and compared between releases.
+
+Usage: python3 -m benchmarks.bench_pipeline [--quick] [--sink null|record|tk]
+           [--json out.json] [--compare old.json] [case ...]
+"""
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+
+import markdown2
+
+from app.core.render_ops import (
+    BlockView, NullSink, RecordingSink, block_html, block_key, block_ops, html_runs, link_references,
+    parse_block, parser_backend, split_blocks,
+)
+from benchmarks.corpus import generate_code_block, generate_document, generate_nested_list, generate_table
+
+MB = 1024 * 1024
+RESULT_FORMAT = 1
+
+# Case name -> generator taking a size scale (1.0 for the full suite)
+CASES = {
+    "mixed_1mb": lambda scale: generate_document(int(MB * scale)),
+    "huge_table": lambda scale: generate_table(int(20000 * scale)),
+    "deep_list": lambda scale: generate_nested_list(8, int(500 * scale)),
+    "long_code": lambda scale: generate_code_block(int(20000 * scale)),
+    "mixed_10mb": lambda scale: generate_document(int(10 * MB * scale)),
+}
+METRICS = ("parse_ms", "ops_ms", "apply_ms", "edit_ms", "peak_mb")
+
+def make_sink(kind: str):
+    if kind == "null":
+        return NullSink()
+    if kind == "record":
+        return RecordingSink()
+    import tkinter as tk
+    from app.core.renderer import TkSink
+    root = tk.Tk()
+    root.withdraw()
+    text = tk.Text(root)
+    return TkSink(text)
+
+def elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+def run_pipeline(md_text: str, sink) -> dict:
+    result = {}
+    start = time.perf_counter()
+    sources = split_blocks(md_text)
+    refs = link_references(md_text)
+    keys = [block_key(source, refs) for source in sources]
+    html = [block_html(source, refs) for source in sources]
+    result["parse_ms"] = elapsed_ms(start)
+
+    start = time.perf_counter()
+    runs = [html_runs(block) for block in html]
+    view = BlockView(sink)
+    ops = list(block_ops(view.keys, keys, runs.__getitem__))
+    result["ops_ms"] = elapsed_ms(start)
+
+    start = time.perf_counter()
+    for op in ops:
+        view.apply(op)
+    result["apply_ms"] = elapsed_ms(start)
+
+    # One block in the middle edited: parse it, diff and replace it
+    start = time.perf_counter()
+    j = len(sources) // 2
+    edited = sources[j] + "\nEdited.\n"
+    keys = keys[:j] + [block_key(edited, refs)] + keys[j + 1:]
+    for op in block_ops(view.keys, keys, lambda i: parse_block(edited, refs)):
+        view.apply(op)
+    result["edit_ms"] = elapsed_ms(start)
+
+    result["blocks"] = len(sources)
+    result["runs"] = sum(len(block) for block in runs)
+    return result
+
+def peak_memory_mb(md_text: str) -> float:
+    tracemalloc.start()
+    try:
+        run_pipeline(md_text, NullSink())
+        return round(tracemalloc.get_traced_memory()[1] / MB, 1)
+    finally:
+        tracemalloc.stop()
+
+def print_comparison(results: dict, baseline: dict):
+    print(f"compared with {baseline.get('python')} / markdown2 {baseline.get('markdown2')}:")
+    for name, case in results["cases"].items():
+        old = baseline.get("cases", {}).get(name)
+        if not old:
+            continue
+        changes = []
+        for metric in METRICS:
+            if old.get(metric) and metric in case:
+                changes.append(f"{metric} {(case[metric] / old[metric] - 1) * 100:+.0f}%")
+        print(f"  {name + ':':<18} {', '.join(changes)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless render pipeline benchmark")
+    parser.add_argument("cases", nargs="*", help=f"cases to run, from {', '.join(CASES)} (default: all)")
+    parser.add_argument("--quick", action="store_true", help="run every case at a tenth of its size")
+    parser.add_argument("--sink", choices=("null", "record", "tk"), default="null")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results of an earlier run to compare with")
+    args = parser.parse_args()
+    unknown = set(args.cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    scale = 0.1 if args.quick else 1.0
+    results = {
+        "format": RESULT_FORMAT,
+        "python": platform.python_version(),
+        "markdown2": markdown2.__version__,
+        "scale": scale,
+        "sink": args.sink,
+        "parser": parser_backend().name,  # used for the edited block
+        "cases": {},
+    }
+    parse_block("warm up")
+    for name in args.cases or CASES:
+        md_text = CASES[name](scale)
+        case = {"bytes": len(md_text.encode("utf-8"))}
+        case.update(run_pipeline(md_text, make_sink(args.sink)))
+        if not args.no_memory:
+            case["peak_mb"] = peak_memory_mb(md_text)
+        results["cases"][name] = case
+        print(f"{name + ':':<18} {case['bytes'] / MB:6.2f} MB {case['blocks']:6} blocks  parse {case['parse_ms']:8.1f} ms"
+              f"  ops {case['ops_ms']:7.1f} ms  apply {case['apply_ms']:7.1f} ms  edit {case['edit_ms']:6.1f} ms"
+              + (f"  peak {case['peak_mb']:6.1f} MB" if "peak_mb" in case else ""))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Keystroke-to-results latency of the quick-open index.
+
+Types a few queries one character at a time (then backspaces them) against a
+generated tree of paths. Reports the latency of each search() call (what a
+keystroke waits for) and the time until a query's results are complete.
+
+Usage: python3 -m benchmarks.bench_quick_open [paths]
+"""
+import random
+import sys
+import time
+
+from app.core.finder import PathIndex
+from benchmarks.corpus import WORDS
+
+QUERIES = ["readme", "render preview", "tablelist", "cache/token", "dcba", "zzq", "idx"]
+
+def generate_paths(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    paths = set()
+    while len(paths) < count:
+        folders = "/".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))
+        paths.add(f"/bench/{folders}/{rng.choice(WORDS)}_{rng.choice(WORDS)}{rng.randrange(100)}.md")
+    return sorted(paths)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    paths = generate_paths(count)
+    index = PathIndex("/bench")
+    start = time.perf_counter()
+    index.set_paths(paths)
+    print(f"paths:               {count}")
+    print(f"index build:         {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    calls = []
+    completions = []
+    for query in QUERIES:
+        index.states = {}
+        typed = [query[:k] for k in range(1, len(query) + 1)]
+        for text in typed + typed[-2::-1]:
+            total = 0.0
+            complete = False
+            while not complete:
+                start = time.perf_counter()
+                _, complete = index.search(text)
+                elapsed = (time.perf_counter() - start) * 1000
+                calls.append(elapsed)
+                total += elapsed
+            completions.append(total)
+    for label, timings in (("search() call", calls), ("complete results", completions)):
+        timings.sort()
+        print(f"{label}:")
+        print(f"  median:            {timings[len(timings) // 2]:.2f} ms")
+        print(f"  p95:               {timings[int(len(timings) * 0.95)]:.2f} ms")
+        print(f"  max:               {timings[-1]:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Time from launch to first paint, with and without the startup caches.
+
+Each run starts a fresh interpreter with its own HOME and XDG_CACHE_HOME. The
+config reopens a generated folder and the last document in it. The first run
+starts with empty caches; the following runs can use the tree snapshot and the
+render cache. Every run reports the time until the tree shows entries and
+until the document is painted, measured from process launch, and whether
+markdown2 was imported by then.
+
+Without a display, the probe times the imports and the document preparation
+(render cache lookup or parse) instead.
+
+Usage: python3 -m benchmarks.bench_startup [runs] [doc_kb]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import generate_document
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, os, sys, time
+launched = float(sys.argv[1])
+result = {}
+def mark(name):
+    result[name] = round((time.time() - launched) * 1000, 1)
+
+import tkinter as tk
+try:
+    root = tk.Tk()
+except tk.TclError:
+    root = None
+from app.ui.main_window import MainWindow
+mark("imported")
+
+if root is None:
+    from app.core.config import ConfigManager
+    from app.core.render_cache import cache_key_for, render_cache
+    from app.core.render_ops import prepare_document
+    config = ConfigManager.load_config()
+    path = config["last_file"]
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    key = cache_key_for(path)
+    document = prepare_document(text, key, False)
+    mark("prepared")
+    result["markdown2"] = "markdown2" in sys.modules
+    print(json.dumps(result))
+    # The app writes the cache from a daemon thread; do it here before exiting
+    render_cache.save_to_disk(key, list(zip(document.keys, document.runs)))
+    sys.exit()
+
+app = MainWindow(root)
+mark("window")
+
+def check():
+    tree = app.sidebar.tree
+    roots = tree.get_children("")
+    if "tree" not in result and roots and tree.get_children(roots[0]) and tree.item(tree.get_children(roots[0])[0], "values"):
+        mark("tree")
+    renderer = app.preview.renderer
+    if "paint" not in result and renderer.view.keys and renderer.steps is None:
+        root.update_idletasks()
+        mark("paint")
+        result["markdown2"] = "markdown2" in sys.modules
+    if "tree" in result and "paint" in result:
+        print(json.dumps(result))
+        # Give the render cache and the tree snapshot time to reach the disk
+        root.after(1500, app.quit)
+        return
+    root.after(1, check)
+
+root.after(0, check)
+root.mainloop()
+'''
+
+def make_home(doc_kb: int) -> dict:
+    base = tempfile.mkdtemp(prefix="tarqim-startup-")
+    home = os.path.join(base, "home")
+    folder = os.path.join(base, "notes")
+    os.makedirs(home)
+    for i in range(40):
+        sub = os.path.join(folder, f"topic{i:02}")
+        os.makedirs(sub)
+        for j in range(5):
+            with open(os.path.join(sub, f"note{j}.md"), "w", encoding="utf-8") as f:
+                f.write(generate_document(2048, seed=i * 5 + j))
+    doc = os.path.join(folder, "README.md")
+    with open(doc, "w", encoding="utf-8") as f:
+        f.write(generate_document(doc_kb * 1024))
+    with open(os.path.join(home, ".tarqim_config.json"), "w", encoding="utf-8") as f:
+        json.dump({"last_dir": folder, "last_file": doc}, f)
+    env = dict(os.environ, HOME=home, XDG_CACHE_HOME=os.path.join(base, "cache"), PYTHONPATH=ROOT)
+    env.pop("TARQIM_TRACE", None)
+    return env
+
+def run_probe(env: dict) -> dict:
+    launched = time.time()
+    out = subprocess.run([sys.executable, "-c", PROBE, repr(launched)], env=env, cwd=ROOT,
+                         capture_output=True, text=True, timeout=120)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip())
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    doc_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    env = make_home(doc_kb)
+    results = [run_probe(env) for _ in range(runs)]
+    if "paint" not in results[0]:
+        print("no display available, timing imports and document preparation only")
+    print(f"document:            {doc_kb} KiB, 200 notes in 40 folders")
+    for i, result in enumerate(results):
+        label = "cold caches:" if i == 0 else f"warm run {i}:"
+        times = "  ".join(f"{name} {result[name]:7.1f} ms" for name in ("imported", "window", "tree", "paint", "prepared") if name in result)
+        print(f"{label:<20} {times}  markdown2 {'loaded' if result['markdown2'] else 'not loaded'}")
+    warm = sorted(r.get("paint", r.get("prepared")) for r in results[1:])
+    if warm:
+        print(f"warm median:         {warm[len(warm) // 2]:.1f} ms to first paint")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import random
+
+WORDS = (
+    "tarqim render markdown preview block table list code parser widget "
+    "buffer index scroll theme cache stream token heading link image"
+).split()
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    parts = [rng.choice(WORDS) for _ in range(words)]
+    # Sprinkle some inline markup so the renderer produces several tag runs
+    i = rng.randrange(len(parts))
+    parts[i] = rng.choice(("**{}**", "*{}*", "`{}`", "[{}](http://example.com)")).format(parts[i])
+    return " ".join(parts).capitalize() + "."
+
+def generate_document(target_bytes: int, seed: int = 0) -> str:
+    # A mixed document: headings, paragraphs, lists, tables and fenced code.
+    rng = random.Random(seed)
+    out = []
+    size = 0
+    section = 0
+    while size < target_bytes:
+        section += 1
+        kind = section % 5
+        if kind == 0:
+            chunk = f"## Section {section}\n\n"
+        elif kind == 1:
+            chunk = " ".join(sentence(rng) for _ in range(4)) + "\n\n"
+        elif kind == 2:
+            chunk = "".join(f"- {sentence(rng, 6)}\n" for _ in range(5)) + "\n"
+        elif kind == 3:
+            rows = "".join(f"| {rng.choice(WORDS)} | {rng.randrange(1000)} | {sentence(rng, 4)} |\n" for _ in range(6))
+            chunk = "| Name | Value | Notes |\n| --- | --- | --- |\n" + rows + "\n"
+        else:
+            lines = "".join(f"    value_{i} = compute({rng.choice(WORDS)!r})\n" for i in range(8))
+            chunk = "```python\ndef handler():\n" + lines + "```\n\n"
+        out.append(chunk)
+        size += len(chunk)
+    return "".join(out)
+
+def generate_table(rows: int, seed: int = 0) -> str:
+    # A single table block
+    rng = random.Random(seed)
+    lines = [f"| {rng.choice(WORDS)} | {rng.randrange(1000)} | {sentence(rng, 4)} |\n" for _ in range(rows)]
+    return "| Name | Value | Notes |\n| --- | --- | --- |\n" + "".join(lines)
+
+def generate_nested_list(depth: int, items: int, seed: int = 0) -> str:
+    # `items` runs of a list nested `depth` levels deep, all in one block
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(items):
+        for level in range(depth):
+            lines.append(f"{'    ' * level}- {sentence(rng, 5)}\n")
+    return "".join(lines)
+
+def generate_code_block(lines: int, seed: int = 0) -> str:
+    # A single fenced Python block
+    rng = random.Random(seed)
+    body = "".join(f"    value_{i} = compute({rng.choice(WORDS)!r})\n" for i in range(lines))
+    return "```python\ndef handler():\n" + body + "```\n"
@@ -1,7 +1,36 @@
-import tkinter as tk
-from app.ui.main_window import MainWindow
+import argparse
+import sys
+from app.core.trace import TRACE_FILE, tracer
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["export"]:
+        # Headless: tkinter is never imported
+        from app.core.export import main as export_main
+        sys.exit(export_main(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description="Tarqim - Markdown Viewer",
+                                     epilog="Run 'main.py export SRC DST' to export a folder to HTML without the GUI.")
+    parser.add_argument("paths", nargs="*", metavar="PATH", help="files or folders to open")
+    parser.add_argument("--new-window", action="store_true",
+                        help="start a new window instead of handing the paths to the running one")
+    parser.add_argument("--trace", action="store_true",
+                        help="record timings and write a Chrome trace on exit")
+    parser.add_argument("--trace-file", metavar="FILE",
+                        help=f"where --trace writes the trace (default {TRACE_FILE}); implies --trace")
+    args = parser.parse_args()
+
+    # A running window takes the paths over, before tkinter is even imported
+    if not args.new_window:
+        from app.core.instance import forward
+        if forward(args.paths):
+            sys.exit(0)
+
+    if args.trace or args.trace_file:
+        tracer.enable(args.trace_file)
+
+    import tkinter as tk
+    from app.ui.main_window import MainWindow
+
     root = tk.Tk()
-    app = MainWindow(root)
+    app = MainWindow(root, args.paths)
     root.mainloop()